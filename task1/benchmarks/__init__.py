@@ -0,0 +1,131 @@
+"""
+Бенчмарки post_service. Запускаются из каталога task1, например:
+
+    python -m benchmarks.api --rows 1000000 --output before.json
+    python -m benchmarks.compare before.json after.json
+
+Каждый бенчмарк работает на отдельной тестовой базе (как manage.py test) и не трогает рабочую.
+"""
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import django
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'post_service.settings')
+    django.setup()
+
+
+@contextlib.contextmanager
+def benchmark_database(keepdb=False):
+    """
+    Создаёт тестовую базу (с миграциями) на время бенчмарка.
+    С keepdb=True база и сгенерированные данные сохраняются между запусками.
+    """
+    from django.conf import settings
+    from django.db import connection
+
+    if connection.vendor == 'sqlite' and not connection.settings_dict['TEST']['NAME']:
+        # миллионы строк не помещаются в базу в памяти
+        connection.settings_dict['TEST']['NAME'] = str(settings.BASE_DIR / 'benchmark.sqlite3')
+    old_name = connection.settings_dict['NAME']
+    # serialize=False: сериализация содержимого нужна только TransactionTestCase и на миллионах строк неподъёмна
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def measure(func, repeat):
+    """
+    Выполняет func repeat раз и возвращает перцентили задержки в миллисекундах.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return percentiles(timings)
+
+
+def profile(func, repeat):
+    """
+    Полный профиль операции: перцентили задержки, пропускная способность (операций в секунду),
+    среднее число SQL-запросов и пиковая память Python (КиБ) на одну операцию.
+    Память снимается отдельным прогоном: tracemalloc искажал бы замеры времени.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    func()  # прогрев: первый вызов платит за импорт и подготовку, а не за саму операцию
+    started = time.perf_counter()
+    result = measure(func, repeat)
+    elapsed = time.perf_counter() - started
+    result['ops_per_sec'] = round(repeat / elapsed, 1)
+
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    result['queries'] = len(queries)
+
+    tracemalloc.start()
+    try:
+        func()
+        result['peak_memory_kib'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+def environment():
+    """
+    Описание окружения запуска, чтобы сравнение двух JSON-результатов было осмысленным.
+    """
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'vendor': connection.vendor,
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def write_results(results, path=None):
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+def percentiles(timings):
+    """
+    Перцентили задержки (мс) по списку замеров.
+    """
+    timings = sorted(timings)
+
+    def at(fraction):
+        return round(timings[min(len(timings) - 1, int(len(timings) * fraction))], 3)
+
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': at(0.95),
+        'p99_ms': at(0.99),
+        'max_ms': round(timings[-1], 3),
+    }
@@ -0,0 +1,123 @@
+"""
+Бенчмарк API писем и посылок: список, список с фильтрами, поиск, сортировка, глубокая страница,
+карточка записи, выборка сотни записей по ids, создание, изменение и статистика. Для каждого сценария —
+перцентили задержки, запросов в секунду, число SQL-запросов и пиковая память на запрос.
+
+    python -m benchmarks.api --rows 1000000 --keepdb --output after.json
+    python -m benchmarks.compare before.json after.json
+
+Запросы идут через тестовый клиент Django (весь стек middleware и DRF, без сети).
+Кеш ответов по умолчанию отключён, чтобы мерить работу с БД; --cache включает его.
+"""
+import argparse
+import json
+import os
+import random
+
+from benchmarks import setup, benchmark_database, environment, profile, write_results
+
+KINDS = ('letters', 'parcels')
+
+
+def scenarios(kind, client, ids, rng):
+    """
+    Сценарии для вида отправлений: имя -> функция, выполняющая один запрос.
+    """
+    base = f'/api/v1/{kind}'
+    type_filter = 'letter_type=2' if kind == 'letters' else 'parcel_type=2'
+    new_record = {
+        'sender_full_name': 'Бенчмарков Тест Тестович', 'recipient_full_name': 'Замеров Пётр Петрович',
+        'origin_location': 'Москва', 'destination_location': 'Казань',
+        'origin_postcode': 101000, 'destination_postcode': 420000,
+    }
+    if kind == 'letters':
+        new_record.update(letter_type=1, weight_kg='0.020')
+    else:
+        new_record.update(parcel_type=2, notification_phone='+79990000000', payment_amount='100.00')
+
+    def get(path):
+        def call():
+            response = client.get(path)
+            assert response.status_code == 200, (path, response.status_code)
+        return call
+
+    def detail():
+        response = client.get(f'{base}/{rng.choice(ids)}')
+        assert response.status_code == 200, response.status_code
+
+    def multi_get():
+        # как сервисы трекинга: сотня id одним запросом вместо сотни запросов карточек
+        response = client.get(base, {'ids': ','.join(str(pk) for pk in rng.sample(ids, 100))})
+        assert response.status_code == 200, response.status_code
+
+    def create():
+        response = client.post(base, data=json.dumps(new_record), content_type='application/json')
+        assert response.status_code == 201, response.content
+
+    def update():
+        payload = json.dumps({'recipient_full_name': f'Изменённый Получатель {rng.randrange(1000)}'})
+        response = client.patch(f'{base}/{rng.choice(ids)}', data=payload, content_type='application/json')
+        assert response.status_code == 200, response.content
+
+    deep_page = base
+    for _ in range(20):
+        deep_page = client.get(deep_page).data['next'] or deep_page
+
+    return {
+        'list': get(base),
+        'filtered_list': get(f'{base}?{type_filter}&origin_location=Казань'),
+        'search': get(f'{base}?search=смирнов'),
+        'ordering': get(f'{base}?ordering=sender_full_name'),
+        'deep_page': get(deep_page),
+        'detail': detail,
+        'multi_get': multi_get,
+        'create': create,
+        'update': update,
+        'stats': get(f'/api/v1/stats?kind={kind}&group_by=type,day'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000, help='строк каждого вида (10k … 10M)')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--kinds', nargs='+', choices=KINDS, default=list(KINDS))
+    parser.add_argument('--only', nargs='+', help='выполнить только перечисленные сценарии')
+    parser.add_argument('--cache', action='store_true', help='не отключать кеш ответов')
+    parser.add_argument('--keepdb', action='store_true', help='не удалять базу с данными после запуска')
+    parser.add_argument('--output', help='файл для JSON-результатов (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    if not args.cache:
+        os.environ['SHIPMENT_CACHE_BACKEND'] = 'dummy'
+    setup()
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from benchmarks.datagen import ensure_rows
+    from parcels.importing import import_target
+
+    setup_test_environment(debug=False)
+    with benchmark_database(keepdb=args.keepdb):
+        results = {
+            'environment': environment(),
+            'parameters': {'rows': args.rows, 'repeat': args.repeat, 'seed': args.seed, 'cache': args.cache},
+            'results': {},
+        }
+        client = Client()
+        for kind in args.kinds:
+            model, _ = import_target(kind)
+            ensure_rows(model, kind, args.rows)
+            ids = list(model.objects.order_by('?').values_list('id', flat=True)[:10000])
+            rng = random.Random(args.seed)
+            results['results'][kind] = {
+                name: profile(func, args.repeat)
+                for name, func in scenarios(kind, client, ids, rng).items()
+                if not args.only or name in args.only
+            }
+
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
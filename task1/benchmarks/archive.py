@@ -0,0 +1,106 @@
+"""
+Архив старых отправлений: скорость переноса (строк/с и длительность одной транзакции-порции —
+столько держатся блокировки) и задержка списков до и после переноса.
+
+    python -m benchmarks.archive --rows 1000000 --days 730 --output archive.json
+
+Даты создания сгенерированных писем растягиваются на --days дней назад (старшие id — свежее),
+поэтому в архив уходит доля строк старше SHIPMENT_ARCHIVE_AFTER_DAYS.
+Запросы идут через тестовый клиент Django, кеш ответов отключён.
+"""
+import argparse
+import os
+import time
+from datetime import timedelta
+
+from benchmarks import setup, benchmark_database, environment, percentiles, profile, write_results
+
+
+def age_rows(model, days):
+    """
+    Растягивает created_at/updated_at по days дням: строки делятся на дни по диапазонам id.
+    """
+    from django.db.models import Max, Min
+    from django.utils import timezone
+
+    bounds = model.objects.aggregate(low=Min('id'), high=Max('id'))
+    span = bounds['high'] - bounds['low'] + 1
+    now = timezone.now()
+    for day in range(days):
+        low = bounds['low'] + span * day // days
+        high = bounds['low'] + span * (day + 1) // days - 1
+        moment = now - timedelta(days=days - day)
+        model.objects.filter(id__range=(low, high)).update(created_at=moment, updated_at=moment)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--days', type=int, default=730, help='на сколько дней назад растянуты даты создания')
+    parser.add_argument('--chunk-size', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output', help='файл для JSON-результатов (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    os.environ['SHIPMENT_CACHE_BACKEND'] = 'dummy'
+    setup()
+    from django.conf import settings
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.utils import timezone
+    from benchmarks.datagen import ensure_rows
+    from parcels import constants as const
+    from parcels.archive import archive_chunk, archive_horizon, prepare_partitions
+    from parcels.models import ArchivedLetter, Letter
+
+    chunk_size = args.chunk_size or const.ARCHIVE_CHUNK_SIZE
+    setup_test_environment(debug=False)
+    with benchmark_database():
+        ensure_rows(Letter, 'letters', args.rows)
+        age_rows(Letter, args.days)
+        client = Client()
+        recent = (timezone.now() - timedelta(days=7)).isoformat()
+        long_ago = (timezone.now() - timedelta(days=settings.SHIPMENT_ARCHIVE_AFTER_DAYS + 30)).isoformat()
+        requests = {
+            'list': {},
+            'list_recent': {'created_at_after': recent},
+            'list_old': {'created_at_after': long_ago},
+        }
+
+        def list_profiles():
+            return {
+                name: profile(lambda params=params: client.get('/api/v1/letters', params), args.repeat)
+                for name, params in requests.items()
+            }
+
+        results = {
+            'environment': environment(),
+            'parameters': {'rows': args.rows, 'days': args.days, 'chunk_size': chunk_size,
+                           'archive_after_days': settings.SHIPMENT_ARCHIVE_AFTER_DAYS},
+            'before': list_profiles(),
+        }
+
+        before = archive_horizon()
+        prepare_partitions(Letter, before)
+        chunks = []
+        started = time.perf_counter()
+        while True:
+            chunk_started = time.perf_counter()
+            if not archive_chunk(Letter, before, chunk_size):
+                break
+            chunks.append((time.perf_counter() - chunk_started) * 1000)
+        elapsed = time.perf_counter() - started
+        moved = ArchivedLetter.objects.count()
+        results['archive'] = {
+            'moved': moved,
+            'hot_rows': Letter.objects.count(),
+            'rows_per_sec': round(moved / elapsed, 1) if elapsed else None,
+            'chunk_ms': percentiles(chunks) if chunks else None,
+        }
+        results['after'] = list_profiles()
+
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Сравнение пропускной способности и p99 задержки API под WSGI (пул потоков, синхронные вьюсеты)
+и под ASGI (цикл событий, асинхронные представления) при высокой конкурентности.
+
+    python -m benchmarks.asgi_wsgi --rows 100000 --concurrency 200 --requests 5000
+
+Каждый режим выполняется в отдельном процессе: маршруты выбираются при импорте URLconf
+по SHIPMENT_ASYNC_API. Кеш ответов отключён, чтобы сравнивать работу с БД, а не попадания в кеш.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import setup, benchmark_database, percentiles, write_results
+
+
+def request_paths(ids, count, seed=0):
+    rng = random.Random(seed)
+    templates = (
+        lambda: '/api/v1/letters',
+        lambda: '/api/v1/letters?origin_location=Казань',
+        lambda: '/api/v1/letters?search=смирнов',
+        lambda: f'/api/v1/letters/{rng.choice(ids)}',
+    )
+    return [rng.choice(templates)() for _ in range(count)]
+
+
+def run_wsgi(paths, concurrency):
+    from django.test import Client
+
+    local = threading.local()
+
+    def call(path):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        started = time.perf_counter()
+        response = local.client.get(path)
+        assert response.status_code == 200, response.status_code
+        return (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(call, paths))
+
+
+async def run_asgi(paths, concurrency):
+    from django.test import AsyncClient
+
+    queue = asyncio.Queue()
+    for path in paths:
+        queue.put_nowait(path)
+    timings = []
+
+    async def worker():
+        client = AsyncClient()
+        while not queue.empty():
+            path = queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.get(path)
+            assert response.status_code == 200, response.status_code
+            timings.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return timings
+
+
+def worker_main(args):
+    from django.test.utils import setup_test_environment
+    from parcels.models import Letter
+
+    setup_test_environment(debug=False)
+    with benchmark_database(keepdb=True):
+        ids = list(Letter.objects.values_list('id', flat=True)[:10000])
+        paths = request_paths(ids, args.requests)
+        started = time.perf_counter()
+        if args.worker == 'asgi':
+            timings = asyncio.run(run_asgi(paths, args.concurrency))
+        else:
+            timings = run_wsgi(paths, args.concurrency)
+        elapsed = time.perf_counter() - started
+    print(json.dumps({'requests_per_sec': round(len(timings) / elapsed, 1), **percentiles(timings)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--keepdb', action='store_true', help='не удалять базу с данными после запуска')
+    parser.add_argument('--output', help='файл для JSON-результатов (по умолчанию stdout)')
+    parser.add_argument('--worker', choices=('wsgi', 'asgi'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        os.environ['SHIPMENT_ASYNC_API'] = 'True' if args.worker == 'asgi' else 'False'
+        os.environ['SHIPMENT_CACHE_BACKEND'] = 'dummy'
+        setup()
+        worker_main(args)
+        return
+
+    setup()
+    from benchmarks.datagen import generate_letters
+    from parcels.models import Letter
+
+    with benchmark_database(keepdb=args.keepdb) as connection:
+        existing = Letter.objects.count()
+        if existing < args.rows:
+            generate_letters(args.rows - existing, seed=existing)
+
+        results = {'vendor': connection.vendor, 'rows': Letter.objects.count(), 'concurrency': args.concurrency}
+        for mode in ('wsgi', 'asgi'):
+            command = [
+                sys.executable, '-m', 'benchmarks.asgi_wsgi', '--worker', mode,
+                '--requests', str(args.requests), '--concurrency', str(args.concurrency),
+            ]
+            completed = subprocess.run(command, capture_output=True, text=True, check=True)
+            results[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
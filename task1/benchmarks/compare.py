@@ -0,0 +1,51 @@
+"""
+Сравнение двух JSON-результатов benchmarks.api: изменение каждой метрики в процентах.
+
+    python -m benchmarks.compare before.json after.json --threshold 5
+"""
+import argparse
+import json
+
+# для этих метрик рост — улучшение, для остальных (задержка, запросы, память) — ухудшение
+HIGHER_IS_BETTER = {'ops_per_sec'}
+
+
+def changes(before, after):
+    for kind, scenarios in after['results'].items():
+        for name, metrics in scenarios.items():
+            old = before['results'].get(kind, {}).get(name)
+            if old is None:
+                continue
+            for metric, value in metrics.items():
+                previous = old.get(metric)
+                if not previous:
+                    continue
+                yield f'{kind}.{name}.{metric}', previous, value, (value - previous) / previous * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=0.0, help='не показывать изменения меньше, %%')
+    args = parser.parse_args()
+
+    with open(args.before, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(args.after, encoding='utf-8') as f:
+        after = json.load(f)
+
+    for key in ('commit', 'vendor'):
+        print(f"{key}: {before['environment'].get(key)} -> {after['environment'].get(key)}")
+    for name, old, new, percent in changes(before, after):
+        if abs(percent) < args.threshold:
+            continue
+        metric = name.rsplit('.', 1)[1]
+        verdict = ''
+        if percent:
+            verdict = 'лучше' if (percent > 0) == (metric in HIGHER_IS_BETTER) else 'хуже'
+        print(f'{name:45} {old:>12} -> {new:>12}  {percent:+7.1f}%  {verdict}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Число записей списка: точный COUNT(*) против стратегии parcels.counting (оценка планировщика
+для широких выборок на PostgreSQL, точный счёт для узких, кеш по фильтрам).
+
+    python -m benchmarks.counts --rows 10000000 --keepdb --output counts.json
+
+Для каждой выборки — задержка точного счёта, первого вызова стратегии (кеш пуст)
+и повторного (из кеша), а также оба числа.
+"""
+import argparse
+import os
+
+from benchmarks import setup, benchmark_database, environment, measure, write_results
+
+# широкие выборки и узкая: узкая считается точно на любой СУБД
+SELECTIONS = {
+    'unfiltered': {},
+    'origin_region': {'origin_region': '1'},
+    'corridor': {'corridor': '10-42,19-63'},
+    'selective': {'origin_postcode_min': 101000, 'origin_postcode_max': 101000},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--keepdb', action='store_true', help='не удалять базу с данными после запуска')
+    parser.add_argument('--output', help='файл для JSON-результатов (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    os.environ['SHIPMENT_CACHE_BACKEND'] = 'locmem'
+    setup()
+    from benchmarks.datagen import ensure_rows
+    from parcels.cache import get_cache
+    from parcels.counting import count_rows
+    from parcels.filters import LetterFilter
+    from parcels.models import Letter
+
+    with benchmark_database(keepdb=args.keepdb) as connection:
+        ensure_rows(Letter, 'letters', args.rows)
+        if connection.vendor == 'postgresql':
+            # reltuples и оценки планов появляются после ANALYZE (обычно его делает autovacuum)
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Letter._meta.db_table}')
+
+        results = {'environment': environment(), 'rows': args.rows, 'selections': {}}
+        for name, params in SELECTIONS.items():
+            queryset = LetterFilter(params, queryset=Letter.objects.all()).qs
+
+            def cold():
+                get_cache().clear()
+                return count_rows(queryset)
+
+            estimate, exact = cold()
+            results['selections'][name] = {
+                'exact_count': queryset.count(),
+                'strategy_count': estimate,
+                'strategy_exact': exact,
+                'count_star': measure(queryset.count, args.repeat),
+                'strategy_cold': measure(cold, args.repeat),
+                'strategy_cached': measure(lambda: count_rows(queryset), args.repeat),
+            }
+
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Генератор синтетических писем и посылок для бенчмарков.
+
+Данные воспроизводимы (зависят только от seed) и похожи на реальные: русские ФИО (мужские и женские),
+пункты с индексами своих регионов, неравномерная популярность направлений и типов отправлений,
+даты создания, растянутые на период DATE_SPAN_DAYS. Запись идёт теми же загрузчиками, что и
+import_shipments (COPY в PostgreSQL, executemany в SQLite), поэтому 10M строк генерируются за минуты.
+
+Сгенерировать файл для import_shipments:
+
+    python -m benchmarks.datagen parcels 1000000 --output parcels.jsonl
+"""
+import argparse
+import csv
+import datetime
+import json
+import random
+import sys
+
+MALE_SURNAMES = (
+    'Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов', 'Новиков', 'Фёдоров',
+    'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семёнов', 'Егоров', 'Павлов', 'Козлов', 'Степанов', 'Николаев',
+)
+MALE_FIRST_NAMES = (
+    'Александр', 'Дмитрий', 'Максим', 'Сергей', 'Андрей', 'Алексей', 'Артём', 'Илья', 'Кирилл', 'Михаил',
+    'Никита', 'Матвей', 'Роман', 'Егор', 'Иван',
+)
+FEMALE_FIRST_NAMES = (
+    'Анастасия', 'Мария', 'Анна', 'Виктория', 'Екатерина', 'Наталья', 'Марина', 'Полина', 'Софья', 'Дарья',
+    'Елена', 'Ольга', 'Татьяна', 'Ирина', 'Юлия',
+)
+PATRONYMIC_STEMS = ('Александров', 'Дмитриев', 'Сергеев', 'Андреев', 'Алексеев', 'Иванов', 'Михайлов', 'Петров')
+# пункт -> (начало почтового индекса, относительный вес: крупные города получают и отправляют больше)
+CITIES = {
+    'Москва': (101000, 30), 'Санкт-Петербург': (190000, 15), 'Новосибирск': (630000, 5),
+    'Екатеринбург': (620000, 5), 'Казань': (420000, 4), 'Нижний Новгород': (603000, 4),
+    'Челябинск': (454000, 3), 'Самара': (443000, 3), 'Омск': (644000, 3), 'Ростов-на-Дону': (344000, 3),
+    'Уфа': (450000, 3), 'Красноярск': (660000, 3), 'Пермь': (614000, 2), 'Воронеж': (394000, 2),
+    'Волгоград': (400000, 2), 'Краснодар': (350000, 2), 'Саратов': (410000, 1), 'Тюмень': (625000, 1),
+    'Иркутск': (664000, 1), 'Владивосток': (690000, 1), 'Калининград': (236000, 1), 'Мурманск': (183000, 1),
+}
+# тип -> доля: простые письма и посылки встречаются чаще ценных и экспресс
+LETTER_TYPE_WEIGHTS = {1: 60, 2: 30, 3: 6, 4: 4}
+PARCEL_TYPE_WEIGHTS = {1: 35, 2: 40, 3: 10, 4: 7, 5: 5, 6: 3}
+DATE_SPAN_DAYS = 730
+END_DATE = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def full_name(rng):
+    surname, stem = rng.choice(MALE_SURNAMES), rng.choice(PATRONYMIC_STEMS)
+    if rng.random() < 0.5:
+        return f'{surname} {rng.choice(MALE_FIRST_NAMES)} {stem}ич'
+    return f'{surname}а {rng.choice(FEMALE_FIRST_NAMES)} {stem}на'
+
+
+class ShipmentGenerator:
+    """
+    Бесконечный воспроизводимый поток полей отправлений одного вида ('letters' или 'parcels').
+    """
+
+    def __init__(self, kind, seed=0):
+        self.kind = kind
+        self.rng = random.Random(f'{kind}:{seed}')
+        self.cities = list(CITIES)
+        self.city_weights = [weight for _, weight in CITIES.values()]
+        weights = LETTER_TYPE_WEIGHTS if kind == 'letters' else PARCEL_TYPE_WEIGHTS
+        self.types, self.type_weights = list(weights), list(weights.values())
+
+    def location(self):
+        return self.rng.choices(self.cities, self.city_weights)[0]
+
+    def record(self):
+        rng = self.rng
+        origin = self.location()
+        destination = self.location()
+        while destination == origin:
+            destination = self.location()
+        created_at = END_DATE - datetime.timedelta(seconds=rng.randrange(DATE_SPAN_DAYS * 86400))
+        record = {
+            'sender_full_name': full_name(rng),
+            'recipient_full_name': full_name(rng),
+            'origin_location': origin,
+            'destination_location': destination,
+            'origin_postcode': CITIES[origin][0] + rng.randrange(1000),
+            'destination_postcode': CITIES[destination][0] + rng.randrange(1000),
+            'created_at': created_at,
+        }
+        shipment_type = rng.choices(self.types, self.type_weights)[0]
+        if self.kind == 'letters':
+            record['letter_type'] = shipment_type
+            # вес письма: в основном до 100 г, изредка тяжелее
+            record['weight_kg'] = f'{min(max(rng.lognormvariate(-3.5, 0.8), 0.001), 2):.3f}'
+        else:
+            record['parcel_type'] = shipment_type
+            record['notification_phone'] = f'+79{rng.randrange(10 ** 9):09d}'
+            record['payment_amount'] = f'{rng.choice((0, 0, 0, rng.uniform(50, 50000))):.2f}'
+        return record
+
+    def records(self, rows):
+        for _ in range(rows):
+            yield self.record()
+
+
+def generate_shipments(kind, rows, seed=0, batch_size=5000):
+    """
+    Записывает rows сгенерированных отправлений в текущую базу загрузчиком import_shipments.
+    """
+    from decimal import Decimal
+
+    from django.db import connection, transaction
+    from parcels.importing import LOADERS, import_columns, import_target, intern_rows
+
+    model, _ = import_target(kind)
+    loader = LOADERS[connection.vendor](connection, model)
+    fields = import_columns(model)
+    decimals = {field.name for field in fields if field.get_internal_type() == 'DecimalField'}
+    records = ShipmentGenerator(kind, seed).records(rows)
+    for start in range(0, rows, batch_size):
+        batch = []
+        for _, record in zip(range(batch_size), records):
+            record['updated_at'] = record['created_at']
+            batch.append(tuple(
+                Decimal(record[field.name]) if field.name in decimals else record[field.name] for field in fields
+            ))
+        with transaction.atomic():
+            # пункты — id словаря (названий немного, они берутся из кеша словаря)
+            loader.load(intern_rows(model, batch, connection.alias))
+
+
+def generate_letters(rows, seed=0, batch_size=5000):
+    generate_shipments('letters', rows, seed=seed, batch_size=batch_size)
+
+
+def generate_parcels(rows, seed=0, batch_size=5000):
+    generate_shipments('parcels', rows, seed=seed, batch_size=batch_size)
+
+
+def ensure_rows(model, kind, rows):
+    """
+    Догенерирует данные до rows строк (для повторных запусков с keepdb).
+    """
+    from parcels.rollups import ROLLUP_SOURCES, rebuild_rollups
+
+    existing = model.objects.count()
+    if existing < rows:
+        generate_shipments(kind, rows - existing, seed=existing)
+        # генератор пишет в обход API, поэтому сводки пересчитываются целиком
+        rebuild_rollups(ROLLUP_SOURCES[model])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('kind', choices=('letters', 'parcels'))
+    parser.add_argument('rows', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='файл .csv или .jsonl (по умолчанию JSONL в stdout)')
+    args = parser.parse_args()
+
+    records = ShipmentGenerator(args.kind, args.seed).records(args.rows)
+    f = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        if args.output and args.output.lower().endswith('.csv'):
+            first = next(records, None)
+            if first is not None:
+                writer = csv.DictWriter(f, fieldnames=list(first))
+                writer.writeheader()
+                writer.writerow(first)
+                writer.writerows(records)
+        else:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+    finally:
+        if args.output:
+            f.close()
+
+
+if __name__ == '__main__':
+    main()
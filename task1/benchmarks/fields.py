@@ -0,0 +1,73 @@
+"""
+Разреженные наборы полей: размер ответа и задержка списка и карточки с ?fields= / ?omit=
+против полного представления.
+
+    python -m benchmarks.fields --rows 1000000 --keepdb --output fields.json
+
+Запросы идут через тестовый клиент Django (весь стек middleware и DRF), кеш ответов отключён.
+"""
+import argparse
+import os
+import random
+
+from benchmarks import setup, benchmark_database, environment, profile, write_results
+
+KINDS = ('letters', 'parcels')
+
+# набор колонок грида и мобильного клиента; omit убирает только длинные текстовые поля
+VARIANTS = {
+    'full': {},
+    'grid': {'fields': 'id,sender_full_name,destination_location,created_at'},
+    'mobile': {'fields': 'id,destination_postcode,updated_at'},
+    'omit_text': {'omit': 'sender_full_name,recipient_full_name,origin_location,destination_location'},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000, help='строк каждого вида')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keepdb', action='store_true', help='не удалять базу с данными после запуска')
+    parser.add_argument('--output', help='файл для JSON-результатов (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    os.environ['SHIPMENT_CACHE_BACKEND'] = 'dummy'
+    setup()
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from benchmarks.datagen import ensure_rows
+    from parcels.importing import import_target
+
+    setup_test_environment(debug=False)
+    with benchmark_database(keepdb=args.keepdb):
+        results = {
+            'environment': environment(),
+            'parameters': {'rows': args.rows, 'repeat': args.repeat, 'page_size': args.page_size},
+            'results': {},
+        }
+        client = Client()
+        for kind in KINDS:
+            model, _ = import_target(kind)
+            ensure_rows(model, kind, args.rows)
+            ids = list(model.objects.order_by('?').values_list('id', flat=True)[:10000])
+            rng = random.Random(args.seed)
+            results['results'][kind] = {}
+            for variant, params in VARIANTS.items():
+                requests = {
+                    'list': lambda params=params: client.get(f'/api/v1/{kind}', dict(params, page_size=args.page_size)),
+                    'detail': lambda params=params: client.get(f'/api/v1/{kind}/{rng.choice(ids)}', params),
+                }
+                for name, request in requests.items():
+                    response = request()
+                    assert response.status_code == 200, (kind, variant, name, response.status_code)
+                    result = profile(request, args.repeat)
+                    result['payload_bytes'] = len(response.content)
+                    results['results'][kind][f'{name}_{variant}'] = result
+
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Нагрузочный тест живой ленты изменений: тысячи простаивающих SSE-подписчиков на одном процессе ASGI.
+
+    python -m benchmarks.live --subscribers 5000
+
+Соединения открываются прямо через ASGI-приложение (без сети), поэтому замер показывает
+стоимость подписки в самом сервисе: память Python на подписчика (tracemalloc) и время,
+за которое одно изменение письма доходит до всех подписчиков.
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+from benchmarks import setup, benchmark_database, write_results
+
+
+class Connection:
+    """
+    Одно HTTP-соединение к ASGI-приложению: запрос уже прочитан, клиент молчит до отключения.
+    """
+
+    def __init__(self, application, path, query_string):
+        self.disconnected = asyncio.Event()
+        self.chunks = 0
+        self.changes = 0
+        self.status = None
+        self.ready = asyncio.Event()
+        self.changed = asyncio.Event()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query_string.encode(),
+            'headers': [(b'host', b'localhost'), (b'accept', b'text/event-stream')],
+            'server': ('localhost', 80), 'client': ('127.0.0.1', 50000),
+        }
+        self.request_sent = False
+        self.task = asyncio.create_task(application(scope, self.receive, self.send))
+
+    async def receive(self):
+        if not self.request_sent:
+            self.request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        elif message.get('body'):
+            self.chunks += 1
+            if b'event: ready' in message['body']:
+                self.ready.set()
+            if b'event: change' in message['body']:
+                self.changes += 1
+                self.changed.set()
+
+
+async def idle_application(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'event: ready\n\n', 'more_body': True})
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def measure_memory(open_connections):
+    """
+    Открывает соединения под tracemalloc: (соединения, прирост памяти Python в байтах).
+    """
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    connections = open_connections()
+    await asyncio.gather(*(connection.ready.wait() for connection in connections))
+    memory = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return connections, memory
+
+
+async def run(subscribers, filtered, memory_sample):
+    from asgiref.sync import sync_to_async
+    from parcels.live import broker
+    from post_service.asgi import application
+    from parcels.models import Letter
+    from parcels.signals import notify_shipments_changed
+
+    letter = await Letter.objects.afirst()
+
+    # прогрев: первый запрос платит за импорт URLconf и подготовку middleware
+    warmup = Connection(application, '/api/v1/letters/live', '')
+    await warmup.ready.wait()
+    warmup.disconnected.set()
+    await warmup.task
+
+    def connect(count, offset=0):
+        # часть подписчиков с фильтрами: группы с одинаковыми фильтрами проверяются одним запросом
+        return [
+            Connection(application, '/api/v1/letters/live', f'origin_region={index % 10}' if index < filtered else '')
+            for index in range(offset, offset + count)
+        ]
+
+    started = time.perf_counter()
+    connections = connect(subscribers)
+    await asyncio.gather(*(connection.ready.wait() for connection in connections))
+    connect_seconds = time.perf_counter() - started
+
+    # память — на отдельной партии подписчиков: tracemalloc замедляет подключение в разы
+    sample, memory = await measure_memory(lambda: connect(memory_sample, offset=subscribers))
+    # то же число соединений к ASGI-приложению, которое только держит соединение: стоимость самих
+    # объектов Connection и задач, которая есть у любого долгого соединения
+    idle, idle_memory = await measure_memory(lambda: [Connection(idle_application, '/', '') for _ in range(memory_sample)])
+    for connection in idle:
+        connection.disconnected.set()
+    connections += sample
+
+    def update():
+        letter.weight_kg = '0.250'
+        letter.save()
+        notify_shipments_changed(Letter, 'update', [letter])
+
+    started = time.perf_counter()
+    await sync_to_async(update)()
+    # запись только ставит изменение в очередь: фильтры подписок проверяет фоновый поток рассылки
+    write_seconds = time.perf_counter() - started
+    # подписчики, под фильтры которых письмо не подходит, тоже получают событие — как об удалённом из выборки
+    await asyncio.gather(*(connection.changed.wait() for connection in connections))
+    fanout_seconds = time.perf_counter() - started
+
+    for connection in connections:
+        connection.disconnected.set()
+    await asyncio.gather(*(connection.task for connection in connections + idle))
+
+    return {
+        'subscribers': len(connections),
+        'filtered_subscribers': filtered,
+        'statuses': sorted({connection.status for connection in connections}),
+        'connect_per_sec': round(subscribers / connect_seconds, 1),
+        'memory_per_connection_kib': round(memory / memory_sample / 1024, 2),
+        'memory_idle_connection_kib': round(idle_memory / memory_sample / 1024, 2),
+        'memory_subscription_kib': round((memory - idle_memory) / memory_sample / 1024, 2),
+        'memory_projected_mib': round(memory / memory_sample * len(connections) / 1024 / 1024, 2),
+        'write_ms': round(write_seconds * 1000, 2),
+        'fanout_ms': round(fanout_seconds * 1000, 2),
+        'received_change': sum(1 for connection in connections if connection.changes),
+        'subscribers_after_disconnect': broker.subscriber_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscribers', type=int, default=5000)
+    parser.add_argument('--filtered', type=int, default=1000, help='сколько подписчиков подписаны с фильтром')
+    parser.add_argument('--memory-sample', type=int, default=500, help='сколько подписчиков подключается под tracemalloc')
+    parser.add_argument('--output', help='файл для JSON-результатов (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    os.environ['SHIPMENT_ASYNC_API'] = 'True'
+    os.environ['SHIPMENT_CACHE_BACKEND'] = 'dummy'
+    setup()
+    from django.conf import settings
+    from benchmarks.datagen import generate_letters
+
+    # журнал запросов не должен писать тысячи строк о долгих SSE-соединениях
+    settings.SHIPMENT_SLOW_REQUEST_MS = float('inf')
+    with benchmark_database():
+        generate_letters(100, seed=0)
+        results = asyncio.run(run(args.subscribers, min(args.filtered, args.subscribers), args.memory_sample))
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Словарь пунктов: размер строки таблицы писем и задержка фильтра по пункту с названиями в каждой строке
+(как до словаря) и с целыми ключами словаря.
+
+    python -m benchmarks.locations --rows 1000000 --output locations.json
+
+Раскладка «до» воссоздаётся копией таблицы писем, где пункты — текстовые колонки (CREATE TABLE AS SELECT
+с JOIN словаря). Фильтр по названию замеряется без индекса (так было до словаря) и с составным индексом
+(пункт, created_at, id), как у ключей словаря, — чтобы отделить выигрыш индекса от выигрыша ширины ключа.
+Страница читается одним и тем же SQL; отдельно замеряется список API с фильтром (кеш ответов отключён).
+"""
+import argparse
+import os
+
+from benchmarks import setup, benchmark_database, environment, measure, profile, write_results
+
+NAMES_TABLE = 'benchmark_letter_names'
+NAMES_INDEX = 'benchmark_letter_names_origin'
+
+# байты страниц таблицы без индексов
+TABLE_BYTES = {
+    'sqlite': 'SELECT SUM(pgsize) FROM dbstat WHERE name = %s',
+    'postgresql': 'SELECT pg_table_size(%s::regclass)',
+}
+
+
+def table_bytes(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute(TABLE_BYTES[connection.vendor], [table])
+        return cursor.fetchone()[0]
+
+
+def create_names_table(connection, model):
+    """
+    Копия таблицы model с названиями пунктов вместо ключей словаря.
+    """
+    qn = connection.ops.quote_name
+    columns, joins = [], []
+    for field in model._meta.concrete_fields:
+        if field.is_relation:
+            alias = qn(field.name)
+            columns.append(f'{alias}.name AS {alias}')
+            joins.append(f'JOIN {qn(field.related_model._meta.db_table)} {alias} ON {alias}.id = s.{qn(field.column)}')
+        else:
+            columns.append(f's.{qn(field.column)}')
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {NAMES_TABLE}')
+        cursor.execute(
+            f'CREATE TABLE {NAMES_TABLE} AS SELECT {", ".join(columns)} '
+            f'FROM {qn(model._meta.db_table)} s {" ".join(joins)}'
+        )
+
+
+def page_query(connection, table, column, page_size):
+    qn = connection.ops.quote_name
+    sql = (
+        f'SELECT * FROM {qn(table)} WHERE {qn(column)} = %s '
+        f'ORDER BY {qn("created_at")} DESC, {qn("id")} DESC LIMIT {int(page_size)}'
+    )
+
+    def run(value):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [value])
+            return cursor.fetchall()
+
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--keepdb', action='store_true', help='не удалять базу с данными после запуска')
+    parser.add_argument('--output', help='файл для JSON-результатов (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    os.environ['SHIPMENT_CACHE_BACKEND'] = 'dummy'
+    setup()
+    from django.db.models import Count
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from benchmarks.datagen import ensure_rows
+    from parcels.models import Letter, Location
+
+    setup_test_environment(debug=False)
+    with benchmark_database(keepdb=args.keepdb) as connection:
+        ensure_rows(Letter, 'letters', args.rows)
+        # самый частый пункт: у фильтра без индекса это лучший случай, у индексного — самая длинная выборка
+        name = (
+            Letter.objects.values_list('origin_location__name', flat=True)
+            .annotate(count=Count('id')).order_by('-count').first()
+        )
+        location = Location.objects.get(name=name)
+        rows = Letter.objects.count()
+        create_names_table(connection, Letter)
+
+        by_name = page_query(connection, NAMES_TABLE, 'origin_location', args.page_size)
+        by_id = page_query(connection, Letter._meta.db_table, Letter._meta.get_field('origin_location').column,
+                           args.page_size)
+        results = {
+            'environment': environment(),
+            'parameters': {'rows': args.rows, 'page_size': args.page_size, 'repeat': args.repeat,
+                           'location': name, 'locations': Location.objects.count()},
+            'row_bytes': {
+                'names': round(table_bytes(connection, NAMES_TABLE) / rows, 1),
+                'ids': round(table_bytes(connection, Letter._meta.db_table) / rows, 1),
+            },
+            'filter': {'names_unindexed': measure(lambda: by_name(name), args.repeat)},
+        }
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE INDEX {NAMES_INDEX} ON {NAMES_TABLE} '
+                f'({qn("origin_location")}, {qn("created_at")}, {qn("id")})'
+            )
+        results['filter']['names_indexed'] = measure(lambda: by_name(name), args.repeat)
+        results['filter']['ids'] = measure(lambda: by_id(location.pk), args.repeat)
+
+        client = Client()
+        results['api'] = profile(
+            lambda: client.get('/api/v1/letters', {'origin_location': name, 'page_size': args.page_size}),
+            args.repeat,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {NAMES_TABLE}')
+
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Форматы ответа списка: время кодирования и размер страницы в JSON (JSONRenderer DRF),
+колоночном JSON и MessagePack — без сжатия, с gzip и с brotli (если установлен).
+
+    python -m benchmarks.renderers --rows 100000 --page-size 1000 --output renderers.json
+
+Кодируются данные страниц, уже прочитанных быстрым путём списка, поэтому замер не включает SQL.
+"""
+import argparse
+import os
+
+from benchmarks import setup, benchmark_database, environment, measure, write_results
+
+KINDS = ('letters', 'parcels')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000, help='строк каждого вида')
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--keepdb', action='store_true', help='не удалять базу с данными после запуска')
+    parser.add_argument('--output', help='файл для JSON-результатов (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    os.environ['SHIPMENT_CACHE_BACKEND'] = 'dummy'
+    setup()
+    from django.utils.text import compress_string
+    from rest_framework.renderers import JSONRenderer
+    from benchmarks.datagen import ensure_rows
+    from parcels import constants as const
+    from parcels.importing import import_target
+    from parcels.middleware import brotli
+    from parcels.renderers import ShipmentColumnarRenderer, ShipmentMessagePackRenderer
+    from parcels.serializers import ShipmentFastReader
+
+    renderers = {
+        'json': JSONRenderer(),
+        'columnar': ShipmentColumnarRenderer(),
+        'msgpack': ShipmentMessagePackRenderer(),
+    }
+    compressors = {'identity': None, 'gzip': compress_string}
+    if brotli is not None:
+        compressors['br'] = lambda content: brotli.compress(content, quality=const.COMPRESS_BROTLI_QUALITY)
+
+    with benchmark_database(keepdb=args.keepdb):
+        results = {
+            'environment': environment(),
+            'parameters': {'rows': args.rows, 'page_size': args.page_size, 'repeat': args.repeat},
+            'results': {},
+        }
+        for kind in KINDS:
+            model, serializer_class = import_target(kind)
+            ensure_rows(model, kind, args.rows)
+            reader = ShipmentFastReader.for_serializer(serializer_class)
+            page = reader.to_representation(reader.rows(model.objects.order_by('-created_at', '-id'))[:args.page_size])
+            data = {'next': None, 'previous': None, 'results': page}
+            results['results'][kind] = {}
+            for name, renderer in renderers.items():
+                content = renderer.render(data)
+                for encoding, compress in compressors.items():
+                    if compress is None:
+                        encode = lambda renderer=renderer: renderer.render(data)
+                        size = len(content)
+                    else:
+                        encode = lambda renderer=renderer, compress=compress: compress(renderer.render(data))
+                        size = len(compress(content))
+                    result = measure(encode, args.repeat)
+                    result['payload_bytes'] = size
+                    results['results'][kind][f'{name}_{encoding}'] = result
+
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Сравнение задержки поиска: индексированный бэкенд (FTS5 / tsvector+GIN) против icontains.
+
+    python -m benchmarks.search --rows 10000000 --keepdb --output search.json
+"""
+import argparse
+import operator
+from functools import reduce
+
+from benchmarks import setup, benchmark_database, measure, write_results
+
+QUERIES = ('иванов', 'казань', 'смирнов дмитрий', 'петров самара', 'новосиб')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--keepdb', action='store_true', help='не удалять базу с данными после запуска')
+    parser.add_argument('--output', help='файл для JSON-результатов (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    setup()
+    from django.db.models import Q
+    from benchmarks.datagen import generate_letters
+    from parcels.models import Letter
+    from parcels.search import SEARCH_RANK, search_queryset
+    from parcels.views import LetterViewSet
+
+    def icontains(text):
+        conditions = (
+            reduce(operator.or_, (Q(**{f'{field}__icontains': term}) for field in LetterViewSet.search_fields))
+            for term in text.split()
+        )
+        return Letter.objects.filter(reduce(operator.and_, conditions))
+
+    with benchmark_database(keepdb=args.keepdb) as connection:
+        existing = Letter.objects.count()
+        if existing < args.rows:
+            generate_letters(args.rows - existing, seed=existing)
+
+        results = {'vendor': connection.vendor, 'rows': Letter.objects.count(), 'queries': {}}
+        for text in QUERIES:
+            indexed = search_queryset(Letter.objects.all(), text.split())
+            legacy = icontains(text)
+            results['queries'][text] = {
+                # первая страница грида: последние записи, подходящие под запрос
+                'icontains_first_page': measure(lambda: list(legacy.order_by('-created_at', '-id')[:50]), args.repeat),
+                'indexed_first_page': measure(lambda: list(indexed.order_by('-created_at', '-id')[:50]), args.repeat),
+                'indexed_ranked_page': measure(lambda: list(indexed.order_by('-' + SEARCH_RANK, '-id')[:50]), args.repeat),
+                'matches': indexed.count(),
+            }
+
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,35 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_indexes(sender, using, **kwargs):
+    # SQLite пересоздаёт таблицу при части миграций, и триггеры FTS теряются — восстанавливаем их
+    from django.db.migrations.executor import MigrationExecutor
+    from .search import install_search_indexes
+    executor = MigrationExecutor(connections[using])
+    if executor.migration_plan(executor.loader.graph.leaf_nodes(sender.label)):
+        # схема не на последней миграции (например, после отката): индексы такой схемы ставят
+        # сами миграции, а текущие модели ей не соответствуют
+        return
+    models = [sender.get_model(name) for name in ('Letter', 'Parcel', 'ArchivedLetter', 'ArchivedParcel')]
+    install_search_indexes(connections[using], models)
 
 
 class ParcelsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'parcels'
+
+    def ready(self):
+        from . import cache  # noqa: F401 — подключает инвалидацию кеша к shipments_changed
+        from . import rollups  # noqa: F401 — подключает обновление сводок к shipments_changed
+        from . import sync  # noqa: F401 — подключает запись отметок об удалениях к shipments_changed
+        from . import live  # noqa: F401 — подключает живую ленту изменений к shipments_changed
+        from .filters import install_casefold
+        from .instrumentation import install_query_recorder
+        post_migrate.connect(ensure_search_indexes, sender=self)
+        # casefold для поиска подстроки без учёта регистра в SQLite (SubstringFilter)
+        connection_created.connect(install_casefold)
+        # учёт числа и времени SQL-запросов для Server-Timing и журнала запросов
+        connection_created.connect(install_query_recorder)
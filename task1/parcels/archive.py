@@ -0,0 +1,182 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from . import constants as const
+from .cache import bump_generation
+from .models import ArchivedLetter, ArchivedParcel, Letter, Parcel
+
+# рабочая таблица -> архив
+ARCHIVE_MODELS = {
+    Letter: ArchivedLetter,
+    Parcel: ArchivedParcel,
+}
+
+
+def archive_horizon(now=None):
+    """
+    Граница архива: записи, созданные раньше неё, могут лежать в архиве. Перенос берёт только
+    записи старше SHIPMENT_ARCHIVE_AFTER_DAYS на момент переноса, поэтому позже границы архивных записей нет.
+    """
+    return (now or timezone.now()) - timedelta(days=settings.SHIPMENT_ARCHIVE_AFTER_DAYS)
+
+
+def reaches_archive(created_after=None, created_before=None):
+    """
+    Захватывает ли фильтр по дате создания архивный период. Без фильтра по дате архив не читается:
+    обычные списки работают только с рабочей таблицей.
+    """
+    if created_after is None and created_before is None:
+        return False
+    return created_after is None or created_after < archive_horizon()
+
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def next_month(moment):
+    return datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+class PostgresArchivePartitions:
+    """
+    Декларативное секционирование архива по месяцам created_at (PostgreSQL): перенос пишет строки
+    в секцию своего месяца, запрос с датой читает только нужные секции, а старый месяц удаляется
+    или выносится на другой диск целиком (DROP/DETACH PARTITION) без VACUUM большой таблицы.
+    Первичный ключ секционированной таблицы обязан включать ключ секционирования: (id, created_at).
+    """
+
+    def partition_name(self, table, month):
+        return f'{table}_y{month.year}m{month.month:02d}'
+
+    def is_partitioned(self, cursor, table):
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [table])
+        return cursor.fetchone() is not None
+
+    def install(self, connection, table):
+        """
+        Пересоздаёт пустую таблицу архива, созданную миграцией, как секционированную
+        с теми же колонками, ограничениями CHECK и индексами, и добавляет секцию DEFAULT.
+        """
+        with connection.cursor() as cursor:
+            if self.is_partitioned(cursor, table):
+                return
+            constraints = connection.introspection.get_constraints(cursor, table)
+            indexes = {
+                name: info['columns'] for name, info in constraints.items()
+                if info['index'] and not info['primary_key'] and not info['unique']
+            }
+            cursor.execute(
+                f'CREATE TABLE "{table}_partitioned" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                f'PARTITION BY RANGE ("created_at")'
+            )
+            cursor.execute(f'ALTER TABLE "{table}_partitioned" ADD PRIMARY KEY ("id", "created_at")')
+            cursor.execute(f'DROP TABLE "{table}"')
+            cursor.execute(f'ALTER TABLE "{table}_partitioned" RENAME TO "{table}"')
+            # индексы — с прежними именами, под которыми их знают миграции
+            for name, columns in indexes.items():
+                column_list = ', '.join(connection.ops.quote_name(column) for column in columns)
+                cursor.execute(f'CREATE INDEX "{name}" ON "{table}" ({column_list})')
+            # строки месяца без своей секции не теряются; ensure_partitions создаёт секции до переноса,
+            # поэтому DEFAULT остаётся пустой
+            cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+    def ensure_partitions(self, connection, table, first, last):
+        """
+        Создаёт недостающие месячные секции с месяца first по месяц last включительно.
+        """
+        month = month_start(first)
+        with connection.cursor() as cursor:
+            while month <= last:
+                following = next_month(month)
+                cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{self.partition_name(table, month)}" PARTITION OF "{table}" '
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+                )
+                month = following
+
+
+ARCHIVE_PARTITIONS = {
+    'postgresql': PostgresArchivePartitions(),
+}
+
+
+def install_archive_partitions(connection, tables):
+    partitions = ARCHIVE_PARTITIONS.get(connection.vendor)
+    if partitions is None:
+        return
+    for table in tables:
+        partitions.install(connection, table)
+
+
+def archive_chunk(model, before, chunk_size=const.ARCHIVE_CHUNK_SIZE):
+    """
+    Переносит в архив до chunk_size самых старых записей model, созданных раньше before:
+    INSERT … SELECT в архив и DELETE из рабочей таблицы в одной короткой транзакции, поэтому
+    блокировки держатся не дольше порции, а запись всегда видна ровно в одной из таблиц.
+    Возвращает число перенесённых записей.
+    """
+    archive_model = ARCHIVE_MODELS[model]
+    using = router.db_for_write(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(field.column) for field in model._meta.concrete_fields)
+    with transaction.atomic(using=using):
+        # порция — по индексу (created_at, id); FOR UPDATE не даёт изменить строку между копированием и удалением
+        ids = list(
+            model._base_manager.using(using).filter(created_at__lt=before).order_by('created_at', 'id')
+            .select_for_update().values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return 0
+        placeholders = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {qn(archive_model._meta.db_table)} ({columns}) '
+                f'SELECT {columns} FROM {qn(model._meta.db_table)} WHERE {qn("id")} IN ({placeholders})',
+                ids,
+            )
+        model._base_manager.using(using).filter(id__in=ids).delete()
+    # записи ушли из списков без фильтра по дате; сводки и отметки об удалениях не меняются —
+    # отправления не удалены, поэтому shipments_changed не отправляется
+    bump_generation(model)
+    return len(ids)
+
+
+def prepare_partitions(model, before):
+    """
+    Создаёт секции архива под месяцы записей, которые будут перенесены (на PostgreSQL).
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    partitions = ARCHIVE_PARTITIONS.get(connection.vendor)
+    if partitions is None:
+        return
+    oldest = model._base_manager.using(using).filter(created_at__lt=before).order_by('created_at')
+    oldest = oldest.values_list('created_at', flat=True).first()
+    if oldest is not None:
+        partitions.ensure_partitions(connection, ARCHIVE_MODELS[model]._meta.db_table, oldest, before)
+
+
+def archive_shipments(model, before=None, chunk_size=const.ARCHIVE_CHUNK_SIZE, limit=None, pause=0):
+    """
+    Переносит в архив записи model старше границы архива (before) порциями по chunk_size,
+    не больше limit записей за вызов. Между порциями — пауза pause секунд, чтобы перенос большой
+    истории (первый запуск) не мешал рабочей записи. Возвращает число перенесённых записей.
+    """
+    before = before or archive_horizon()
+    prepare_partitions(model, before)
+    moved = 0
+    while limit is None or moved < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - moved)
+        count = archive_chunk(model, before, size)
+        moved += count
+        if count < size:
+            break
+        if pause:
+            time.sleep(pause)
+    return moved
@@ -0,0 +1,213 @@
+import copy
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+
+from .cache import instance_validators
+from .ingest import enqueue, ingest_enabled
+from .instrumentation import timed
+from .renderers import ShipmentColumnarRenderer, ShipmentMessagePackRenderer
+from .routers import pin_to_primary, replica_reads
+from .signals import anotify_shipments_changed
+from .views import LetterViewSet, ParcelViewSet
+
+logger = logging.getLogger(__name__)
+
+
+# рендереры чтений, которым не нужен контекст DRF-вьюсета (в отличие от BrowsableAPIRenderer)
+READ_RENDERERS = (JSONRenderer(), ShipmentColumnarRenderer(), ShipmentMessagePackRenderer())
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def read_response(viewset, data):
+    """
+    Ответ чтения в формате, выбранном по Accept или ?format= (JSON, колоночный JSON, MessagePack).
+    """
+    renderer, media_type = viewset.get_content_negotiator().select_renderer(viewset.request, READ_RENDERERS)
+    response = HttpResponse(renderer.render(data), content_type=renderer.media_type)
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+class AsyncShipmentView(View):
+    """
+    Асинхронные list/retrieve/create/update/destroy для писем и посылок на async ORM Django.
+    Подключается вместо синхронных обработчиков при запуске через ASGI (см. post_service/asgi.py).
+
+    Конфигурацию (фильтры, поиск, сортировку, пагинацию, сериализатор) берёт из DRF-вьюсета
+    viewset_class, не вызывая его обработчиков, поэтому валидация и тексты ошибок совпадают.
+    Кеш ответов, ETag/Last-Modified и 304 — общие с вьюсетом (BaseShipmentViewSet.cached_read).
+    """
+    viewset_class = None
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def get_viewset(self, request, action):
+        viewset = self.viewset_class(action_map={request.method.lower(): action}, args=(), kwargs=self.kwargs)
+        viewset.format_kwarg = None
+        viewset.request = viewset.initialize_request(request)
+        return viewset
+
+    async def dispatch(self, request, *args, **kwargs):
+        with replica_reads(request):
+            response = await self.handle(request, *args, **kwargs)
+        return pin_to_primary(request, response)
+
+    async def handle(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except Http404:
+            name = self.viewset_class.queryset.model._meta.object_name
+            return json_response({"detail": f"No {name} matches the given query."}, status.HTTP_404_NOT_FOUND)
+        except APIException as e:
+            # тело ошибки — как у обработчика исключений DRF
+            data = e.detail if isinstance(e.detail, (list, dict)) else {"detail": e.detail}
+            return json_response(data, e.status_code)
+
+    async def get_object(self, viewset):
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        try:
+            return await queryset.aget(pk=self.kwargs['pk'])
+        except (queryset.model.DoesNotExist, ValueError):
+            raise Http404
+
+    async def get(self, request, *args, **kwargs):
+        if 'pk' in kwargs:
+            return await self.retrieve(request)
+        return await self.list(request)
+
+    async def post(self, request, *args, **kwargs):
+        return await self.create(request)
+
+    async def put(self, request, *args, **kwargs):
+        return await self.update(request, partial=False)
+
+    async def patch(self, request, *args, **kwargs):
+        return await self.update(request, partial=True)
+
+    async def delete(self, request, *args, **kwargs):
+        return await self.destroy(request)
+
+    async def list(self, request):
+        viewset = self.get_viewset(request, 'list')
+        expired = viewset.sync_expired_response()
+        if expired is not None:
+            return json_response(expired.data, expired.status_code)
+        # кеш ответов и 304 — те же, что у синхронного вьюсета; кеш и поколения — синхронные API
+        read = await sync_to_async(viewset.cached_read)('list')
+        not_modified = read.not_modified()
+        if not_modified is not None:
+            return not_modified
+        data = await sync_to_async(read.load)()
+        if data is None:
+            data = await sync_to_async(read.store)(await self.list_data(viewset))
+        return read.finish(read_response(viewset, data))
+
+    async def list_data(self, viewset):
+        """
+        Данные списка, как BaseShipmentViewSet.get_list_data, но строки читаются async ORM.
+        """
+        ids = viewset.get_requested_ids()
+        if ids is not None:
+            rows = [row for queryset in viewset.get_multi_get_querysets(ids) async for row in queryset]
+            with timed('serialize'):
+                return viewset.multi_get_data(ids, rows)
+        token = viewset.get_sync_token()
+        reader = viewset.get_fast_reader()
+        querysets = viewset.get_list_querysets()
+        parts = [reader.rows(queryset) for queryset in querysets]
+        page_rows = viewset.get_page_rows(parts)
+        if page_rows is None:
+            rows = [row async for row in viewset.union_rows(parts)]
+            with timed('serialize'):
+                return reader.to_representation(rows)
+        paginator = viewset.paginator
+        page = paginator.set_page([row async for row in page_rows])
+        deleted_ids = viewset.get_deleted_ids()
+        if deleted_ids is not None:
+            deleted_ids = [pk async for pk in deleted_ids]
+        with timed('serialize'):
+            data = paginator.get_paginated_response(reader.to_representation(page)).data
+        if viewset.count_requested():
+            # оценка числа строк читает статистику СУБД курсором и ходит в кеш — это синхронные API
+            viewset.add_count_data(data, await sync_to_async(viewset.get_count)(querysets))
+        return viewset.add_sync_data(data, token, deleted_ids)
+
+    async def retrieve(self, request):
+        viewset = self.get_viewset(request, 'retrieve')
+        read = await sync_to_async(viewset.cached_read)('retrieve')
+        data = await sync_to_async(read.load)()
+        if data is None:
+            instance = await self.get_object(viewset)
+            read.validate(*instance_validators(instance, viewset.get_field_selection()))
+        not_modified = read.not_modified()
+        if not_modified is not None:
+            return not_modified
+        if data is None:
+            with timed('serialize'):
+                data = viewset.get_serializer(instance).data
+            await sync_to_async(read.store)(data)
+        return read.finish(read_response(viewset, data))
+
+    async def create(self, request):
+        viewset = self.get_viewset(request, 'create')
+        serializer = viewset.get_serializer(data=viewset.request.data)
+        if not serializer.is_valid():
+            logger.info("Ошибка валидации при создании: %s", serializer.errors)
+            return json_response({"error": "Неверные данные", "details": serializer.errors}, status.HTTP_400_BAD_REQUEST)
+
+        model = viewset.queryset.model
+        if ingest_enabled():
+            ticket = await sync_to_async(enqueue)(model, serializer.validated_data)
+            accepted = viewset.ingest_response(viewset.request, ticket)
+            response = json_response(accepted.data, accepted.status_code)
+            response['Location'] = accepted['Location']
+            return response
+        # сохранение заносит пункты в словарь в транзакции записи (intern_locations) — это синхронный ORM
+        await sync_to_async(serializer.save)()
+        await anotify_shipments_changed(model, 'create', [serializer.instance])
+        return json_response(serializer.data, status.HTTP_201_CREATED)
+
+    async def update(self, request, partial):
+        viewset = self.get_viewset(request, 'partial_update' if partial else 'update')
+        instance = await self.get_object(viewset)
+        serializer = viewset.get_serializer(instance, data=viewset.request.data, partial=partial)
+        if not serializer.is_valid():
+            return json_response(
+                {"error": "Не удалось обновить. Ошибки валидации.", "details": serializer.errors},
+                status.HTTP_400_BAD_REQUEST
+            )
+
+        previous = [copy.copy(instance)]
+        await sync_to_async(serializer.save)()
+        await anotify_shipments_changed(viewset.queryset.model, 'update', [instance], previous=previous)
+        return json_response(serializer.data)
+
+    async def destroy(self, request):
+        viewset = self.get_viewset(request, 'destroy')
+        instance = await self.get_object(viewset)
+        pks = [instance.pk]
+        await instance.adelete()
+        await anotify_shipments_changed(viewset.queryset.model, 'delete', [instance], pks=pks)
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncLetterView(AsyncShipmentView):
+    viewset_class = LetterViewSet
+
+
+class AsyncParcelView(AsyncShipmentView):
+    viewset_class = ParcelViewSet
@@ -0,0 +1,111 @@
+import copy
+import operator
+from functools import reduce
+
+from django.db import router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import constants as const
+from .locations import intern_locations
+from .models import Location
+from .signals import notify_shipments_changed
+
+# Длинные текстовые поля не нужны получателям shipments_changed (сводкам — тип, сумма, индексы
+# и дата создания; кешу, синхронизации и живой ленте — только id), поэтому порции читаются без них.
+# Пункты хранятся целыми ключами словаря — их читать дёшево.
+UNTRACKED_FIELDS = ('sender_full_name', 'recipient_full_name')
+
+
+def _same_value(field, value):
+    return Q(**{field: value})
+
+
+def _same_location(field, location):
+    # пункт в changes — несохранённая запись словаря (см. LocationField), поэтому сравнение идёт по ключу
+    # IN-подзапросом: без JOIN словаря (FOR UPDATE порции заблокировал бы и его строки) и без NULL,
+    # если такого пункта в словаре ещё нет (тогда конфликтов нет)
+    return Q(**{f'{field}__in': Location.objects.filter(key=location.key).values('pk')})
+
+
+# Пары полей из инвариантов BaseShipmentSerializer.validate и условие «поле равно новому значению» в SQL.
+INVARIANT_PAIRS = (
+    ('origin_postcode', 'destination_postcode', _same_value),
+    ('origin_location', 'destination_location', _same_location),
+)
+
+
+def invariant_conflicts(changes):
+    """
+    Условие на записи, которые после changes нарушили бы инварианты validate: новое значение одного поля
+    пары совпало бы с текущим значением другого. None, если изменения таких конфликтов дать не могут
+    (если меняются оба поля пары, их уже сравнил сериализатор).
+    """
+    conditions = []
+    for first, second, same in INVARIANT_PAIRS:
+        if (first in changes) == (second in changes):
+            continue
+        changed, other = (first, second) if first in changes else (second, first)
+        conditions.append(same(other, changes[changed]))
+    return reduce(operator.or_, conditions) if conditions else None
+
+
+def _in_chunks(queryset, apply, chunk_size):
+    """
+    Обходит записи queryset порциями по возрастанию id (keyset по первичному ключу, без OFFSET)
+    и применяет apply к каждой порции в отдельной транзакции: блокировки держатся не дольше порции.
+    Возвращает число обработанных записей.
+    """
+    using = router.db_for_write(queryset.model)
+    # без JOIN словаря пунктов из get_queryset вьюсета: FOR UPDATE заблокировал бы и строки словаря
+    queryset = queryset.using(using).select_related(None).order_by('pk').defer(*UNTRACKED_FIELDS).select_for_update()
+    processed, last_pk = 0, None
+    while True:
+        with transaction.atomic(using=using):
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            chunk = list(chunk[:chunk_size])
+            if not chunk:
+                return processed
+            apply(chunk)
+        processed += len(chunk)
+        last_pk = chunk[-1].pk
+
+
+def bulk_update(queryset, changes, chunk_size=const.BULK_CHUNK_SIZE):
+    """
+    Записывает changes во все записи queryset одним UPDATE на порцию и сдвигает их updated_at.
+    Записи, для которых изменения нарушили бы инварианты, не меняются (см. invariant_conflicts).
+    """
+    model = queryset.model
+    conflicts = invariant_conflicts(changes)
+    if conflicts is not None:
+        queryset = queryset.exclude(conflicts)
+
+    def apply(chunk):
+        previous = [copy.copy(instance) for instance in chunk]
+        # пункты заносятся в словарь в транзакции порции; после коммита первой порции они берутся из кеша
+        values = intern_locations([dict(changes)])[0]
+        # update() не заполняет auto_now, поэтому updated_at задаётся явно
+        updated_at = timezone.now()
+        model._base_manager.filter(pk__in=[instance.pk for instance in chunk]).update(updated_at=updated_at, **values)
+        for instance in chunk:
+            for name, value in values.items():
+                setattr(instance, name, value)
+            instance.updated_at = updated_at
+        notify_shipments_changed(model, 'update', chunk, previous=previous)
+
+    return _in_chunks(queryset, apply, chunk_size)
+
+
+def bulk_delete(queryset, chunk_size=const.BULK_CHUNK_SIZE):
+    """
+    Удаляет все записи queryset одним DELETE на порцию.
+    """
+    model = queryset.model
+
+    def apply(chunk):
+        pks = [instance.pk for instance in chunk]
+        model._base_manager.filter(pk__in=pks).delete()
+        notify_shipments_changed(model, 'delete', chunk, pks=pks)
+
+    return _in_chunks(queryset, apply, chunk_size)
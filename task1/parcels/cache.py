@@ -0,0 +1,138 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .routers import current_replica
+from .signals import shipments_changed
+
+# Алиас кеша ответов в settings.CACHES
+SHIPMENT_CACHE = 'shipments'
+
+
+def get_cache():
+    return caches[SHIPMENT_CACHE]
+
+
+def _generation_key(model):
+    return f'generation:{model._meta.label_lower}'
+
+
+def get_generation(model):
+    """
+    Текущее поколение данных модели. Входит в ключи и ETag'и кеша, поэтому
+    увеличение поколения разом инвалидирует все закешированные ответы модели.
+    """
+    cache = get_cache()
+    key = _generation_key(model)
+    generation = cache.get(key)
+    if generation is None:
+        # отсчёт от текущего времени: после сброса кеша поколения (а с ними и ETag'и) не повторяются
+        cache.add(key, time.time_ns(), timeout=None)
+        # DummyCache ничего не хранит: новое поколение на каждый запрос отключает и кеш, и ответы 304
+        generation = cache.get(key) or time.time_ns()
+    return generation
+
+
+def bump_generation(model):
+    cache = get_cache()
+    try:
+        cache.incr(_generation_key(model))
+    except ValueError:
+        cache.set(_generation_key(model), time.time_ns(), timeout=None)
+
+
+@receiver(shipments_changed)
+def invalidate_shipment_cache(sender, **kwargs):
+    bump_generation(sender)
+    # повторно после коммита: ответ, закешированный между записью и коммитом, содержит старые данные
+    transaction.on_commit(lambda: bump_generation(sender))
+
+
+def response_cache_key(model, request, kind):
+    """
+    Ключ ответа: модель, поколение, вид ответа и нормализованные параметры запроса
+    (отсортированы, пустые значения отброшены — фильтры и поиск их игнорируют).
+    Ответы с реплики кешируются отдельно: отстающая реплика не должна подменить
+    данные основной базы для клиента, который только что писал.
+    """
+    params = sorted(
+        (name, sorted(value for value in values if value))
+        for name, values in request.query_params.lists()
+        if any(values)
+    )
+    source = 'replica' if current_replica() else 'primary'
+    payload = json.dumps([request.get_host(), request.path, params, source], ensure_ascii=False)
+    digest = hashlib.md5(payload.encode('utf-8')).hexdigest()
+    return f'{model._meta.label_lower}:{get_generation(model)}:{kind}:{digest}'
+
+
+def list_validators(cache_key):
+    """
+    ETag списка. Last-Modified для списков не отдаётся: удаление записи не меняет
+    максимальный updated_at, и ответ 304 по If-Modified-Since был бы неверным.
+    """
+    return quote_etag(hashlib.md5(cache_key.encode('utf-8')).hexdigest()), None
+
+
+def instance_validators(instance, fields=None):
+    """
+    ETag и Last-Modified записи по её updated_at. ETag разреженного представления (fields)
+    отличается от ETag полного.
+    """
+    token = f'{instance._meta.label_lower}:{instance.pk}:{instance.updated_at.isoformat()}'
+    if fields is not None:
+        token += ':' + ','.join(fields)
+    etag = quote_etag(hashlib.md5(token.encode('utf-8')).hexdigest())
+    return etag, instance.updated_at.timestamp()
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class CachedRead:
+    """
+    Кеш ответа и условный GET (ETag, Last-Modified, 304) одного запроса list/retrieve.
+    Общий для синхронных обработчиков вьюсета и асинхронных (async_views): методы, которые ходят
+    в кеш (создание, load, store), асинхронный обработчик вызывает через sync_to_async.
+    ETag списка зависит только от ключа, поэтому 304 на список отдаётся без чтения кеша;
+    валидаторы записи берутся из кеша или, при промахе, из самой записи (validate).
+    """
+
+    def __init__(self, model, request, kind):
+        self.request = request
+        self.key = response_cache_key(model, request, kind)
+        self.etag, self.last_modified = list_validators(self.key) if kind == 'list' else (None, None)
+
+    def load(self):
+        """
+        Данные из кеша (вместе с их валидаторами) или None.
+        """
+        entry = get_cache().get(self.key)
+        if entry is None:
+            return None
+        data, self.etag, self.last_modified = entry
+        return data
+
+    def validate(self, etag, last_modified):
+        self.etag, self.last_modified = etag, last_modified
+
+    def not_modified(self):
+        response = get_conditional_response(self.request, etag=self.etag, last_modified=self.last_modified)
+        return None if response is None else self.finish(response)
+
+    def store(self, data):
+        get_cache().set(self.key, (data, self.etag, self.last_modified))
+        return data
+
+    def finish(self, response):
+        return set_validators(response, self.etag, self.last_modified)
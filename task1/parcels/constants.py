@@ -21,4 +21,130 @@ ERROR_MSG_POSTCODE_LENGTH = "Индекс должен состоять из 6 
 ERROR_MSG_WEIGHT_POSITIVE = "Вес должен быть положительным числом."
 ERROR_MSG_PAYMENT_NEGATIVE = "Сумма платежа не может быть отрицательной."
 ERROR_MSG_POSTCODE_MATCH = "Индекс отправки и назначения не должны совпадать."
-ERROR_MSG_LOCATION_MATCH = "Пункт отправки и назначения не должны совпадать."
\ No newline at end of file
+ERROR_MSG_LOCATION_MATCH = "Пункт отправки и назначения не должны совпадать."
+
+# --- Пагинация ---
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+# --- Пакетная регистрация ---
+BATCH_MAX_SIZE = 5000
+BULK_CREATE_BATCH_SIZE = 500
+
+
+# --- Выборка по списку id ---
+ERROR_MSG_IDS = "ids — список целых id через запятую, не больше {limit}."
+
+
+# --- Массовые изменения по фильтру ---
+# сколько записей изменяется или удаляется одним запросом (и одной транзакцией)
+BULK_CHUNK_SIZE = 1000
+BULK_MAX_IDS = 5000
+# сколько id конфликтующих записей возвращается в ответе
+BULK_MAX_REPORTED_CONFLICTS = 100
+ERROR_MSG_BULK_SELECTION = "Укажите фильтры списка или ids: массовая операция над всеми записями запрещена."
+ERROR_MSG_BULK_CHANGES = "Укажите изменяемые поля в changes."
+ERROR_MSG_BULK_CONFLICT = "Изменения нарушат правила для части записей: индексы или пункты отправки и получения совпадут."
+
+
+# --- Выгрузка ---
+EXPORT_CHUNK_SIZE = 2000
+ERROR_MSG_EXPORT_FORMAT = "Неподдерживаемый формат выгрузки. Допустимые значения: {formats}."
+
+
+# --- Импорт ---
+IMPORT_CHUNK_SIZE = 5000
+# сколько порций может одновременно находиться в пуле валидации (на один процесс)
+IMPORT_PREFETCH_CHUNKS = 2
+
+
+# --- Приём с отложенной записью ---
+# сколько записей журнала записывается в БД одной транзакцией
+INGEST_BATCH_SIZE = 1000
+# записи, взятые процессом, который не отметил их записанными за это время (упал), берутся повторно
+INGEST_CLAIM_TIMEOUT_SECONDS = 60
+# после стольких неудачных попыток записи запись журнала отмечается failed и больше не берётся
+INGEST_MAX_ATTEMPTS = 3
+# как часто flush_ingest --loop удаляет старые квитанции
+INGEST_PURGE_INTERVAL_SECONDS = 3600
+ERROR_MSG_INGEST_TICKET = "Квитанция не найдена."
+
+
+# --- Архив старых отправлений ---
+# сколько записей переносится в архив одной транзакцией
+ARCHIVE_CHUNK_SIZE = 1000
+# пауза между порциями archive_shipments (с): перенос большой истории уступает место рабочей записи
+ARCHIVE_PAUSE_SECONDS = 0.05
+# интервал archive_shipments --loop (с)
+ARCHIVE_INTERVAL_SECONDS = 3600
+
+
+# --- Словарь пунктов ---
+# сколько названий пунктов держит LRU-кеш процесса (название -> id словаря); пунктов — несколько тысяч
+LOCATION_CACHE_SIZE = 10_000
+
+
+# --- Форматы и сжатие ответов ---
+# качество brotli для динамических ответов: 11 (максимум) сжимает ненамного лучше, но в десятки раз медленнее
+COMPRESS_BROTLI_QUALITY = 5
+
+
+# --- Инструментирование запросов ---
+# сколько SQL-запросов одного HTTP-запроса сохраняется для журнала медленных запросов
+MAX_CAPTURED_QUERIES = 100
+# для скольких самых долгих из них в журнал пишется EXPLAIN
+SLOW_REQUEST_EXPLAIN_QUERIES = 5
+# границы корзин гистограммы задержки, секунды
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# --- Статистика ---
+ERROR_MSG_STATS_KIND = "Параметр kind обязателен. Допустимые значения: {kinds}."
+ERROR_MSG_STATS_GROUP_BY = "Недопустимая группировка. Допустимо: day и не более одного из {dimensions}."
+ERROR_MSG_STATS_DATE = "Дата должна быть в формате ГГГГ-ММ-ДД."
+
+
+# --- Фильтры по индексам ---
+POSTCODE_DIGITS = 6
+ERROR_MSG_POSTCODE_REGION = "Укажите префиксы индексов (1–6 цифр) через запятую, например 10,19."
+ERROR_MSG_POSTCODE_CORRIDOR = (
+    "Укажите направления вида <префикс отправки>-<префикс получения> через запятую, например 10-42,19-63."
+)
+
+
+# --- Единая лента ---
+ERROR_MSG_FEED_INCLUDE = "Недопустимые поля в include. Допустимые значения: {fields}."
+
+
+# --- Разреженные наборы полей ---
+ERROR_MSG_SPARSE_FIELDS = "Неизвестные поля в {param}. Допустимые значения: {fields}."
+
+
+# --- Инкрементальная синхронизация ---
+# sync_token отстаёт от текущего времени на это окно: запись, зафиксированная чуть позже
+# своего updated_at, всё равно попадёт в следующую синхронизацию (клиент получит её повторно)
+SYNC_OVERLAP_SECONDS = 5
+ERROR_MSG_SYNC_EXPIRED = (
+    "Отметки об удалениях старше {days} дн. уже удалены: выполните полную загрузку вместо updated_since."
+)
+# больше удалённых id первая страница синхронизации не отдаёт (после массового удаления это миллионы):
+# клиент получает 410 и загружает данные заново, как при сжатых отметках
+SYNC_MAX_DELETED = 10_000
+ERROR_MSG_SYNC_TOO_MANY_DELETED = (
+    "С updated_since удалено больше {limit} записей: выполните полную загрузку вместо updated_since."
+)
+
+
+# --- Живая лента изменений (SSE/WebSocket) ---
+# Сколько непрочитанных событий держится для одного клиента; при переполнении подписка закрывается
+LIVE_BUFFER_SIZE = 100
+# Интервал комментариев-пингов в простаивающем потоке (прокси закрывают молчащие соединения)
+LIVE_HEARTBEAT_SECONDS = 25
+# Пауза перед переподключением EventSource (мс)
+LIVE_RETRY_MS = 3000
+# Сколько изменений ждут рассылки фоновым потоком; сверх этого очередь сворачивается в resync по моделям
+LIVE_PUBLISH_QUEUE_SIZE = 1000
+ERROR_MSG_LIVE_FILTERS = "Неверные параметры фильтров подписки."
+ERROR_MSG_LIVE_METHOD = "Живая лента поддерживает только GET."
+ERROR_MSG_LIVE_OVERFLOW = "Клиент не успевает читать события: догоните изменения через updated_since."
@@ -0,0 +1,37 @@
+import csv
+
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class _Echo:
+    """
+    Псевдо-буфер для csv.writer: write() возвращает строку вместо накопления в памяти.
+    """
+    def write(self, value):
+        return value
+
+
+def iter_ndjson(rows, fields):
+    """
+    Выгрузка в NDJSON: одна JSON-строка на запись.
+    """
+    encoder = JSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+def iter_csv(rows, fields):
+    """
+    Выгрузка в CSV: строка заголовка с именами полей, затем по строке на запись.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+# формат -> (content type, расширение файла, генератор строк)
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson', iter_ndjson),
+    'csv': ('text/csv; charset=utf-8', 'csv', iter_csv),
+}
@@ -1,11 +1,168 @@
+import operator
+from functools import reduce
+
+from django import forms
+from django.db import connections
+from django.db.models import CharField, Func, Q
+from django.db.models.lookups import Contains
 from django_filters import rest_framework as filters
+from django_filters.constants import EMPTY_VALUES
+from .locations import location_id
 from .models import Letter, Parcel
+from . import constants as const
+
+
+def postcode_prefix_range(prefix):
+    """
+    Диапазон индексов региона: префикс '42' -> (420000, 429999).
+    """
+    if not prefix.isdigit() or len(prefix) > const.POSTCODE_DIGITS:
+        raise forms.ValidationError(const.ERROR_MSG_POSTCODE_REGION)
+    scale = 10 ** (const.POSTCODE_DIGITS - len(prefix))
+    return int(prefix) * scale, (int(prefix) + 1) * scale - 1
+
+
+def merge_ranges(ranges):
+    """
+    Объединяет пересекающиеся и смежные диапазоны, чтобы не сканировать индекс дважды.
+    """
+    merged = []
+    for low, high in sorted(ranges):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+class PostcodeRegionField(forms.CharField):
+    """
+    Список префиксов индексов через запятую -> список целочисленных диапазонов.
+    """
+
+    def clean(self, value):
+        value = super().clean(value)
+        if not value:
+            return None
+        prefixes = [prefix.strip() for prefix in value.split(',')]
+        if not all(prefixes):
+            raise forms.ValidationError(const.ERROR_MSG_POSTCODE_REGION)
+        return merge_ranges(postcode_prefix_range(prefix) for prefix in prefixes)
+
+
+class PostcodeCorridorField(forms.CharField):
+    """
+    Список направлений '<префикс отправки>-<префикс получения>' -> пары диапазонов.
+    """
+
+    def clean(self, value):
+        value = super().clean(value)
+        if not value:
+            return None
+        corridors = []
+        for item in value.split(','):
+            origin, separator, destination = item.strip().partition('-')
+            if not separator or not origin or not destination:
+                raise forms.ValidationError(const.ERROR_MSG_POSTCODE_CORRIDOR)
+            try:
+                corridors.append((postcode_prefix_range(origin), postcode_prefix_range(destination)))
+            except forms.ValidationError:
+                raise forms.ValidationError(const.ERROR_MSG_POSTCODE_CORRIDOR)
+        return corridors
+
+
+class PostcodeRegionFilter(filters.Filter):
+    """
+    Фильтр по регионам индекса. Префиксы превращаются в условия BETWEEN по целому полю,
+    которые обслуживаются диапазонным поиском по индексу (а не сравнением строк по префиксу).
+    """
+    field_class = PostcodeRegionField
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        return qs.filter(reduce(operator.or_, (Q(**{f'{self.field_name}__range': bounds}) for bounds in value)))
+
+
+class PostcodeCorridorFilter(filters.Filter):
+    """
+    Фильтр по направлениям «регион отправки -> регион получения». Каждое направление — диапазон
+    по индексу origin_postcode с дополнительным условием на destination_postcode.
+    """
+    field_class = PostcodeCorridorField
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        conditions = (
+            Q(origin_postcode__range=origin) & Q(destination_postcode__range=destination)
+            for origin, destination in value
+        )
+        return qs.filter(reduce(operator.or_, conditions))
+
+
+class LocationFilter(filters.CharFilter):
+    """
+    Фильтр по пункту: название ищется в словаре пунктов (без учёта регистра), а запрос сравнивает
+    целый ключ по индексу (<пункт>, created_at, id). Пункта, которого нет в словаре, нет и у отправлений.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        return qs.filter(**{self.field_name: location_id(value, qs.db)})
+
+
+class CaseFold(Func):
+    """
+    Приведение к нижнему регистру с учётом Unicode (функция casefold, см. install_casefold).
+    """
+    function = 'casefold'
+    output_field = CharField()
+
+
+def install_casefold(sender, connection, **kwargs):
+    # LIKE и lower() в SQLite не различают регистр только у латиницы; casefold — из Python
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function(
+            'casefold', 1, lambda value: None if value is None else value.casefold(), deterministic=True,
+        )
+
+
+class SubstringFilter(filters.CharFilter):
+    """
+    Поиск подстроки без учёта регистра (icontains). На PostgreSQL условие UPPER(поле) LIKE '%...%'
+    обслуживает триграммный GIN-индекс (pg_trgm). В SQLite icontains не различает регистр только
+    у латиницы, поэтому там обе стороны приводятся к нижнему регистру функцией casefold.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        if connections[qs.db].vendor == 'sqlite':
+            return qs.filter(Contains(CaseFold(self.field_name), value.casefold()))
+        return qs.filter(**{f'{self.field_name}__icontains': value})
+
 
 class BaseShipmentFilter(filters.FilterSet):
     # datatime filter for created_at field
     created_at_after = filters.DateTimeFilter(field_name="created_at", lookup_expr='gte')
-    # Full name filters for sender and recipient
-    sender_full_name = filters.CharFilter(lookup_expr='icontains')
+    created_at_before = filters.DateTimeFilter(field_name="created_at", lookup_expr='lt')
+    # инкрементальная синхронизация: записи, изменённые после sync_token прошлого ответа (индекс (updated_at, id))
+    updated_since = filters.IsoDateTimeFilter(field_name='updated_at', lookup_expr='gt')
+    # Full name filters for sender and recipient: подстрока ФИО отправителя без учёта регистра;
+    # поиск по началу слов во всех полях — параметр search
+    sender_full_name = SubstringFilter(field_name='sender_full_name')
+    origin_location = LocationFilter(field_name='origin_location')
+    destination_location = LocationFilter(field_name='destination_location')
+    # Postcode filters: границы, регионы (префиксы) и направления — диапазонные условия по индексированным полям
+    origin_postcode_min = filters.NumberFilter(field_name='origin_postcode', lookup_expr='gte')
+    origin_postcode_max = filters.NumberFilter(field_name='origin_postcode', lookup_expr='lte')
+    destination_postcode_min = filters.NumberFilter(field_name='destination_postcode', lookup_expr='gte')
+    destination_postcode_max = filters.NumberFilter(field_name='destination_postcode', lookup_expr='lte')
+    origin_region = PostcodeRegionFilter(field_name='origin_postcode')
+    destination_region = PostcodeRegionFilter(field_name='destination_postcode')
+    corridor = PostcodeCorridorFilter()
 
     class Meta:
         abstract = True
@@ -23,4 +180,19 @@ class ParcelFilter(BaseShipmentFilter):
     class Meta(BaseShipmentFilter.Meta):
         model = Parcel
         # Add specific fields for Parcel model
-        fields = BaseShipmentFilter.Meta.fields + ['parcel_type', 'notification_phone']
\ No newline at end of file
+        fields = BaseShipmentFilter.Meta.fields + ['parcel_type', 'notification_phone']
+
+class LetterFeedFilter(BaseShipmentFilter):
+    """
+    Общие фильтры писем для единой ленты (GET /api/v1/shipments).
+    """
+    class Meta(BaseShipmentFilter.Meta):
+        model = Letter
+
+
+class ParcelFeedFilter(BaseShipmentFilter):
+    """
+    Общие фильтры посылок для единой ленты (GET /api/v1/shipments).
+    """
+    class Meta(BaseShipmentFilter.Meta):
+        model = Parcel
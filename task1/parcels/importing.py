@@ -0,0 +1,188 @@
+import csv
+import json
+import os
+
+import django
+from django.apps import apps
+from django.utils import timezone
+from rest_framework import serializers
+
+IMPORT_KINDS = ('letters', 'parcels')
+
+
+def import_target(kind):
+    """
+    Модель и валидирующий сериализатор для вида отправлений.
+    """
+    from .models import Letter, Parcel
+    from .serializers import LetterSerializer, ParcelSerializer
+    return {'letters': (Letter, LetterSerializer), 'parcels': (Parcel, ParcelSerializer)}[kind]
+
+
+def import_columns(model):
+    """
+    Колонки вставки: все поля модели, кроме первичного ключа.
+    """
+    return [field for field in model._meta.concrete_fields if not field.primary_key]
+
+
+def read_records(path, file_format):
+    """
+    Потоково читает записи из CSV или JSONL. Пустые ячейки CSV считаются отсутствующими полями,
+    чтобы для них срабатывали значения по умолчанию (например, тип письма).
+    """
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if file_format == 'csv':
+            for row in csv.DictReader(f):
+                yield {key: value for key, value in row.items() if value != ''}
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def init_worker():
+    # в процессах, запущенных через spawn, Django нужно настроить заново
+    if not apps.ready:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'post_service.settings')
+        django.setup()
+
+
+def validate_chunk(kind, start, records):
+    """
+    Валидирует порцию записей теми же сериализаторами, что и API (включая BaseShipmentSerializer.validate).
+    Выполняется в пуле процессов. Возвращает (строки для вставки, отклонённые записи);
+    строка — кортеж значений в порядке import_columns, пункты в ней — названия (см. intern_rows).
+    """
+    model, serializer_class = import_target(kind)
+    columns = import_columns(model)
+    created_at_field = serializers.DateTimeField()
+    now = timezone.now()
+    valid, rejected = [], []
+
+    for number, record in enumerate(records, start=start):
+        serializer = serializer_class(data=record)
+        errors = {} if serializer.is_valid() else dict(serializer.errors)
+        # для исторических данных дату создания можно передать явно
+        created_at = now
+        if 'created_at' in record:
+            try:
+                created_at = created_at_field.run_validation(record['created_at'])
+            except serializers.ValidationError as e:
+                errors['created_at'] = e.detail
+        if errors:
+            rejected.append({'record_number': number, 'record': record, 'errors': errors})
+            continue
+
+        data = dict(serializer.validated_data, created_at=created_at, updated_at=now)
+        # в словарь пункты заносит загружающий процесс (intern_rows), из пула приходят названия
+        data.update((field.name, data[field.name].name) for field in columns if field.is_relation)
+        valid.append(tuple(
+            data[field.name] if field.name in data else field.get_default() for field in columns
+        ))
+    return valid, rejected
+
+
+def intern_rows(model, rows, using):
+    """
+    Заменяет в строках validate_chunk названия пунктов на id словаря базы using, пополняя словарь.
+    Вызывается в транзакции загрузки порции: новые пункты коммитятся вместе со строками.
+    """
+    from .locations import intern_location
+    positions = [index for index, field in enumerate(import_columns(model)) if field.is_relation]
+    rows = [list(row) for row in rows]
+    for row in rows:
+        for index in positions:
+            row[index] = intern_location(row[index], using=using).pk
+    return [tuple(row) for row in rows]
+
+
+class SQLiteLoader:
+    """
+    Загрузка порциями через executemany (SQLite).
+    """
+
+    def __init__(self, connection, model):
+        self.connection = connection
+        self.fields = import_columns(model)
+        names = ', '.join(connection.ops.quote_name(field.column) for field in self.fields)
+        placeholders = ', '.join(['%s'] * len(self.fields))
+        self.sql = f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({names}) VALUES ({placeholders})'
+
+    def load(self, rows):
+        fields, connection = self.fields, self.connection
+        params = [
+            [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)]
+            for row in rows
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(self.sql, params)
+
+
+class PostgresLoader:
+    """
+    Загрузка через COPY FROM STDIN (psycopg 3): типы Python адаптирует сам драйвер.
+    """
+
+    def __init__(self, connection, model):
+        self.connection = connection
+        names = ', '.join(connection.ops.quote_name(field.column) for field in import_columns(model))
+        self.sql = f'COPY {connection.ops.quote_name(model._meta.db_table)} ({names}) FROM STDIN'
+
+    def load(self, rows):
+        with self.connection.cursor() as cursor:
+            with cursor.copy(self.sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+
+
+LOADERS = {
+    'sqlite': SQLiteLoader,
+    'postgresql': PostgresLoader,
+}
+
+
+class Checkpoint:
+    """
+    Контрольная точка импорта в базе (ShipmentImportCheckpoint): сколько записей входного файла уже
+    обработано. save() вызывается в транзакции загрузки порции, поэтому прогресс коммитится вместе
+    со строками, и после сбоя с --resume ни одна загруженная порция не загружается повторно.
+    """
+
+    def __init__(self, name, using):
+        self.name = name
+        self.using = using
+        self.state = {'records': 0, 'loaded': 0, 'rejected': 0, 'completed': False}
+
+    def load(self):
+        from .models import ShipmentImportCheckpoint
+        saved = ShipmentImportCheckpoint.objects.using(self.using).filter(name=self.name).values(*self.state).first()
+        if saved is not None:
+            self.state.update(saved)
+        return self.state
+
+    def save(self, **changes):
+        from .models import ShipmentImportCheckpoint
+        self.state.update(changes)
+        ShipmentImportCheckpoint.objects.using(self.using).update_or_create(name=self.name, defaults=self.state)
+
+
+def trim_rejects(path, records):
+    """
+    Оставляет в файле отказов только записи с номером меньше records — те, что учтены контрольной точкой.
+    Отказы порции пишутся до коммита её транзакции, и при возобновлении отказы незакоммиченной порции
+    убираются, чтобы не повториться.
+    """
+    if not os.path.exists(path):
+        return
+    temporary = f'{path}.tmp'
+    with open(path, encoding='utf-8') as source, open(temporary, 'w', encoding='utf-8') as target:
+        for line in source:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                # строка, оборванная сбоем, — из незакоммиченной порции
+                continue
+            if item['record_number'] < records:
+                target.write(line)
+    os.replace(temporary, path)
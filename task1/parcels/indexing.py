@@ -0,0 +1,218 @@
+import json
+import re
+from collections import namedtuple
+
+from django.db import connections, models, transaction
+from django.http import HttpRequest, QueryDict
+from django_filters import rest_framework as filters
+
+from .views import LetterViewSet, ParcelViewSet
+
+# Образцы значений фильтров для EXPLAIN: план зависит от вида условия, а не от конкретного значения.
+# У каждого фильтра списков должен быть образец, иначе его сочетания не попадут в отчёт.
+FILTER_SAMPLES = {
+    'sender_full_name': 'иванов',
+    'recipient_full_name': 'Сергеев Сергей Сергеевич',
+    'origin_location': 'Казань',
+    'destination_location': 'Уфа',
+    'created_at_after': '2024-01-01T00:00:00Z',
+    'created_at_before': '2024-01-01T00:00:00Z',
+    'updated_since': '2024-01-01T00:00:00Z',
+    'origin_postcode_min': '100000',
+    'origin_postcode_max': '199999',
+    'destination_postcode_min': '100000',
+    'destination_postcode_max': '199999',
+    'origin_region': '10',
+    'destination_region': '42',
+    'corridor': '10-42',
+    'letter_type': '2',
+    'parcel_type': '2',
+    'notification_phone': '+79991234567',
+}
+SEARCH_SAMPLE = 'иванов'
+
+# Замечания к плану
+FULL_SCAN = 'full_scan'  # чтение всей таблицы
+SORT = 'sort'  # сортировка выборки вместо чтения в порядке индекса
+FILTER_ON_SCAN = 'filter_on_scan'  # обход индекса сортировки с проверкой фильтра на каждой строке
+
+PlanCase = namedtuple('PlanCase', 'kind params ordering')
+PlanReport = namedtuple('PlanReport', 'case plan issues proposals')
+
+SHIPMENT_VIEWSETS = {'letters': LetterViewSet, 'parcels': ParcelViewSet}
+
+
+class SQLitePlanInspector:
+    """
+    explain() инспекторов возвращает (план построчно для отчёта, план для issues()).
+
+    Замечания по EXPLAIN QUERY PLAN SQLite: «SCAN <таблица>» без индекса — полное чтение,
+    «SCAN <таблица> USING INDEX» при фильтрах — обход индекса сортировки с проверкой каждой строки,
+    «USE TEMP B-TREE FOR ORDER BY» — сортировка.
+    """
+
+    def explain(self, queryset):
+        lines = queryset.explain().splitlines()
+        return lines, lines
+
+    def issues(self, plan, table, filtered):
+        issues = set()
+        for line in plan:
+            match = re.search(rf'\bSCAN {re.escape(table)}\b( USING (COVERING )?INDEX)?', line)
+            if match and not match.group(1):
+                issues.add(FULL_SCAN)
+            elif match and filtered:
+                issues.add(FILTER_ON_SCAN)
+            if 'USE TEMP B-TREE FOR ORDER BY' in line:
+                issues.add(SORT)
+        return issues
+
+
+class PostgresPlanInspector:
+    """
+    Замечания по EXPLAIN (FORMAT JSON) PostgreSQL. Seq Scan и Sort на время EXPLAIN запрещаются
+    (enable_seqscan/enable_sort): на маленькой или свежей таблице планировщик выбирает их и при
+    подходящем индексе, а оставшийся после запрета узел значит, что индекса для запроса нет.
+    Поэтому результат не зависит от объёма данных и статистики.
+    """
+
+    def explain(self, queryset):
+        connection = connections[queryset.db]
+        with transaction.atomic(using=queryset.db), connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            plan = json.loads(queryset.explain(format='json'))
+        return json.dumps(plan, indent=1, ensure_ascii=False).splitlines(), plan
+
+    def issues(self, plan, table, filtered):
+        issues = set()
+        nodes = [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.get('Plans', ()))
+            if node.get('Relation Name') != table and node['Node Type'] != 'Sort':
+                continue
+            if node['Node Type'] == 'Seq Scan':
+                issues.add(FULL_SCAN)
+            elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+                issues.add(SORT)
+            elif 'Filter' in node:
+                issues.add(FILTER_ON_SCAN)
+        return issues
+
+
+PLAN_INSPECTORS = {
+    'sqlite': SQLitePlanInspector(),
+    'postgresql': PostgresPlanInspector(),
+}
+
+
+def plan_cases(kind):
+    """
+    Сочетания, доступные клиентам списка: без фильтров, каждый фильтр и поиск по отдельности —
+    с каждой сортировкой из ordering_fields в обе стороны.
+    """
+    viewset_class = SHIPMENT_VIEWSETS[kind]
+    selections = [{}] + [{name: FILTER_SAMPLES[name]} for name in viewset_class.filterset_class.base_filters]
+    selections.append({'search': SEARCH_SAMPLE})
+    orderings = [sign + field for field in viewset_class.ordering_fields for sign in ('-', '')]
+    return [PlanCase(kind, params, ordering) for params in selections for ordering in orderings]
+
+
+def list_queryset(case):
+    """
+    Запрос первой страницы списка для сочетания — тот же, что выполнит GET /api/v1/<kind>:
+    фильтры, поиск, сортировка и keyset-пагинация вьюсета.
+    """
+    viewset_class = SHIPMENT_VIEWSETS[case.kind]
+    # запрос без хоста: первой странице абсолютные ссылки не нужны, они строятся только для ответа
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = f'/api/v1/{case.kind}'
+    request.GET = QueryDict(mutable=True)
+    request.GET.update(dict(case.params, ordering=case.ordering))
+    viewset = viewset_class(action_map={'get': 'list'}, args=(), kwargs={})
+    viewset.format_kwarg = None
+    viewset.request = viewset.initialize_request(request)
+    reader = viewset.get_fast_reader()
+    rows = reader.rows(viewset.filter_queryset(viewset.get_queryset()))
+    return viewset.paginator.get_page_queryset(rows, viewset.request, view=viewset)
+
+
+def equality_field(filterset_class, name):
+    """
+    Поле, которое фильтр сравнивает на равенство (кандидат в ведущую колонку составного индекса), или None.
+    """
+    filter_ = filterset_class.base_filters.get(name)
+    if (
+        isinstance(filter_, (filters.CharFilter, filters.NumberFilter, filters.ChoiceFilter))
+        and filter_.method is None and filter_.lookup_expr == 'exact'
+    ):
+        return filter_.field_name
+    return None
+
+
+def has_index(model, fields):
+    """
+    Есть ли у модели индекс, который начинается с fields.
+    """
+    return any(list(index.fields[:len(fields)]) == list(fields) for index in model._meta.indexes)
+
+
+def propose_indexes(case, issues):
+    """
+    Индексы, которые сняли бы замечания: для фильтра на равенство — составной (поле, поле сортировки, id),
+    а для поля с вариантами (тип) ещё и частичный (поле сортировки, id) WHERE поле = значение —
+    компактнее, если запросы идут к немногим редким значениям. Для диапазона по другому полю, чем
+    сортировка, индекс сортировку не снимет — предлагается только индекс по самому полю, если его нет.
+    """
+    if not issues or not case.params or 'search' in case.params:
+        return []
+    viewset_class = SHIPMENT_VIEWSETS[case.kind]
+    filterset_class = viewset_class.filterset_class
+    model = filterset_class.Meta.model
+    name, value = next(iter(case.params.items()))
+    order_field = case.ordering.lstrip('-')
+    field = equality_field(filterset_class, name)
+    proposals = []
+    if field is not None:
+        if not has_index(model, [field, order_field, 'id']):
+            proposals.append(models.Index(fields=[field, order_field, 'id']))
+        if model._meta.get_field(field).choices:
+            # у частичного индекса имя обязательно; Django ограничивает его 30 символами
+            name = f'{field}_{value}_{order_field}'[:30]
+            proposals.append(models.Index(
+                fields=[order_field, 'id'], condition=models.Q(**{field: int(value)}), name=name,
+            ))
+    else:
+        field = getattr(filterset_class.base_filters[name], 'field_name', None)
+        if field in {f.name for f in model._meta.fields} and not has_index(model, [field]):
+            proposals.append(models.Index(fields=[field, 'id']))
+    return proposals
+
+
+def describe_index(index):
+    """
+    Индекс в виде строки для Meta.indexes модели.
+    """
+    condition = ''
+    if index.condition is not None:
+        lookups = ', '.join(f'{name}={value!r}' for name, value in index.condition.children)
+        condition = f', condition=models.Q({lookups})'
+        condition += f', name={index.name!r}'
+    return f'models.Index(fields={list(index.fields)!r}{condition})'
+
+
+def inspect_case(case):
+    queryset = list_queryset(case)
+    inspector = PLAN_INSPECTORS[connections[queryset.db].vendor]
+    lines, plan = inspector.explain(queryset)
+    issues = inspector.issues(plan, queryset.model._meta.db_table, filtered=bool(case.params))
+    return PlanReport(case, lines, sorted(issues), propose_indexes(case, issues))
+
+
+def index_report(kinds=tuple(SHIPMENT_VIEWSETS)):
+    """
+    Планы всех сочетаний фильтров и сортировок списков kinds с замечаниями и предложенными индексами.
+    """
+    return [inspect_case(case) for kind in kinds for case in plan_cases(kind)]
@@ -0,0 +1,404 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import InterfaceError, OperationalError, close_old_connections, transaction
+from django.utils import timezone
+
+from . import constants as const
+from .locations import intern_locations, location_key
+from .models import Letter, Location, Parcel, ShipmentIngestReceipt
+from .signals import notify_shipments_changed
+
+logger = logging.getLogger(__name__)
+
+INGEST_MODELS = {model._meta.model_name: model for model in (Letter, Parcel)}
+
+QUEUED, FLUSHING, DONE, FAILED = 'queued', 'flushing', 'done', 'failed'
+
+
+def ingest_enabled():
+    return settings.SHIPMENT_INGEST_MODE == 'queued'
+
+
+class IngestJournal:
+    """
+    Журнал принятых к записи отправлений в отдельном файле SQLite (WAL, synchronous=FULL):
+    запись журнала не конкурирует за блокировку основной БД, а ответ 202 отдаётся только после того,
+    как запись надёжно лежит на диске. Состояния записи: queued -> flushing (взята процессом) -> done;
+    запись, которую не удалось записать INGEST_MAX_ATTEMPTS раз, становится failed (с текстом ошибки) и больше не берётся.
+    sqlite3 не разделяет соединения между потоками, поэтому у каждого потока своё.
+    """
+    schema = (
+        'CREATE TABLE IF NOT EXISTS ingest_entries ('
+        ' seq INTEGER PRIMARY KEY AUTOINCREMENT, ticket TEXT NOT NULL UNIQUE, kind TEXT NOT NULL,'
+        ' payload TEXT NOT NULL, status TEXT NOT NULL, shipment_id INTEGER, claimed_at REAL,'
+        ' created_at REAL NOT NULL, flushed_at REAL)',
+        'CREATE INDEX IF NOT EXISTS ingest_entries_status ON ingest_entries (status, seq)',
+    )
+    # столбцы, добавленные позже: в журналы, созданные раньше, они дописываются при открытии
+    columns = {
+        'attempts': 'INTEGER NOT NULL DEFAULT 0',
+        'error': 'TEXT',
+    }
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.local = threading.local()
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            # isolation_level=None: транзакции открываются явно (BEGIN IMMEDIATE при взятии порции)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=FULL')
+            for statement in self.schema:
+                connection.execute(statement)
+            existing = {row['name'] for row in connection.execute('PRAGMA table_info(ingest_entries)')}
+            for column, definition in self.columns.items():
+                if column not in existing:
+                    connection.execute(f'ALTER TABLE ingest_entries ADD COLUMN {column} {definition}')
+            self.local.connection = connection
+        return connection
+
+    def append(self, kind, data):
+        """
+        Добавляет запись в журнал. Возвращает номер квитанции.
+        """
+        ticket = uuid.uuid4().hex
+        self.connection().execute(
+            'INSERT INTO ingest_entries (ticket, kind, payload, status, created_at) VALUES (?, ?, ?, ?, ?)',
+            [ticket, kind, json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False), QUEUED, time.time()],
+        )
+        return ticket
+
+    def claim(self, limit, stale_before):
+        """
+        Берёт до limit записей в порядке поступления: ожидающие и взятые раньше stale_before
+        (процесс, который их взял, упал). Взятие атомарно, поэтому несколько процессов
+        не запишут одну порцию дважды.
+        """
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            entries = connection.execute(
+                'SELECT seq, ticket, kind, payload, created_at FROM ingest_entries'
+                ' WHERE status = ? OR (status = ? AND claimed_at < ?) ORDER BY seq LIMIT ?',
+                [QUEUED, FLUSHING, stale_before, limit],
+            ).fetchall()
+            connection.executemany(
+                'UPDATE ingest_entries SET status = ?, claimed_at = ? WHERE seq = ?',
+                [(FLUSHING, time.time(), entry['seq']) for entry in entries],
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return entries
+
+    def complete(self, shipment_ids):
+        """
+        Отмечает записи записанными: {квитанция: id отправления}.
+        """
+        flushed_at = time.time()
+        self.connection().executemany(
+            'UPDATE ingest_entries SET status = ?, shipment_id = ?, flushed_at = ? WHERE ticket = ?',
+            [(DONE, shipment_id, flushed_at, ticket) for ticket, shipment_id in shipment_ids.items()],
+        )
+
+    def release(self, tickets):
+        """
+        Возвращает взятые записи в очередь (запись в БД не удалась).
+        """
+        self.connection().executemany(
+            'UPDATE ingest_entries SET status = ?, claimed_at = NULL WHERE ticket = ?',
+            [(QUEUED, ticket) for ticket in tickets],
+        )
+
+    def retry(self, errors, max_attempts=const.INGEST_MAX_ATTEMPTS):
+        """
+        Учитывает неудачную попытку записи: {квитанция: текст ошибки}. Запись возвращается в очередь,
+        а исчерпавшая max_attempts попыток отмечается failed. Возвращает квитанции отмеченных failed.
+        """
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'UPDATE ingest_entries SET attempts = attempts + 1, error = ?, claimed_at = NULL,'
+                ' status = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END WHERE ticket = ?',
+                [(error, max_attempts, FAILED, QUEUED, ticket) for ticket, error in errors.items()],
+            )
+            failed = [
+                row['ticket'] for row in connection.execute(
+                    f'SELECT ticket FROM ingest_entries WHERE status = ? AND ticket IN ({", ".join("?" * len(errors))})',
+                    [FAILED, *errors],
+                )
+            ]
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return failed
+
+    def entry(self, ticket):
+        return self.connection().execute(
+            'SELECT ticket, kind, status, shipment_id, error FROM ingest_entries WHERE ticket = ?', [ticket],
+        ).fetchone()
+
+    def depth(self):
+        """
+        Сколько записей ещё не записано в БД.
+        """
+        return self.connection().execute(
+            'SELECT count(*) FROM ingest_entries WHERE status IN (?, ?)', [QUEUED, FLUSHING],
+        ).fetchone()[0]
+
+    def purge(self, before):
+        """
+        Удаляет записанные записи, отмеченные раньше before (unix time). Возвращает их число.
+        """
+        return self.connection().execute(
+            'DELETE FROM ingest_entries WHERE status = ? AND flushed_at < ?', [DONE, before],
+        ).rowcount
+
+
+class IngestMetrics:
+    """
+    Записанные из журнала отправления и задержка от приёма до записи в БД (в памяти процесса).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def observe(self, latencies):
+        with self.lock:
+            self.flushed += len(latencies)
+            self.latency_sum += sum(latencies)
+            self.latency_max = max(self.latency_max, *latencies)
+
+    def reset(self):
+        with self.lock:
+            self.flushed = 0
+            self.latency_sum = 0.0
+            self.latency_max = 0.0
+
+    def render(self, depth):
+        with self.lock:
+            return '\n'.join([
+                '# TYPE shipment_ingest_queue_depth gauge',
+                f'shipment_ingest_queue_depth {depth}',
+                '# TYPE shipment_ingest_flush_latency_seconds summary',
+                f'shipment_ingest_flush_latency_seconds_sum {self.latency_sum:.6f}',
+                f'shipment_ingest_flush_latency_seconds_count {self.flushed}',
+                '# TYPE shipment_ingest_flush_latency_max_seconds gauge',
+                f'shipment_ingest_flush_latency_max_seconds {self.latency_max:.6f}',
+            ]) + '\n'
+
+
+ingest_metrics = IngestMetrics()
+
+
+def payload_values(model, payload):
+    """
+    Значения полей из записи журнала: значения из JSON (Decimal — строкой) приводятся к типам полей,
+    как их вернул бы сериализатор, а названия пунктов — к несохранённым записям словаря
+    (см. intern_locations). Записи, принятые до этого, хранят id пункта под <поле>_id — он передаётся как есть.
+    """
+    values = {}
+    for name, value in payload.items():
+        field = model._meta.get_field(name)
+        if field.is_relation and name == field.name:
+            values[name] = Location(name=value, key=location_key(value))
+        else:
+            values[name] = field.to_python(value)
+    return values
+
+
+def write_entries(entries):
+    """
+    Записывает взятые записи журнала в БД одной транзакцией: bulk_create по видам отправлений
+    и квитанции в ShipmentIngestReceipt. Записи, квитанции которых уже есть (порция была записана
+    процессом, упавшим до отметки в журнале), повторно не создаются.
+    Возвращает {квитанция: id отправления}.
+    """
+    with transaction.atomic():
+        shipment_ids = dict(
+            ShipmentIngestReceipt.objects.filter(ticket__in=[entry['ticket'] for entry in entries])
+            .values_list('ticket', 'shipment_id')
+        )
+        groups = {}
+        for entry in entries:
+            if entry['ticket'] not in shipment_ids:
+                groups.setdefault(entry['kind'], []).append(entry)
+        for kind, group in groups.items():
+            model = INGEST_MODELS[kind]
+            # пункты заносятся в словарь здесь, в транзакции записи порции
+            rows = intern_locations([payload_values(model, json.loads(entry['payload'])) for entry in group])
+            instances = [model(**values) for values in rows]
+            model.objects.bulk_create(instances, batch_size=const.BULK_CREATE_BATCH_SIZE)
+            ShipmentIngestReceipt.objects.bulk_create(
+                [ShipmentIngestReceipt(ticket=entry['ticket'], kind=kind, shipment_id=instance.pk)
+                 for entry, instance in zip(group, instances)],
+                batch_size=const.BULK_CREATE_BATCH_SIZE,
+            )
+            notify_shipments_changed(model, 'create', instances)
+            shipment_ids.update((entry['ticket'], instance.pk) for entry, instance in zip(group, instances))
+    return shipment_ids
+
+
+def write_bisected(entries, shipment_ids, errors):
+    """
+    Записывает порцию, а если она не записалась — делит её пополам и записывает половины,
+    пока ошибка не сведётся к отдельным записям: одна испорченная запись не мешает остальным.
+    Записанные попадают в shipment_ids, ошибки отдельных записей — в errors ({квитанция: текст}).
+    Ошибки соединения с БД (OperationalError, InterfaceError) от записей не зависят и пробрасываются.
+    """
+    try:
+        shipment_ids.update(write_entries(entries))
+    except (OperationalError, InterfaceError):
+        raise
+    except Exception as error:
+        if len(entries) == 1:
+            errors[entries[0]['ticket']] = f'{type(error).__name__}: {error}'
+            return
+        middle = len(entries) // 2
+        write_bisected(entries[:middle], shipment_ids, errors)
+        write_bisected(entries[middle:], shipment_ids, errors)
+
+
+def flush_journal(journal, batch_size=const.INGEST_BATCH_SIZE, claim_timeout=const.INGEST_CLAIM_TIMEOUT_SECONDS):
+    """
+    Записывает в БД одну порцию журнала. Возвращает число записей, снятых с очереди: записанных
+    и отмеченных failed (0 — журнал пуст или в нём только записи, ждущие повторной попытки).
+    """
+    entries = journal.claim(batch_size, stale_before=time.time() - claim_timeout)
+    if not entries:
+        return 0
+    shipment_ids, errors = {}, {}
+    try:
+        write_bisected(entries, shipment_ids, errors)
+    except Exception:
+        journal.complete(shipment_ids)
+        journal.release([entry['ticket'] for entry in entries if entry['ticket'] not in shipment_ids])
+        raise
+    journal.complete(shipment_ids)
+    failed = journal.retry(errors) if errors else []
+    for ticket in failed:
+        logger.error("Запись журнала приёма %s не записана за %s попыток: %s",
+                     ticket, const.INGEST_MAX_ATTEMPTS, errors[ticket])
+    flushed_at = time.time()
+    written = [entry for entry in entries if entry['ticket'] in shipment_ids]
+    if written:
+        ingest_metrics.observe([flushed_at - entry['created_at'] for entry in written])
+    return len(written) + len(failed)
+
+
+def purge_tickets(journal, before=None):
+    """
+    Удаляет квитанции, записанные раньше before (по умолчанию — старше SHIPMENT_INGEST_TICKET_RETENTION_HOURS).
+    """
+    before = before or timezone.now() - timedelta(hours=settings.SHIPMENT_INGEST_TICKET_RETENTION_HOURS)
+    purged = journal.purge(before.timestamp())
+    ShipmentIngestReceipt.objects.filter(created_at__lt=before).delete()
+    return purged
+
+
+class IngestFlusher:
+    """
+    Фоновый поток процесса, записывающий журнал в БД. Просыпается при каждом приёме записи
+    и не реже раза в SHIPMENT_INGEST_FLUSH_SECONDS (подбирает записи упавших процессов).
+    Пока идёт запись порции, новые записи копятся в журнале и уходят следующей порцией,
+    поэтому под нагрузкой пакеты сами становятся крупнее.
+    """
+
+    def __init__(self, journal):
+        self.journal = journal
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def notify(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='shipment-ingest-flusher', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(settings.SHIPMENT_INGEST_FLUSH_SECONDS)
+            self.wakeup.clear()
+            try:
+                while flush_journal(self.journal):
+                    pass
+            except Exception:
+                logger.exception("Не удалось записать журнал приёма отправлений")
+            finally:
+                close_old_connections()
+
+
+_journals = {}
+_flushers = {}
+_registry_lock = threading.Lock()
+
+
+def get_journal():
+    path = settings.SHIPMENT_INGEST_JOURNAL
+    with _registry_lock:
+        if path not in _journals:
+            _journals[path] = IngestJournal(path)
+        return _journals[path]
+
+
+def get_flusher(journal):
+    with _registry_lock:
+        if journal.path not in _flushers:
+            _flushers[journal.path] = IngestFlusher(journal)
+        return _flushers[journal.path]
+
+
+def journal_payload(model, validated_data):
+    # пункты хранятся в журнале названиями: в словарь их заносит запись порции (write_entries),
+    # поэтому приём в журнал базу не трогает
+    payload = {}
+    for name, value in validated_data.items():
+        payload[name] = value.name if model._meta.get_field(name).is_relation else value
+    return payload
+
+
+def enqueue(model, validated_data):
+    """
+    Принимает провалидированное отправление в журнал и будит фоновую запись. Возвращает квитанцию.
+    """
+    journal = get_journal()
+    ticket = journal.append(model._meta.model_name, journal_payload(model, validated_data))
+    if settings.SHIPMENT_INGEST_BACKGROUND_FLUSH:
+        get_flusher(journal).notify()
+    return ticket
+
+
+def ticket_status(ticket):
+    """
+    Состояние квитанции: {"ticket", "kind", "status": queued|done|failed, "id"} или None, если квитанции нет.
+    Для failed вместо id — "error" с текстом последней ошибки записи.
+    """
+    entry = get_journal().entry(ticket)
+    if entry is not None:
+        if entry['status'] == FAILED:
+            return {"ticket": ticket, "kind": entry['kind'], "status": FAILED, "error": entry['error']}
+        done = entry['status'] == DONE
+        return {"ticket": ticket, "kind": entry['kind'], "status": DONE if done else QUEUED, "id": entry['shipment_id']}
+    # запись журнала уже удалена (purge_tickets), но квитанция в БД ещё хранится
+    receipt = ShipmentIngestReceipt.objects.filter(ticket=ticket).first()
+    if receipt is None:
+        return None
+    return {"ticket": ticket, "kind": receipt.kind, "status": DONE, "id": receipt.shipment_id}
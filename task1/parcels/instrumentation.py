@@ -0,0 +1,217 @@
+import contextlib
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from . import constants as const
+
+request_logger = logging.getLogger('parcels.requests')
+
+# Замеры текущего запроса. ContextVar, а не thread-local: asgiref копирует контекст в потоки
+# sync_to_async, поэтому запросы асинхронных представлений учитываются так же, как синхронных.
+_current = ContextVar('shipment_request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Замеры одного запроса: число и суммарное время SQL-запросов, время фаз (filter, serialize)
+    и первые MAX_CAPTURED_QUERIES запросов с параметрами для журнала медленных запросов.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.query_count = 0
+        self.db_time = 0.0
+        self.phases = {}
+        self.queries = []
+
+    def record_query(self, alias, sql, params, duration):
+        self.query_count += 1
+        self.db_time += duration
+        if len(self.queries) < const.MAX_CAPTURED_QUERIES:
+            self.queries.append((alias, sql, params, duration))
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def server_timing(self):
+        """
+        Значение заголовка Server-Timing (длительности в миллисекундах).
+        """
+        metrics = [f'db;dur={self.db_time * 1000:.2f};desc="{self.query_count} queries"']
+        metrics += [f'{phase};dur={duration * 1000:.2f}' for phase, duration in self.phases.items()]
+        metrics.append(f'total;dur={self.total * 1000:.2f}')
+        return ', '.join(metrics)
+
+
+def current_timings():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def collect_timings():
+    """
+    Включает сбор замеров для кода внутри блока (middleware оборачивает им обработку запроса).
+    """
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+        timings.finish()
+
+
+@contextlib.contextmanager
+def timed(phase):
+    """
+    Учитывает время блока в фазе phase текущего запроса; вне запроса ничего не делает.
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.phases[phase] = timings.phases.get(phase, 0.0) + time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    execute_wrapper, который connection_created ставит на каждое подключение (см. apps.py).
+    """
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.record_query(context['connection'].alias, sql, None if many else params, time.perf_counter() - started)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # connection_created приходит при каждом переподключении, а список обёрток живёт дольше соединения
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def explain(alias, sql, params):
+    """
+    План выполнения запроса (EXPLAIN в PostgreSQL, EXPLAIN QUERY PLAN в SQLite) построчно.
+    """
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+    except DatabaseError as e:
+        return [f'EXPLAIN не выполнен: {e}']
+
+
+def request_record(request, response, timings):
+    """
+    Структурированная запись о запросе для журнала.
+    """
+    return {
+        'method': request.method,
+        'path': request.path,
+        'endpoint': endpoint_name(request),
+        'status': response.status_code,
+        'total_ms': round(timings.total * 1000, 2),
+        'db_ms': round(timings.db_time * 1000, 2),
+        'queries': timings.query_count,
+        **{f'{phase}_ms': round(duration * 1000, 2) for phase, duration in timings.phases.items()},
+    }
+
+
+def log_request(request, response, timings):
+    if timings.total * 1000 < settings.SHIPMENT_SLOW_REQUEST_MS:
+        # запись собирается, только если журнал всех запросов включён
+        if request_logger.isEnabledFor(logging.INFO):
+            request_logger.info(json.dumps(request_record(request, response, timings), ensure_ascii=False))
+        return
+    record = request_record(request, response, timings)
+    # медленный запрос: SQL и планы самых долгих запросов
+    slowest = sorted(timings.queries, key=lambda query: query[3], reverse=True)[:const.SLOW_REQUEST_EXPLAIN_QUERIES]
+    record['sql'] = [
+        {
+            'sql': sql,
+            'params': None if params is None else [str(param) for param in params],
+            'duration_ms': round(duration * 1000, 2),
+            'plan': explain(alias, sql, params) if params is not None and sql.lstrip()[:6].upper() == 'SELECT' else None,
+        }
+        for alias, sql, params, duration in slowest
+    ]
+    request_logger.warning(json.dumps(record, ensure_ascii=False))
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+class EndpointMetrics:
+    """
+    Гистограммы задержки по эндпоинтам (method + имя маршрута) в памяти процесса
+    и их выдача в текстовом формате Prometheus.
+    """
+    buckets = const.METRICS_LATENCY_BUCKETS
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def observe(self, request, response, timings):
+        key = (request.method, endpoint_name(request))
+        with self.lock:
+            entry = self.endpoints.get(key)
+            if entry is None:
+                entry = self.endpoints[key] = {
+                    'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0, 'db_sum': 0.0, 'queries': 0,
+                }
+            for index, bound in enumerate(self.buckets):
+                if timings.total <= bound:
+                    entry['buckets'][index] += 1
+                    break
+            entry['count'] += 1
+            entry['sum'] += timings.total
+            entry['db_sum'] += timings.db_time
+            entry['queries'] += timings.query_count
+
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+
+    def render(self):
+        # формат Prometheus: строки семейства идут подряд сразу после его # TYPE
+        with self.lock:
+            endpoints = [
+                (f'method="{method}",endpoint="{endpoint}"', dict(entry, buckets=list(entry['buckets'])))
+                for (method, endpoint), entry in sorted(self.endpoints.items())
+            ]
+        lines = ['# TYPE shipment_request_duration_seconds histogram']
+        for labels, entry in endpoints:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry['buckets']):
+                cumulative += count
+                lines.append(f'shipment_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'shipment_request_duration_seconds_bucket{{{labels},le="+Inf"}} {entry["count"]}')
+            lines.append(f'shipment_request_duration_seconds_sum{{{labels}}} {entry["sum"]:.6f}')
+            lines.append(f'shipment_request_duration_seconds_count{{{labels}}} {entry["count"]}')
+        lines.append('# TYPE shipment_request_db_seconds_total counter')
+        lines.extend(f'shipment_request_db_seconds_total{{{labels}}} {entry["db_sum"]:.6f}' for labels, entry in endpoints)
+        lines.append('# TYPE shipment_request_queries_total counter')
+        lines.extend(f'shipment_request_queries_total{{{labels}}} {entry["queries"]}' for labels, entry in endpoints)
+        return '\n'.join(lines) + '\n'
+
+
+metrics = EndpointMetrics()
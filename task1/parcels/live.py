@@ -0,0 +1,420 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+from django.http import QueryDict
+
+from . import constants as const
+from .filters import LetterFilter, ParcelFilter
+from .models import Letter, Parcel
+from .serializers import LetterSerializer, ParcelSerializer, ShipmentFastReader
+from .signals import shipments_changed
+from .sync import sync_token
+
+logger = logging.getLogger(__name__)
+
+# модель -> (фильтры подписки, сериализатор событий): те же, что у списков
+LIVE_SOURCES = {
+    Letter: (LetterFilter, LetterSerializer),
+    Parcel: (ParcelFilter, ParcelSerializer),
+}
+
+
+def live_event(event, data):
+    """
+    Событие ленты: (имя, JSON данных). JSON собирается один раз на группу подписок,
+    а в формат SSE или WebSocket оборачивается уже при отправке.
+    """
+    return event, json.dumps(data, ensure_ascii=False)
+
+
+# Последнее событие подписки, буфер которой переполнился; после него соединение закрывается.
+OVERFLOW_EVENT = live_event('overflow', {'error': const.ERROR_MSG_LIVE_OVERFLOW})
+
+
+def filter_key(filterset_class, params):
+    """
+    Нормализованные параметры фильтров подписки: подписки с одинаковыми фильтрами
+    образуют группу, и совпадения для неё проверяются одним запросом на событие.
+    """
+    return tuple(sorted(
+        (name, tuple(params.getlist(name))) for name in params if name in filterset_class.base_filters
+    ))
+
+
+class LiveSubscription:
+    """
+    Подписка одного клиента: ограниченный буфер событий в цикле событий клиента.
+    Медленный клиент задерживает отправку (send() ASGI-сервера ждёт, пока сокет освободится),
+    и события тем временем копятся в буфере, но не больше LIVE_BUFFER_SIZE: при переполнении буфер
+    очищается, клиент получает overflow и догоняет пропущенное через ?updated_since=.
+
+    Вместо asyncio.Queue (три deque и Event на каждого клиента) — список и future ожидания,
+    создаваемые только по необходимости: простаивающих подписок тысячи, и память на них важнее.
+    """
+    __slots__ = ('model', 'key', 'loop', 'buffer', 'waiter', 'overflowed', 'closed')
+
+    def __init__(self, model, key, loop):
+        self.model = model
+        self.key = key
+        self.loop = loop
+        self.buffer = None
+        self.waiter = None
+        self.overflowed = False
+        self.closed = False
+
+    def put(self, event):
+        if self.overflowed or self.closed:
+            return
+        if self.buffer is None:
+            self.buffer = []
+        if len(self.buffer) >= const.LIVE_BUFFER_SIZE:
+            self.overflowed = True
+            self.buffer = [OVERFLOW_EVENT]
+        else:
+            self.buffer.append(event)
+        self.wake()
+
+    def close(self):
+        self.closed = True
+        self.wake()
+
+    def wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def get(self, timeout):
+        """
+        Накопленные события (пустой список, если за timeout секунд ничего не пришло).
+        """
+        if not self.buffer and not self.closed:
+            self.waiter = self.loop.create_future()
+            try:
+                await asyncio.wait_for(self.waiter, timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self.waiter = None
+        events, self.buffer = self.buffer or [], None
+        return events
+
+
+class LiveBroker:
+    """
+    Рассылка изменений подписчикам внутри процесса. Подписки живут в циклах событий ASGI,
+    а изменения приходят из потоков синхронного кода, поэтому доставка идёт через
+    call_soon_threadsafe — одним вызовом на цикл событий, а не на подписчика.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # модель -> ключ фильтров -> подписки
+        self.groups = defaultdict(dict)
+
+    def subscribe(self, model, key, loop=None):
+        subscription = LiveSubscription(model, key, loop or asyncio.get_running_loop())
+        with self.lock:
+            self.groups[model].setdefault(key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            group = self.groups[subscription.model].get(subscription.key)
+            if group is not None:
+                group.discard(subscription)
+                if not group:
+                    del self.groups[subscription.model][subscription.key]
+
+    def subscriber_count(self, model=None):
+        with self.lock:
+            models = [model] if model else list(self.groups)
+            return sum(len(group) for model in models for group in self.groups[model].values())
+
+    def has_subscribers(self, model):
+        return bool(self.groups.get(model))
+
+    def snapshot(self, model):
+        """
+        Группы подписок модели: {ключ фильтров: список подписок}.
+        """
+        with self.lock:
+            return {key: list(group) for key, group in self.groups[model].items()}
+
+    def deliver(self, subscriptions, event):
+        by_loop = defaultdict(list)
+        for subscription in subscriptions:
+            by_loop[subscription.loop].append(subscription)
+        for loop, targets in by_loop.items():
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._put_all, targets, event)
+
+    @staticmethod
+    def _put_all(subscriptions, event):
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def publish(self, model, action, pks):
+        """
+        Рассылает изменение записей pks группам подписок модели.
+        Созданные и изменённые записи читаются из БД одним запросом на группу с её фильтрами;
+        изменённые записи, переставшие подходить под фильтры, приходят группе как удалённые.
+        """
+        groups = self.snapshot(model)
+        if not groups:
+            return
+        kind = model._meta.model_name
+        if action == 'delete' or not pks:
+            # удалённых записей уже нет в БД, а без id (импорт) клиент дочитывает изменения сам
+            data = {'action': action, 'kind': kind, 'ids': list(pks)} if pks else {'action': 'resync', 'kind': kind}
+            self.deliver([subscription for group in groups.values() for subscription in group], live_event('change', data))
+            return
+
+        filterset_class, serializer_class = LIVE_SOURCES[model]
+        reader = ShipmentFastReader.for_serializer(serializer_class)
+        for key, subscriptions in groups.items():
+            queryset = model.objects.filter(pk__in=pks)
+            if key:
+                data = QueryDict(mutable=True)
+                for name, values in key:
+                    data.setlist(name, list(values))
+                queryset = filterset_class(data, queryset=queryset).qs
+            results = reader.to_representation(reader.rows(queryset.order_by('id')))
+            if results:
+                self.deliver(subscriptions, live_event('change', {'action': action, 'kind': kind, 'results': results}))
+            matched = {item['id'] for item in results}
+            gone = [pk for pk in pks if pk not in matched]
+            if action == 'update' and gone:
+                self.deliver(subscriptions, live_event('change', {'action': 'delete', 'kind': kind, 'ids': gone}))
+
+
+broker = LiveBroker()
+
+
+class LivePublisher:
+    """
+    Очередь изменений для рассылки и фоновый поток процесса, который её разбирает.
+    Пишущий запрос после коммита только кладёт изменение в очередь; запросы с фильтрами групп
+    подписок (LiveBroker.publish) выполняет поток, поэтому их цена не ложится на запись и не растёт
+    в ней с числом подписчиков. Подряд идущие изменения одного вида объединяются в одну рассылку,
+    а переполненная очередь сворачивается в resync: клиенты дочитают изменения через updated_since.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.pending = []
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def enqueue(self, model, action, pks):
+        with self.lock:
+            last = self.pending[-1] if self.pending else None
+            if last and last[:2] == (model, action) and last[2] and pks:
+                last[2].extend(pks)
+            elif len(self.pending) >= const.LIVE_PUBLISH_QUEUE_SIZE:
+                models = dict.fromkeys([queued for queued, _, _ in self.pending] + [model])
+                self.pending = [(queued, 'resync', []) for queued in models]
+            else:
+                self.pending.append((model, action, list(pks)))
+        if settings.SHIPMENT_LIVE_BACKGROUND_PUBLISH:
+            self.notify()
+
+    def notify(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='shipment-live-publisher', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def drain(self):
+        """
+        Рассылает накопленные изменения в текущем потоке. Возвращает их число.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for model, action, pks in pending:
+            self.broker.publish(model, action, pks)
+        return len(pending)
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            try:
+                while self.drain():
+                    pass
+            except Exception:
+                logger.exception("Не удалось разослать изменения живой ленты")
+            finally:
+                close_old_connections()
+
+
+live_publisher = LivePublisher(broker)
+
+
+@receiver(shipments_changed)
+def publish_live_changes(sender, action, pks, **kwargs):
+    if sender not in LIVE_SOURCES or not broker.has_subscribers(sender):
+        return
+    # подписчики увидят только зафиксированные изменения; в autocommit вызывается сразу
+    transaction.on_commit(lambda: live_publisher.enqueue(sender, action, list(pks)))
+
+
+class ServerSentEvents:
+    """
+    Доставка по HTTP в формате text/event-stream (EventSource в браузере).
+    """
+    disconnect = 'http.disconnect'
+
+    @staticmethod
+    async def reject(receive, send, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode()
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def accept(receive, send):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            # nginx не должен буферизовать поток
+            (b'x-accel-buffering', b'no'),
+        ]})
+        await send({'type': 'http.response.body', 'body': f'retry: {const.LIVE_RETRY_MS}\n\n'.encode(), 'more_body': True})
+
+    @staticmethod
+    async def send_events(send, events):
+        body = ''.join(f'event: {event}\ndata: {data}\n\n' for event, data in events)
+        await send({'type': 'http.response.body', 'body': body.encode(), 'more_body': True})
+
+    @staticmethod
+    async def ping(send):
+        # комментарий SSE: прокси не закрывают соединение, а клиент его не видит
+        await send({'type': 'http.response.body', 'body': b': ping\n\n', 'more_body': True})
+
+    @staticmethod
+    async def close(send):
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+class WebSocketEvents:
+    """
+    Доставка по WebSocket: каждое событие — текстовое сообщение {"event": ..., "data": ...}.
+    """
+    disconnect = 'websocket.disconnect'
+
+    @staticmethod
+    async def reject(receive, send, status, data):
+        # код HTTP-ответа до рукопожатия браузеру недоступен, поэтому ошибка приходит сообщением
+        await WebSocketEvents.accept(receive, send)
+        await WebSocketEvents.send_events(send, [live_event('error', data)])
+        await send({'type': 'websocket.close', 'code': 1008})
+
+    @staticmethod
+    async def accept(receive, send):
+        await receive()  # websocket.connect
+        await send({'type': 'websocket.accept'})
+
+    @staticmethod
+    async def send_events(send, events):
+        for event, data in events:
+            await send({'type': 'websocket.send', 'text': f'{{"event": "{event}", "data": {data}}}'})
+
+    @staticmethod
+    async def ping(send):
+        await send({'type': 'websocket.send', 'text': '{"event": "ping"}'})
+
+    @staticmethod
+    async def close(send):
+        await send({'type': 'websocket.close', 'code': 1000})
+
+
+class LiveApplication:
+    """
+    ASGI-приложение живой ленты изменений поверх Django (см. post_service/asgi.py).
+    /api/v1/letters/live и /api/v1/parcels/live принимают те же фильтры, что и списки
+    (?origin_region=42&letter_type=2), и присылают события create/update/delete:
+    по HTTP — Server-Sent Events, по WebSocket — JSON-сообщения. Остальное обслуживает Django.
+
+    Подписки минуют middleware и представления Django: простаивающее соединение стоит
+    только подписки и задачи, ждущей отключения клиента. Рассылка — внутри процесса,
+    поэтому каждый процесс ASGI-сервера рассылает изменения, сделанные через него.
+    """
+    routes = {
+        '/api/v1/letters/live': Letter,
+        '/api/v1/parcels/live': Parcel,
+    }
+    transports = {
+        'http': ServerSentEvents,
+        'websocket': WebSocketEvents,
+    }
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        model = self.routes.get(scope.get('path')) if scope['type'] in self.transports else None
+        if model is None:
+            return await self.application(scope, receive, send)
+
+        transport = self.transports[scope['type']]
+        if scope['type'] == 'http' and scope['method'] != 'GET':
+            return await transport.reject(receive, send, 405, {"error": const.ERROR_MSG_LIVE_METHOD})
+        key, errors = self.parse_filters(model, scope.get('query_string', b''))
+        if errors:
+            return await transport.reject(receive, send, 400, {"error": const.ERROR_MSG_LIVE_FILTERS, "details": errors})
+        await transport.accept(receive, send)
+        await self.serve(broker.subscribe(model, key), receive, send, transport)
+
+    @staticmethod
+    def parse_filters(model, query_string):
+        """
+        Проверяет фильтры подписки формой FilterSet (без запросов к БД): (ключ фильтров, ошибки).
+        Сам FilterSet с копиями фильтров не живёт дольше проверки — соединение держит только ключ.
+        """
+        if not query_string:
+            return (), None
+        filterset_class = LIVE_SOURCES[model][0]
+        params = QueryDict(query_string)
+        filterset = filterset_class(params, queryset=model.objects.none())
+        if not filterset.is_valid():
+            return None, filterset.errors
+        return filter_key(filterset_class, params), None
+
+    @staticmethod
+    async def serve(subscription, receive, send, transport):
+        """
+        Отправляет ready с sync_token (с него клиент догоняет пропущенное после переподключения),
+        затем события и пинги, пока клиент не отключится или не переполнит буфер.
+        """
+        async def watch_disconnect():
+            while (await receive())['type'] != transport.disconnect:
+                pass
+            subscription.close()
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await transport.send_events(send, [live_event('ready', {'sync_token': sync_token()})])
+            while True:
+                events = await subscription.get(const.LIVE_HEARTBEAT_SECONDS)
+                if subscription.closed:
+                    return
+                if events:
+                    await transport.send_events(send, events)
+                else:
+                    await transport.ping(send)
+                if subscription.overflowed:
+                    await transport.close(send)
+                    return
+        except OSError:
+            # сервер сообщает об отключении клиента при отправке
+            return
+        finally:
+            watcher.cancel()
+            broker.unsubscribe(subscription)
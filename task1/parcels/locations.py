@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from django.db import router, transaction
+from django.db.models import Subquery
+
+from . import constants as const
+from .models import Location
+
+
+def location_key(name):
+    """
+    Ключ словаря пунктов: название без лишних пробелов, свёрнутое по регистру («  казань » -> «казань»).
+    """
+    return ' '.join(name.split()).casefold()
+
+
+class LocationCache:
+    """
+    LRU-кеш процесса: (база, ключ пункта) -> (id, название). Записи словаря не меняются, поэтому кеш
+    не устаревает; в него попадают только закоммиченные записи (см. intern_location).
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+location_cache = LocationCache(const.LOCATION_CACHE_SIZE)
+
+
+def intern_location(name, using=None):
+    """
+    Пункт словаря для названия: из кеша, из базы или новая запись словаря.
+    Гонку двух процессов, добавляющих одно название, разрешает уникальный ключ (get_or_create).
+    """
+    key = location_key(name)
+    using = using or router.db_for_write(Location)
+    entry = location_cache.get((using, key))
+    if entry is not None:
+        return Location(id=entry[0], name=entry[1], key=key)
+    location, _ = Location.objects.using(using).get_or_create(key=key, defaults={'name': name.strip()})
+    # запись, созданная или прочитанная внутри транзакции, может откатиться вместе с ней —
+    # в кеш она попадает только после коммита (вне транзакции on_commit вызывается сразу)
+    transaction.on_commit(partial(location_cache.put, (using, key), (location.pk, location.name)), using=using)
+    return location
+
+
+def intern_locations(rows, using=None):
+    """
+    Заменяет в словарях полей rows несохранённые пункты (их возвращает валидация, см. LocationField)
+    записями словаря. Вызывается при сохранении, в транзакции записи отправлений: пункт из
+    отклонённого или откатившегося запроса в словаре не остаётся. Возвращает rows.
+    """
+    interned = {}
+    for row in rows:
+        for name, value in row.items():
+            if isinstance(value, Location) and value.pk is None:
+                if value.key not in interned:
+                    interned[value.key] = intern_location(value.name, using=using)
+                row[name] = interned[value.key]
+    return rows
+
+
+def location_id(name, using):
+    """
+    id пункта для условия фильтра: из кеша или подзапросом к словарю по ключу (словарь не пополняется).
+    Подзапрос выполняется в том же запросе, что и выборка, поэтому фильтр не добавляет обращений к базе
+    и годится для async ORM; пункта, которого нет в словаре, он не находит (NULL).
+    """
+    key = location_key(name)
+    entry = location_cache.get((using, key))
+    if entry is not None:
+        return entry[0]
+    return Subquery(Location.objects.filter(key=key).values('pk'))
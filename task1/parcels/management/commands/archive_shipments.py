@@ -0,0 +1,53 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from parcels import constants as const
+from parcels.archive import ARCHIVE_MODELS, archive_shipments
+
+KINDS = {model._meta.model_name + 's': model for model in ARCHIVE_MODELS}
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит письма и посылки старше SHIPMENT_ARCHIVE_AFTER_DAYS дней в архивные таблицы "
+        "(на PostgreSQL — в месячные секции, которые создаются перед переносом) короткими транзакциями. "
+        "Первый запуск переносит всю накопленную историю (с паузами между порциями); "
+        "дальше команду запускают по расписанию (cron) или постоянно с --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=sorted(KINDS), action='append',
+                            help='Вид отправлений (по умолчанию — все).')
+        parser.add_argument('--days', type=int, default=settings.SHIPMENT_ARCHIVE_AFTER_DAYS,
+                            help='Переносить записи старше стольких дней (не меньше SHIPMENT_ARCHIVE_AFTER_DAYS).')
+        parser.add_argument('--chunk-size', type=int, default=const.ARCHIVE_CHUNK_SIZE,
+                            help='Записей в одной транзакции.')
+        parser.add_argument('--limit', type=int, help='Не больше стольких записей каждого вида за проход.')
+        parser.add_argument('--pause', type=float, default=const.ARCHIVE_PAUSE_SECONDS,
+                            help='Пауза между порциями, с.')
+        parser.add_argument('--loop', action='store_true', help='Не завершаться, повторять перенос.')
+        parser.add_argument('--interval', type=float, default=const.ARCHIVE_INTERVAL_SECONDS,
+                            help='Пауза между проходами в режиме --loop, с.')
+
+    def handle(self, *args, kind, days, chunk_size, limit, pause, loop, interval, **options):
+        # списки читают архив только для дат раньше SHIPMENT_ARCHIVE_AFTER_DAYS — более свежие записи
+        # в архиве пропали бы из ответов
+        if days < settings.SHIPMENT_ARCHIVE_AFTER_DAYS:
+            raise CommandError(
+                f'--days не может быть меньше SHIPMENT_ARCHIVE_AFTER_DAYS ({settings.SHIPMENT_ARCHIVE_AFTER_DAYS}).'
+            )
+        kinds = kind or sorted(KINDS)
+        while True:
+            before = timezone.now() - timedelta(days=days)
+            for name in kinds:
+                moved = archive_shipments(KINDS[name], before=before, chunk_size=chunk_size, limit=limit, pause=pause)
+                self.stdout.write(self.style.SUCCESS(
+                    f'{name}: перенесено в архив {moved} (созданы раньше {before:%Y-%m-%d %H:%M}).'
+                ))
+            if not loop:
+                break
+            time.sleep(interval)
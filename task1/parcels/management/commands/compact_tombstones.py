@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from parcels.sync import compact_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет отметки об удалениях старше окна хранения (SHIPMENT_TOMBSTONE_RETENTION_DAYS). "
+        "Клиенты, не синхронизировавшиеся дольше этого окна, получат 410 и должны загрузить данные заново."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SHIPMENT_TOMBSTONE_RETENTION_DAYS,
+                            help='Окно хранения в днях.')
+
+    def handle(self, *args, days, **options):
+        deleted = compact_tombstones(before=timezone.now() - timedelta(days=days))
+        self.stdout.write(self.style.SUCCESS(f'Удалено отметок: {deleted}.'))
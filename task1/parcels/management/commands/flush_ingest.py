@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from parcels import constants as const
+from parcels.ingest import flush_journal, get_journal, purge_tickets
+
+
+class Command(BaseCommand):
+    help = (
+        "Записывает журнал приёма с отложенной записью (SHIPMENT_INGEST_JOURNAL) в БД пакетами. "
+        "После сбоя повторяет записи, взятые упавшим процессом, без дублей. "
+        "С --loop работает постоянно (отдельный процесс записи вместо фоновых потоков веб-процессов)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Не завершаться, опрашивать журнал.')
+        parser.add_argument('--interval', type=float, default=settings.SHIPMENT_INGEST_FLUSH_SECONDS,
+                            help='Пауза между опросами пустого журнала в режиме --loop, с.')
+
+    def handle(self, *args, loop, interval, **options):
+        journal = get_journal()
+        flushed = purged = 0
+        purged_at = None
+        while True:
+            if purged_at is None or time.monotonic() - purged_at >= const.INGEST_PURGE_INTERVAL_SECONDS:
+                purged += purge_tickets(journal)
+                purged_at = time.monotonic()
+            count = flush_journal(journal)
+            flushed += count
+            if count:
+                continue
+            if not loop:
+                break
+            time.sleep(interval)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано отправлений: {flushed}. В очереди: {journal.depth()}. Удалено старых квитанций: {purged}.'
+        ))
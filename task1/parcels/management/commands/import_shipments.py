@@ -0,0 +1,132 @@
+import itertools
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from parcels import constants as const
+from parcels.importing import (
+    IMPORT_KINDS, LOADERS, Checkpoint, import_columns, import_target, init_worker, intern_rows, read_records,
+    trim_rejects, validate_chunk,
+)
+from parcels.signals import notify_shipments_changed
+
+
+class Command(BaseCommand):
+    help = (
+        "Импорт писем или посылок из CSV/JSONL. Записи валидируются теми же правилами, что и в API, "
+        "в пуле процессов и загружаются порциями (COPY в PostgreSQL, executemany в SQLite). "
+        "Отклонённые записи пишутся в файл отказов; прогресс — в файл контрольной точки (--resume)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=IMPORT_KINDS)
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=('csv', 'jsonl'),
+                            help='Формат файла; по умолчанию определяется по расширению.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Число процессов валидации; 0 — валидировать в текущем процессе.')
+        parser.add_argument('--chunk-size', type=int, default=const.IMPORT_CHUNK_SIZE)
+        parser.add_argument('--rejects', help='Файл отказов (JSONL), по умолчанию <path>.rejects.jsonl.')
+        parser.add_argument('--checkpoint', help='Имя контрольной точки в базе, по умолчанию — абсолютный путь файла.')
+        parser.add_argument('--resume', action='store_true',
+                            help='Продолжить с контрольной точки, пропустив уже обработанные записи.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, kind, path, file_format, workers, chunk_size, rejects, checkpoint, resume,
+               database, **options):
+        if not os.path.exists(path):
+            raise CommandError(f'Файл не найден: {path}')
+        if chunk_size < 1:
+            raise CommandError('--chunk-size должен быть положительным.')
+        file_format = file_format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+
+        connection = connections[database]
+        loader_class = LOADERS.get(connection.vendor)
+        if loader_class is None:
+            raise CommandError(f'Импорт не поддерживается для СУБД {connection.vendor}.')
+        model, _ = import_target(kind)
+        loader = loader_class(connection, model)
+        columns = [field.attname for field in import_columns(model)]
+
+        checkpoint = Checkpoint(checkpoint or os.path.abspath(path), database)
+        state = checkpoint.load() if resume else checkpoint.state
+        if state['completed']:
+            self.stdout.write('Импорт этого файла уже завершён по контрольной точке.')
+            return
+        skipped, loaded_before, rejected_before = state['records'], state['loaded'], state['rejected']
+
+        records = itertools.islice(read_records(path, file_format), skipped, None)
+        chunks = self.numbered_chunks(records, skipped, chunk_size)
+        loaded = rejected = 0
+        started = time.perf_counter()
+
+        rejects = rejects or f'{path}.rejects.jsonl'
+        if resume:
+            trim_rejects(rejects, skipped)
+        with open(rejects, 'a' if resume else 'w', encoding='utf-8') as rejects_file:
+            for end, (rows, rejected_records) in self.validated_chunks(kind, chunks, workers):
+                # строки, сводки и контрольная точка коммитятся вместе; отказы пишутся до коммита,
+                # а отказы незакоммиченной порции при возобновлении убирает trim_rejects
+                with transaction.atomic(using=database):
+                    for item in rejected_records:
+                        rejects_file.write(json.dumps(item, ensure_ascii=False, default=str) + '\n')
+                    rejects_file.flush()
+                    os.fsync(rejects_file.fileno())
+                    if rows:
+                        rows = intern_rows(model, rows, database)
+                        loader.load(rows)
+                        instances = [model(**dict(zip(columns, row))) for row in rows]
+                        notify_shipments_changed(model, 'create', instances, pks=[])
+                    checkpoint.save(
+                        records=end, loaded=loaded_before + loaded + len(rows),
+                        rejected=rejected_before + rejected + len(rejected_records),
+                    )
+                loaded += len(rows)
+                rejected += len(rejected_records)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Обработано записей: {end}')
+
+        checkpoint.save(completed=True)
+        elapsed = time.perf_counter() - started
+        rate = loaded / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено: {loaded}, отклонено: {rejected}, пропущено по контрольной точке: {skipped}. '
+            f'{elapsed:.2f} с, {rate:.0f} строк/с.'
+        ))
+
+    @staticmethod
+    def numbered_chunks(records, start, chunk_size):
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                return
+            yield start, chunk
+            start += len(chunk)
+
+    @staticmethod
+    def validated_chunks(kind, chunks, workers):
+        """
+        Результаты валидации порций в исходном порядке (end, (rows, rejected)), где end —
+        номер первой необработанной записи. В пуле одновременно находится ограниченное число порций,
+        поэтому память не растёт с размером файла.
+        """
+        if workers < 1:
+            for start, chunk in chunks:
+                yield start + len(chunk), validate_chunk(kind, start, chunk)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+            pending = deque()
+            for start, chunk in chunks:
+                pending.append((start + len(chunk), executor.submit(validate_chunk, kind, start, chunk)))
+                if len(pending) >= workers * const.IMPORT_PREFETCH_CHUNKS:
+                    end, future = pending.popleft()
+                    yield end, future.result()
+            while pending:
+                end, future = pending.popleft()
+                yield end, future.result()
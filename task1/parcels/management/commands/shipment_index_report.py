@@ -0,0 +1,45 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from parcels.indexing import SHIPMENT_VIEWSETS, describe_index, index_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Строит планы (EXPLAIN) первой страницы списков писем и посылок для всех сочетаний фильтров, "
+        "поиска и сортировки, которые допускают их фильтрсеты, отмечает полные чтения таблицы, сортировки "
+        "и обход индекса с проверкой фильтра на каждой строке и предлагает составные и частичные индексы. "
+        "Запускать на базе с той же СУБД, что и в бою (SQLite или PostgreSQL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=sorted(SHIPMENT_VIEWSETS), action='append',
+                            help='Вид отправлений (по умолчанию — все).')
+        parser.add_argument('--all', action='store_true', help='Выводить и сочетания без замечаний.')
+        parser.add_argument('--plans', action='store_true', help='Выводить планы запросов.')
+
+    def handle(self, *args, kind, all, plans, **options):
+        reports = index_report(kind or sorted(SHIPMENT_VIEWSETS))
+        proposals = Counter()
+        for report in reports:
+            if not report.issues and not all:
+                continue
+            case = report.case
+            params = ' '.join(f'{name}={value}' for name, value in case.params.items()) or '(без фильтров)'
+            issues = ', '.join(report.issues) or 'ok'
+            self.stdout.write(f'{case.kind} {params} ordering={case.ordering}: {issues}')
+            if plans:
+                for line in report.plan:
+                    self.stdout.write(f'    {line}')
+            for index in report.proposals:
+                proposals[case.kind, describe_index(index)] += 1
+
+        flagged = sum(1 for report in reports if report.issues)
+        self.stdout.write(f'{connection.vendor}: сочетаний {len(reports)}, с замечаниями {flagged}.')
+        if proposals:
+            self.stdout.write('Предлагаемые индексы (в скобках — сколько сочетаний снимет):')
+            for (name, index), count in sorted(proposals.items(), key=lambda item: (-item[1], item[0])):
+                self.stdout.write(f'  {name}: {index}  ({count})')
+        self.stdout.write(self.style.SUCCESS('Отчёт построен.'))
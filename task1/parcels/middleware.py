@@ -0,0 +1,124 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from . import constants as const
+from .instrumentation import collect_timings, log_request, metrics
+from .renderers import ShipmentColumnarRenderer, ShipmentMessagePackRenderer
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него ответы сжимаются только gzip
+    brotli = None
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Замеры каждого запроса: число и время SQL-запросов, время фильтрации и сериализации.
+    Результат уходит в заголовок Server-Timing, в журнал parcels.requests (медленные запросы — с SQL
+    и EXPLAIN) и в гистограммы по эндпоинтам (GET /api/v1/metrics).
+
+    Работает и под WSGI, и под ASGI. Тело потоковых ответов (export) формируется после выхода
+    из middleware и в замеры не попадает.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with collect_timings() as timings:
+            response = self.get_response(request)
+        self.finish(request, response, timings)
+        return response
+
+    async def __acall__(self, request):
+        with collect_timings() as timings:
+            response = await self.get_response(request)
+        if timings.total * 1000 >= settings.SHIPMENT_SLOW_REQUEST_MS:
+            # EXPLAIN для медленного запроса ходит в БД, а это возможно только из синхронного кода
+            await sync_to_async(self.finish)(request, response, timings)
+        else:
+            self.finish(request, response, timings)
+        return response
+
+    def finish(self, request, response, timings):
+        response['Server-Timing'] = timings.server_timing()
+        metrics.observe(request, response, timings)
+        log_request(request, response, timings)
+
+
+def accepted_encodings(header):
+    """
+    Кодировки из Accept-Encoding, которые клиент принимает (без q=0).
+    """
+    encodings = set()
+    for item in header.split(','):
+        name, _, params = item.partition(';')
+        params = params.strip()
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            quality = 1.0
+        if name.strip() and quality > 0:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+class ResponseCompressionMiddleware:
+    """
+    Сжимает ответы API (JSON, колоночный JSON, MessagePack) от SHIPMENT_COMPRESS_MIN_BYTES байт:
+    brotli, если клиент его принимает и модуль установлен, иначе gzip. Мелкие ответы не сжимаются —
+    на них сжатие стоит дороже, чем экономит. HTML не сжимается: в нём CSRF-токен (BREACH).
+    Потоковые ответы (export, живая лента) не трогаются.
+    """
+    sync_capable = True
+    async_capable = True
+    content_types = ('application/json', ShipmentColumnarRenderer.media_type, ShipmentMessagePackRenderer.media_type)
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        content_type = response.get('Content-Type', '').partition(';')[0].strip()
+        if (
+            response.streaming
+            or content_type not in self.content_types
+            or response.has_header('Content-Encoding')
+            or len(response.content) < settings.SHIPMENT_COMPRESS_MIN_BYTES
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encodings = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        if brotli is not None and 'br' in encodings:
+            encoding, content = 'br', brotli.compress(response.content, quality=const.COMPRESS_BROTLI_QUALITY)
+        elif 'gzip' in encodings:
+            encoding, content = 'gzip', compress_string(response.content)
+        else:
+            return response
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        # сжатое тело побайтно отличается от исходного, поэтому ETag становится слабым (как в GZipMiddleware)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
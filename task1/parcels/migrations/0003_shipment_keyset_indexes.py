@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcels', '0002_letter_created_at_letter_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['created_at', 'id'], name='parcels_let_created_f53a8e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['updated_at', 'id'], name='parcels_let_updated_906730_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['sender_full_name', 'id'], name='parcels_let_sender__4bad7f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parcel',
+            index=models.Index(fields=['created_at', 'id'], name='parcels_par_created_5623c7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parcel',
+            index=models.Index(fields=['updated_at', 'id'], name='parcels_par_updated_381299_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parcel',
+            index=models.Index(fields=['sender_full_name', 'id'], name='parcels_par_sender__7132ac_idx'),
+        ),
+    ]
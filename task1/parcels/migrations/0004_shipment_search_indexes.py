@@ -0,0 +1,93 @@
+from django.db import migrations
+
+SHIPMENT_MODELS = ('letter', 'parcel')
+# DDL индексов заморожен здесь, а не берётся из parcels.search: последующие изменения поиска
+# не должны менять то, что делает уже применённая миграция. Колонки — на момент этой миграции.
+SEARCH_COLUMNS = ('sender_full_name', 'recipient_full_name', 'origin_location', 'destination_location')
+
+
+def shipment_tables(apps):
+    return [apps.get_model('parcels', name)._meta.db_table for name in SHIPMENT_MODELS]
+
+
+def postgres_indexes(table):
+    def vector(columns):
+        concatenated = " || ' ' || ".join(f'"{table}"."{column}"' for column in columns)
+        return f"to_tsvector('simple'::regconfig, {concatenated})"
+
+    return {
+        f'{table}_search_gin': vector(SEARCH_COLUMNS),
+        f'{table}_sender_gin': vector(('sender_full_name',)),
+    }
+
+
+def install_postgres(cursor, table):
+    for name, expression in postgres_indexes(table).items():
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin ({expression})')
+
+
+def uninstall_postgres(cursor, table):
+    for name in postgres_indexes(table):
+        cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+def install_sqlite(cursor, table):
+    fts = f'{table}_fts'
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+    delete_old = f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    insert_new = f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});"
+    cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, content='{table}', content_rowid='id')")
+    cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert_new} END')
+    cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete_old} END')
+    cursor.execute(
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {table} BEGIN {delete_old} {insert_new} END'
+    )
+    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def uninstall_sqlite(cursor, table):
+    fts = f'{table}_fts'
+    for suffix in ('ai', 'ad', 'au'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+    cursor.execute(f'DROP TABLE IF EXISTS {fts}')
+
+
+# СУБД -> (установка, удаление); для остальных СУБД поиск идёт через icontains без индексов
+SEARCH_DDL = {
+    'postgresql': (install_postgres, uninstall_postgres),
+    'sqlite': (install_sqlite, uninstall_sqlite),
+}
+
+
+def install(apps, schema_editor):
+    if schema_editor.connection.vendor not in SEARCH_DDL:
+        return
+    install_table, _ = SEARCH_DDL[schema_editor.connection.vendor]
+    with schema_editor.connection.cursor() as cursor:
+        for table in shipment_tables(apps):
+            install_table(cursor, table)
+
+
+def uninstall(apps, schema_editor):
+    if schema_editor.connection.vendor not in SEARCH_DDL:
+        return
+    _, uninstall_table = SEARCH_DDL[schema_editor.connection.vendor]
+    with schema_editor.connection.cursor() as cursor:
+        for table in shipment_tables(apps):
+            uninstall_table(cursor, table)
+
+
+class Migration(migrations.Migration):
+    """
+    Полнотекстовый поиск: GIN-индексы tsvector на PostgreSQL, FTS5-таблицы с триггерами на SQLite.
+    """
+
+    dependencies = [
+        ('parcels', '0003_shipment_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
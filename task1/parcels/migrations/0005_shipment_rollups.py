@@ -0,0 +1,63 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:40
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Cast, Round, TruncDate
+
+# модель -> (поле типа, суммируемое поле). Пересчёт заморожен здесь, а не берётся из parcels.rollups:
+# последующие изменения сводок не должны менять то, что делает уже применённая миграция
+ROLLUP_FIELDS = {
+    'letter': ('letter_type', 'weight_kg'),
+    'parcel': ('parcel_type', 'payment_amount'),
+}
+
+
+def populate(apps, schema_editor):
+    # сводки для уже существующих отправлений; дальше они поддерживаются инкрементально
+    using = schema_editor.connection.alias
+    rollup_model = apps.get_model('parcels', 'ShipmentRollup')
+    for model_name, (type_field, total_field) in ROLLUP_FIELDS.items():
+        model = apps.get_model('parcels', model_name)
+        # суммы хранятся в минимальных единицах поля (граммы, копейки)
+        scale = 10 ** model._meta.get_field(total_field).decimal_places
+        units = Cast(Round(F(total_field) * scale), models.BigIntegerField())
+        queryset = model.objects.using(using).annotate(rollup_day=TruncDate('created_at'))
+        dimensions = {'type': type_field, 'origin_postcode': 'origin_postcode', 'destination_postcode': 'destination_postcode'}
+        for dimension, field in dimensions.items():
+            rows = queryset.values('rollup_day', field).annotate(count=Count('id'), total=Sum(units)).order_by()
+            rollup_model.objects.using(using).bulk_create(
+                (
+                    rollup_model(
+                        kind=model_name, dimension=dimension, day=row['rollup_day'], key=row[field],
+                        count=row['count'], total=int(row['total']),
+                    )
+                    for row in rows
+                ),
+                batch_size=1000,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcels', '0004_shipment_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipmentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16, verbose_name='Вид отправления')),
+                ('day', models.DateField(verbose_name='День')),
+                ('dimension', models.CharField(choices=[('type', 'тип'), ('origin_postcode', 'индекс места отправки'), ('destination_postcode', 'индекс места получения')], max_length=32, verbose_name='Измерение')),
+                ('key', models.IntegerField(verbose_name='Значение измерения')),
+                ('count', models.BigIntegerField(default=0, verbose_name='Количество')),
+                ('total', models.BigIntegerField(default=0, verbose_name='Сумма')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'dimension', 'day', 'key'), name='shipment_rollup_unique')],
+            },
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
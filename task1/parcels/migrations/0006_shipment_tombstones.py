@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcels', '0005_shipment_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipmentTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16, verbose_name='Вид отправления')),
+                ('shipment_id', models.BigIntegerField(verbose_name='ID отправления')),
+                ('deleted_at', models.DateTimeField(verbose_name='Дата удаления')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'deleted_at'], name='parcels_shi_kind_93a6f1_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcels', '0006_shipment_tombstones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipmentIngestReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticket', models.CharField(max_length=32, unique=True, verbose_name='Квитанция')),
+                ('kind', models.CharField(max_length=16, verbose_name='Вид отправления')),
+                ('shipment_id', models.BigIntegerField(verbose_name='ID отправления')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата записи')),
+            ],
+        ),
+    ]
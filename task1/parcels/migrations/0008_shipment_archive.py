@@ -0,0 +1,169 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:22
+
+from django.db import migrations, models
+
+ARCHIVE_MODELS = ('archivedletter', 'archivedparcel')
+# DDL секционирования и поисковых индексов заморожен здесь, а не берётся из parcels.archive
+# и parcels.search: их последующие изменения не должны менять то, что делает уже применённая миграция
+SEARCH_COLUMNS = ('sender_full_name', 'recipient_full_name', 'origin_location', 'destination_location')
+
+
+def archive_tables(apps):
+    return [apps.get_model('parcels', name)._meta.db_table for name in ARCHIVE_MODELS]
+
+
+def partition_postgres(connection, cursor, table):
+    """
+    Пересоздаёт пустую таблицу архива как секционированную по месяцам created_at
+    с теми же колонками, ограничениями CHECK и индексами, и добавляет секцию DEFAULT.
+    Первичный ключ секционированной таблицы обязан включать ключ секционирования: (id, created_at).
+    """
+    cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [table])
+    if cursor.fetchone() is not None:
+        return
+    constraints = connection.introspection.get_constraints(cursor, table)
+    indexes = {
+        name: info['columns'] for name, info in constraints.items()
+        if info['index'] and not info['primary_key'] and not info['unique']
+    }
+    cursor.execute(
+        f'CREATE TABLE "{table}_partitioned" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY RANGE ("created_at")'
+    )
+    cursor.execute(f'ALTER TABLE "{table}_partitioned" ADD PRIMARY KEY ("id", "created_at")')
+    cursor.execute(f'DROP TABLE "{table}"')
+    cursor.execute(f'ALTER TABLE "{table}_partitioned" RENAME TO "{table}"')
+    # индексы — с прежними именами, под которыми их знают миграции
+    for name, columns in indexes.items():
+        column_list = ', '.join(connection.ops.quote_name(column) for column in columns)
+        cursor.execute(f'CREATE INDEX "{name}" ON "{table}" ({column_list})')
+    cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+
+def postgres_indexes(table):
+    def vector(columns):
+        concatenated = " || ' ' || ".join(f'"{table}"."{column}"' for column in columns)
+        return f"to_tsvector('simple'::regconfig, {concatenated})"
+
+    return {
+        f'{table}_search_gin': vector(SEARCH_COLUMNS),
+        f'{table}_sender_gin': vector(('sender_full_name',)),
+    }
+
+
+def install_postgres(connection, cursor, table):
+    # секционирование — до индексов поиска: таблица пересоздаётся
+    partition_postgres(connection, cursor, table)
+    for name, expression in postgres_indexes(table).items():
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin ({expression})')
+
+
+def uninstall_postgres(connection, cursor, table):
+    for name in postgres_indexes(table):
+        cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+def install_sqlite(connection, cursor, table):
+    fts = f'{table}_fts'
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+    delete_old = f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    insert_new = f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});"
+    cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, content='{table}', content_rowid='id')")
+    cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert_new} END')
+    cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete_old} END')
+    cursor.execute(
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {table} BEGIN {delete_old} {insert_new} END'
+    )
+    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def uninstall_sqlite(connection, cursor, table):
+    fts = f'{table}_fts'
+    for suffix in ('ai', 'ad', 'au'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+    cursor.execute(f'DROP TABLE IF EXISTS {fts}')
+
+
+# СУБД -> (установка, удаление); для остальных СУБД архив не секционируется, а поиск идёт через icontains
+ARCHIVE_DDL = {
+    'postgresql': (install_postgres, uninstall_postgres),
+    'sqlite': (install_sqlite, uninstall_sqlite),
+}
+
+
+def install(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in ARCHIVE_DDL:
+        return
+    install_table, _ = ARCHIVE_DDL[connection.vendor]
+    with connection.cursor() as cursor:
+        for table in archive_tables(apps):
+            install_table(connection, cursor, table)
+
+
+def uninstall(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in ARCHIVE_DDL:
+        return
+    _, uninstall_table = ARCHIVE_DDL[connection.vendor]
+    with connection.cursor() as cursor:
+        for table in archive_tables(apps):
+            uninstall_table(connection, cursor, table)
+
+
+class Migration(migrations.Migration):
+    """
+    Архив старых отправлений: таблицы с полями писем и посылок (на PostgreSQL — секционированные
+    по месяцам created_at) и полнотекстовые индексы для поиска по ним.
+    """
+
+    dependencies = [
+        ('parcels', '0007_shipment_ingest_receipts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedLetter',
+            fields=[
+                ('sender_full_name', models.CharField(max_length=255, verbose_name='ФИО отправителя')),
+                ('recipient_full_name', models.CharField(max_length=255, verbose_name='ФИО получателя')),
+                ('origin_location', models.CharField(max_length=255, verbose_name='Пункт отправки')),
+                ('destination_location', models.CharField(max_length=255, verbose_name='Пункт получения')),
+                ('origin_postcode', models.IntegerField(verbose_name='Индекс места отправки')),
+                ('destination_postcode', models.IntegerField(verbose_name='Индекс места получения')),
+                ('letter_type', models.PositiveSmallIntegerField(choices=[(1, 'письмо'), (2, 'заказное письмо'), (3, 'ценное письмо'), (4, 'экспресс-письмо')], default=1, verbose_name='Тип письма')),
+                ('weight_kg', models.DecimalField(decimal_places=3, max_digits=7, verbose_name='Вес письма (кг)')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата обновления')),
+            ],
+            options={
+                'abstract': False,
+                'indexes': [models.Index(fields=['created_at', 'id'], name='parcels_arc_created_5267bb_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedParcel',
+            fields=[
+                ('sender_full_name', models.CharField(max_length=255, verbose_name='ФИО отправителя')),
+                ('recipient_full_name', models.CharField(max_length=255, verbose_name='ФИО получателя')),
+                ('origin_location', models.CharField(max_length=255, verbose_name='Пункт отправки')),
+                ('destination_location', models.CharField(max_length=255, verbose_name='Пункт получения')),
+                ('origin_postcode', models.IntegerField(verbose_name='Индекс места отправки')),
+                ('destination_postcode', models.IntegerField(verbose_name='Индекс места получения')),
+                ('notification_phone', models.CharField(max_length=20, verbose_name='Телефон для извещения')),
+                ('parcel_type', models.PositiveSmallIntegerField(choices=[(1, 'мелкий пакет'), (2, 'посылка'), (3, 'посылка 1 класса'), (4, 'ценная посылка'), (5, 'посылка международная'), (6, 'экспресс-посылка')], default=2, verbose_name='Тип посылки')),
+                ('payment_amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Сумма платежа')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата обновления')),
+            ],
+            options={
+                'abstract': False,
+                'indexes': [models.Index(fields=['created_at', 'id'], name='parcels_arc_created_1f2340_idx')],
+            },
+        ),
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcels', '0008_shipment_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['letter_type', 'created_at', 'id'], name='parcels_let_letter__5a1659_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parcel',
+            index=models.Index(fields=['parcel_type', 'created_at', 'id'], name='parcels_par_parcel__eb9174_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parcel',
+            index=models.Index(fields=['notification_phone', 'created_at', 'id'], name='parcels_par_notific_7ebe7f_idx'),
+        ),
+    ]
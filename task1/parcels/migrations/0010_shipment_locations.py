@@ -0,0 +1,264 @@
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+SHIPMENT_MODELS = ('letter', 'parcel', 'archivedletter', 'archivedparcel')
+# поле -> подпись; до переноса в словарь названия лежат в <поле>_name
+LOCATION_FIELDS = {'origin_location': 'Пункт отправки', 'destination_location': 'Пункт получения'}
+LOCATION_INDEXES = {
+    'letter': {'origin_location': 'parcels_let_origin__4926c3_idx', 'destination_location': 'parcels_let_destina_40c0ec_idx'},
+    'parcel': {'origin_location': 'parcels_par_origin__3b865e_idx', 'destination_location': 'parcels_par_destina_9dd4d5_idx'},
+}
+
+
+# DDL поисковых индексов и ключ словаря заморожены здесь, а не берутся из parcels.search
+# и parcels.locations: их последующие изменения не должны менять то, что делает уже применённая миграция
+SEARCH_COLUMNS = ('sender_full_name', 'recipient_full_name', 'origin_location', 'destination_location')
+LOCATION_TABLE = 'parcels_location'
+
+
+def shipment_models(apps):
+    return [apps.get_model('parcels', name) for name in SHIPMENT_MODELS]
+
+
+def location_key(name):
+    # ключ словаря: регистр и пробелы не различают пункты
+    return ' '.join(name.split()).casefold()
+
+
+# Выражения колонок индекса: до миграции пункты — текстовые колонки, после — ссылки на словарь,
+# и в индекс попадают их названия. postgres(table, column), sqlite(alias, column).
+TEXT_COLUMNS = {
+    'postgresql': lambda table, column: f'"{table}"."{column}"',
+    'sqlite': lambda alias, column: f'{alias}.{column}',
+}
+NAME_COLUMNS = {
+    # индекс выражения не может ссылаться на словарь напрямую: название подставляет IMMUTABLE-функция
+    'postgresql': lambda table, column: f'{LOCATION_TABLE}_name("{table}"."{column}_id")',
+    'sqlite': lambda alias, column: f'(SELECT name FROM {LOCATION_TABLE} WHERE id = {alias}.{column}_id)',
+}
+
+
+def column_sql(vendor, alias, column, locations):
+    if locations and column in LOCATION_FIELDS:
+        return NAME_COLUMNS[vendor](alias, column)
+    return TEXT_COLUMNS[vendor](alias, column)
+
+
+def postgres_indexes(table, locations):
+    def vector(columns):
+        concatenated = " || ' ' || ".join(column_sql('postgresql', table, column, locations) for column in columns)
+        return f"to_tsvector('simple'::regconfig, {concatenated})"
+
+    return {
+        f'{table}_search_gin': vector(SEARCH_COLUMNS),
+        f'{table}_sender_gin': vector(('sender_full_name',)),
+    }
+
+
+def install_postgres(cursor, table, locations):
+    if locations:
+        # таблица словаря — с именем схемы: pg_restore строит индексы с пустым search_path
+        cursor.execute('SELECT current_schema()')
+        schema = cursor.fetchone()[0]
+        cursor.execute(
+            f'CREATE OR REPLACE FUNCTION {LOCATION_TABLE}_name(integer) RETURNS text '
+            f'LANGUAGE sql IMMUTABLE PARALLEL SAFE AS '
+            f'$$ SELECT name FROM "{schema}"."{LOCATION_TABLE}" WHERE id = $1 $$'
+        )
+    for name, expression in postgres_indexes(table, locations).items():
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin ({expression})')
+
+
+def uninstall_postgres(cursor, table):
+    # имена индексов у обеих версий одни и те же
+    for name in postgres_indexes(table, locations=False):
+        cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+def install_sqlite(cursor, table, locations):
+    # с пунктами-ссылками содержимое FTS читается из представления <table>_search с названиями пунктов
+    fts, content = f'{table}_fts', f'{table}_search' if locations else table
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join(column_sql('sqlite', 'new', column, locations) for column in SEARCH_COLUMNS)
+    old_values = ', '.join(column_sql('sqlite', 'old', column, locations) for column in SEARCH_COLUMNS)
+    watched = ', '.join(
+        f'{column}_id' if locations and column in LOCATION_FIELDS else column for column in SEARCH_COLUMNS
+    )
+    delete_old = f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    insert_new = f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});"
+    if locations:
+        view_values = ', '.join(f'{column_sql("sqlite", table, column, locations)} AS {column}' for column in SEARCH_COLUMNS)
+        cursor.execute(f'CREATE VIEW IF NOT EXISTS {content} AS SELECT id, {view_values} FROM {table}')
+    cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, content='{content}', content_rowid='id')")
+    cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert_new} END')
+    cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete_old} END')
+    cursor.execute(
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {watched} ON {table} BEGIN {delete_old} {insert_new} END'
+    )
+    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def uninstall_sqlite(cursor, table):
+    fts = f'{table}_fts'
+    for suffix in ('ai', 'ad', 'au'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+    cursor.execute(f'DROP TABLE IF EXISTS {fts}')
+    cursor.execute(f'DROP VIEW IF EXISTS {table}_search')
+
+
+# СУБД -> (установка, удаление); для остальных СУБД поиск идёт через icontains без индексов
+SEARCH_DDL = {
+    'postgresql': (install_postgres, uninstall_postgres),
+    'sqlite': (install_sqlite, uninstall_sqlite),
+}
+
+
+def search_installer(locations):
+    def install(apps, schema_editor):
+        if schema_editor.connection.vendor not in SEARCH_DDL:
+            return
+        install_table, _ = SEARCH_DDL[schema_editor.connection.vendor]
+        with schema_editor.connection.cursor() as cursor:
+            for model in shipment_models(apps):
+                install_table(cursor, model._meta.db_table, locations)
+
+    return install
+
+
+def uninstall_search(apps, schema_editor):
+    if schema_editor.connection.vendor not in SEARCH_DDL:
+        return
+    _, uninstall_table = SEARCH_DDL[schema_editor.connection.vendor]
+    with schema_editor.connection.cursor() as cursor:
+        for model in shipment_models(apps):
+            uninstall_table(cursor, model._meta.db_table)
+
+
+install_text_search = search_installer(locations=False)
+install_location_search = search_installer(locations=True)
+
+
+def intern_locations(apps, schema_editor):
+    """
+    Заносит названия пунктов в словарь и проставляет ссылки. Названия, различающиеся только
+    регистром и пробелами, становятся одним пунктом. Написание выбирается так же, как его
+    сохранил бы API, если бы отправления создавались через него по очереди: первое встреченное
+    (по created_at; при равенстве — самое частое), без пробелов по краям.
+    Перезапись необратима: откат возвращает в строки написание из словаря, а не исходное.
+    Ссылки проставляются одним UPDATE на колонку через временную таблицу «название -> id».
+    """
+    Location = apps.get_model('parcels', 'Location')
+    connection = schema_editor.connection
+    qn = connection.ops.quote_name
+    using = connection.alias
+    # ключ -> написание без пробелов по краям -> [число строк, самая ранняя created_at]
+    spellings = defaultdict(dict)
+    # исходное название -> ключ
+    names = {}
+    for model in shipment_models(apps):
+        for field in LOCATION_FIELDS:
+            counts = (
+                model.objects.using(using).values_list(f'{field}_name')
+                .annotate(count=models.Count('id'), first=models.Min('created_at')).order_by()
+            )
+            for name, count, first in counts:
+                key = names[name] = location_key(name)
+                stats = spellings[key].setdefault(name.strip(), [0, first])
+                stats[0] += count
+                stats[1] = min(stats[1], first)
+    Location.objects.using(using).bulk_create(
+        Location(name=min(variants, key=lambda spelling: (variants[spelling][1], -variants[spelling][0])), key=key)
+        for key, variants in spellings.items()
+    )
+    ids = dict(Location.objects.using(using).values_list('key', 'id'))
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE TEMPORARY TABLE location_names (name varchar(255) PRIMARY KEY, location_id integer NOT NULL)')
+        cursor.executemany(
+            'INSERT INTO location_names (name, location_id) VALUES (%s, %s)',
+            [(name, ids[key]) for name, key in names.items()],
+        )
+        for model in shipment_models(apps):
+            for field in LOCATION_FIELDS:
+                cursor.execute(
+                    f'UPDATE {qn(model._meta.db_table)} SET {qn(field + "_id")} = '
+                    f'(SELECT location_id FROM location_names WHERE name = {qn(field + "_name")})'
+                )
+        cursor.execute('DROP TABLE location_names')
+
+
+def restore_location_names(apps, schema_editor):
+    Location = apps.get_model('parcels', 'Location')
+    qn = schema_editor.connection.ops.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        for model in shipment_models(apps):
+            for field in LOCATION_FIELDS:
+                cursor.execute(
+                    f'UPDATE {qn(model._meta.db_table)} SET {qn(field + "_name")} = '
+                    f'(SELECT name FROM {qn(Location._meta.db_table)} WHERE id = {qn(field + "_id")})'
+                )
+
+
+def location_field(label, null=False):
+    return models.ForeignKey(
+        db_index=False, null=null, on_delete=django.db.models.deletion.PROTECT, related_name='+',
+        to='parcels.location', verbose_name=label,
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    Пункты отправки и получения — ссылки на словарь Location вместо названий в каждой строке.
+    Написания одного пункта сводятся к одному (см. intern_locations) — откат их не восстанавливает.
+    Поисковые индексы снимаются до изменения колонок и строятся заново по названиям из словаря.
+    """
+
+    dependencies = [
+        ('parcels', '0009_shipment_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(uninstall_search, install_text_search),
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255, verbose_name='Название')),
+                ('key', models.TextField(unique=True, verbose_name='Ключ')),
+            ],
+        ),
+        *(
+            migrations.RenameField(model_name=model, old_name=field, new_name=f'{field}_name')
+            for model in SHIPMENT_MODELS for field in LOCATION_FIELDS
+        ),
+        # пока названия переносятся, колонки названий допускают NULL: при откате они добавляются заново
+        *(
+            migrations.AlterField(
+                model_name=model, name=f'{field}_name',
+                field=models.CharField(max_length=255, null=True, verbose_name=label),
+            )
+            for model in SHIPMENT_MODELS for field, label in LOCATION_FIELDS.items()
+        ),
+        *(
+            migrations.AddField(model_name=model, name=field, field=location_field(label, null=True))
+            for model in SHIPMENT_MODELS for field, label in LOCATION_FIELDS.items()
+        ),
+        migrations.RunPython(intern_locations, restore_location_names),
+        *(
+            migrations.RemoveField(model_name=model, name=f'{field}_name')
+            for model in SHIPMENT_MODELS for field in LOCATION_FIELDS
+        ),
+        *(
+            migrations.AlterField(model_name=model, name=field, field=location_field(label))
+            for model in SHIPMENT_MODELS for field, label in LOCATION_FIELDS.items()
+        ),
+        *(
+            migrations.AddIndex(
+                model_name=model,
+                index=models.Index(fields=[field, 'created_at', 'id'], name=name),
+            )
+            for model, indexes in LOCATION_INDEXES.items() for field, name in indexes.items()
+        ),
+        migrations.RunPython(install_location_search, uninstall_search),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcels', '0010_shipment_locations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipmentImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=1024, unique=True, verbose_name='Контрольная точка')),
+                ('records', models.BigIntegerField(default=0, verbose_name='Обработано записей')),
+                ('loaded', models.BigIntegerField(default=0, verbose_name='Загружено')),
+                ('rejected', models.BigIntegerField(default=0, verbose_name='Отклонено')),
+                ('completed', models.BooleanField(default=False, verbose_name='Завершён')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+        ),
+    ]
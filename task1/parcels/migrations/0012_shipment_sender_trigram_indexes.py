@@ -0,0 +1,52 @@
+from django.db import migrations
+
+SHIPMENT_MODELS = ('letter', 'parcel', 'archivedletter', 'archivedparcel')
+
+
+# DDL заморожен здесь, а не берётся из parcels.search: последующие изменения поиска
+# не должны менять то, что делает уже применённая миграция
+def sender_vector(table):
+    return f"to_tsvector('simple'::regconfig, \"{table}\".\"sender_full_name\")"
+
+
+def sender_trigram(table):
+    # то же выражение, что строит icontains на PostgreSQL: UPPER(<колонка>::text) LIKE UPPER(%s)
+    return f'UPPER("{table}"."sender_full_name"::text) gin_trgm_ops'
+
+
+def shipment_tables(apps):
+    return [apps.get_model('parcels', name)._meta.db_table for name in SHIPMENT_MODELS]
+
+
+def install(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table in shipment_tables(apps):
+            cursor.execute(f'DROP INDEX IF EXISTS "{table}_sender_gin"')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS "{table}_sender_trgm" ON "{table}" USING gin ({sender_trigram(table)})')
+
+
+def uninstall(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in shipment_tables(apps):
+            cursor.execute(f'DROP INDEX IF EXISTS "{table}_sender_trgm"')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS "{table}_sender_gin" ON "{table}" USING gin ({sender_vector(table)})')
+
+
+class Migration(migrations.Migration):
+    """
+    Фильтр sender_full_name снова ищет подстроку (icontains): на PostgreSQL вместо полнотекстового
+    индекса по ФИО отправителя — триграммный GIN-индекс (pg_trgm), который обслуживает LIKE '%...%'.
+    """
+
+    dependencies = [
+        ('parcels', '0011_shipment_import_checkpoints'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -6,6 +6,22 @@ from .constants import (
     PHONE_MAX_LENGTH
 )
 
+class Location(models.Model):
+    """
+    Словарь пунктов отправки и получения: отправления ссылаются на пункт целым ключом вместо
+    названия, которое повторялось бы в миллионах строк. key — название, свёрнутое по регистру
+    (casefold, пробелы схлопнуты): по нему пункт находится при записи и фильтрации; name — написание,
+    с которым пункт впервые пришёл в API. Записи словаря не меняются и не удаляются (parcels/locations.py).
+    """
+    id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=LOCATION_MAX_LENGTH, verbose_name="Название")
+    # casefold может удлинить строку (ß -> ss), поэтому без ограничения длины
+    key = models.TextField(unique=True, verbose_name="Ключ")
+
+    def __str__(self):
+        return self.name
+
+
 class BaseShipment(models.Model):
     sender_full_name = models.CharField(
         max_length=FULL_NAME_MAX_LENGTH,
@@ -15,12 +31,13 @@ class BaseShipment(models.Model):
         max_length=FULL_NAME_MAX_LENGTH,
         verbose_name="ФИО получателя"
     )
-    origin_location = models.CharField(
-        max_length=LOCATION_MAX_LENGTH,
+    # отдельные индексы по пунктам не нужны: в рабочих таблицах их покрывают составные индексы ниже
+    origin_location = models.ForeignKey(
+        Location, on_delete=models.PROTECT, related_name='+', db_index=False,
         verbose_name="Пункт отправки"
     )
-    destination_location = models.CharField(
-        max_length=LOCATION_MAX_LENGTH,
+    destination_location = models.ForeignKey(
+        Location, on_delete=models.PROTECT, related_name='+', db_index=False,
         verbose_name="Пункт получения"
     )
     origin_postcode = models.IntegerField(verbose_name="Индекс места отправки")
@@ -36,12 +53,19 @@ class BaseShipment(models.Model):
         indexes = [ 
             models.Index(fields=['origin_postcode']),
             models.Index(fields=['destination_postcode']),
+            # составные индексы под keyset-пагинацию: (поле сортировки, id)
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['updated_at', 'id']),
+            models.Index(fields=['sender_full_name', 'id']),
+            # фильтр по пункту — равенство целого ключа, с сортировкой по умолчанию
+            models.Index(fields=['origin_location', 'created_at', 'id']),
+            models.Index(fields=['destination_location', 'created_at', 'id']),
         ]
 
 
-class Letter(BaseShipment):
+class BaseLetter(BaseShipment):
     """
-    Модель, представляющая письмо. Наследует все поля от BaseShipment.
+    Поля письма; общие для рабочей таблицы (Letter) и архива (ArchivedLetter).
     """
     class LetterType(models.IntegerChoices):
         REGULAR = 1, 'письмо'
@@ -60,8 +84,27 @@ class Letter(BaseShipment):
         verbose_name="Вес письма (кг)"
     )
 
+    class Meta(BaseShipment.Meta):
+        abstract = True
+
+
+class Letter(BaseLetter):
+    """
+    Модель, представляющая письмо. Наследует все поля от BaseShipment.
+    """
+
+    class Meta(BaseLetter.Meta):
+        indexes = [
+            *BaseLetter.Meta.indexes,
+            # фильтр по типу с сортировкой по умолчанию (manage.py shipment_index_report)
+            models.Index(fields=['letter_type', 'created_at', 'id']),
+        ]
+
 
-class Parcel(BaseShipment):
+class BaseParcel(BaseShipment):
+    """
+    Поля посылки; общие для рабочей таблицы (Parcel) и архива (ArchivedParcel).
+    """
     class ParcelType(models.IntegerChoices):
         SMALL_PACKET = 1, 'мелкий пакет'
         PARCEL = 2, 'посылка'
@@ -83,4 +126,114 @@ class Parcel(BaseShipment):
         max_digits=10,
         decimal_places=2,
         verbose_name="Сумма платежа"
-    )
\ No newline at end of file
+    )
+
+    class Meta(BaseShipment.Meta):
+        abstract = True
+
+
+class Parcel(BaseParcel):
+
+    class Meta(BaseParcel.Meta):
+        indexes = [
+            *BaseParcel.Meta.indexes,
+            # фильтры по типу и телефону с сортировкой по умолчанию (manage.py shipment_index_report)
+            models.Index(fields=['parcel_type', 'created_at', 'id']),
+            models.Index(fields=['notification_phone', 'created_at', 'id']),
+        ]
+
+
+class ArchivedShipment(models.Model):
+    """
+    Архивная копия отправления: строки старше SHIPMENT_ARCHIVE_AFTER_DAYS переносятся сюда
+    из рабочей таблицы (parcels/archive.py) с теми же id и датами. Архив только для чтения,
+    из индексов — лишь (created_at, id): чтение архива всегда ограничено датой.
+    На PostgreSQL таблица секционирована по месяцам created_at.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    # даты переносятся как есть, поэтому без auto_now/auto_now_add
+    created_at = models.DateTimeField(verbose_name="Дата создания")
+    updated_at = models.DateTimeField(verbose_name="Дата обновления")
+
+    class Meta:
+        abstract = True
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
+
+
+class ArchivedLetter(ArchivedShipment, BaseLetter):
+    class Meta(ArchivedShipment.Meta):
+        pass
+
+
+class ArchivedParcel(ArchivedShipment, BaseParcel):
+    class Meta(ArchivedShipment.Meta):
+        pass
+
+
+class ShipmentRollup(models.Model):
+    """
+    Сводка отправлений за день по одному измерению (тип, индекс отправки или индекс получения):
+    количество и сумма (вес писем, сумма платежа посылок). Поддерживается инкрементально
+    при каждой записи (см. parcels/rollups.py) и пересчитывается командой rebuild_rollups.
+    """
+    class Dimension(models.TextChoices):
+        TYPE = 'type', 'тип'
+        ORIGIN_POSTCODE = 'origin_postcode', 'индекс места отправки'
+        DESTINATION_POSTCODE = 'destination_postcode', 'индекс места получения'
+
+    kind = models.CharField(max_length=16, verbose_name="Вид отправления")
+    day = models.DateField(verbose_name="День")
+    dimension = models.CharField(max_length=32, choices=Dimension.choices, verbose_name="Измерение")
+    key = models.IntegerField(verbose_name="Значение измерения")
+    count = models.BigIntegerField(default=0, verbose_name="Количество")
+    # сумма в минимальных единицах (граммы, копейки): целые складываются точно на любой СУБД
+    total = models.BigIntegerField(default=0, verbose_name="Сумма")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'dimension', 'day', 'key'], name='shipment_rollup_unique'),
+        ]
+
+
+class ShipmentTombstone(models.Model):
+    """
+    Отметка об удалении отправления для инкрементальной синхронизации (?updated_since=):
+    клиенты узнают из неё, какие записи убрать у себя. Старше окна хранения удаляются
+    командой compact_tombstones.
+    """
+    kind = models.CharField(max_length=16, verbose_name="Вид отправления")
+    shipment_id = models.BigIntegerField(verbose_name="ID отправления")
+    deleted_at = models.DateTimeField(verbose_name="Дата удаления")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'deleted_at']),
+        ]
+
+
+class ShipmentIngestReceipt(models.Model):
+    """
+    Отметка о записи отправления из журнала отложенной записи (parcels/ingest.py).
+    Создаётся в одной транзакции с самим отправлением, поэтому повторная запись журнала
+    после сбоя не создаёт дублей: уже записанные квитанции берут id отсюда.
+    """
+    ticket = models.CharField(max_length=32, unique=True, verbose_name="Квитанция")
+    kind = models.CharField(max_length=16, verbose_name="Вид отправления")
+    shipment_id = models.BigIntegerField(verbose_name="ID отправления")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Дата записи")
+
+
+class ShipmentImportCheckpoint(models.Model):
+    """
+    Контрольная точка импорта (import_shipments): сколько записей входного файла обработано.
+    Сохраняется в одной транзакции с загруженной порцией, поэтому после сбоя порция
+    либо загружена и учтена, либо не загружена и не учтена.
+    """
+    name = models.CharField(max_length=1024, unique=True, verbose_name="Контрольная точка")
+    records = models.BigIntegerField(default=0, verbose_name="Обработано записей")
+    loaded = models.BigIntegerField(default=0, verbose_name="Загружено")
+    rejected = models.BigIntegerField(default=0, verbose_name="Отклонено")
+    completed = models.BooleanField(default=False, verbose_name="Завершён")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
@@ -0,0 +1,179 @@
+import json
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+
+from . import constants as const
+
+
+class ShipmentCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация для писем и посылок.
+
+    В отличие от стандартной CursorPagination из DRF (позиция по одному полю + offset),
+    позиция курсора — пара (значение поля сортировки, id). Следующая страница выбирается
+    условием (field, id) > (value, pk), которое обслуживается диапазонным поиском по составным индексам
+    (field, id) из BaseShipment.Meta.indexes, поэтому страница N стоит столько же, сколько первая.
+    """
+    page_size = const.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = const.MAX_PAGE_SIZE
+    ordering = '-created_at'
+    # уникальное поле, разрешающее совпадения значений основного поля сортировки
+    tiebreaker = 'id'
+
+    @property
+    def base_url(self):
+        # абсолютный адрес (и проверка Host) нужен только ссылкам на соседние страницы
+        return self.request.build_absolute_uri()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page(list(page_queryset))
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """
+        Возвращает ленивый срез queryset'а для текущей страницы (page_size + 1 строк).
+        Вынесено отдельно, чтобы срез можно было выполнить и синхронно, и асинхронно.
+        """
+        if not self.start_page(queryset, request, view):
+            return None
+        # одна лишняя строка показывает, есть ли страница дальше
+        return self.seek(queryset)[:self.page_size + 1]
+
+    def get_union_page(self, querysets, request, view=None):
+        """
+        Срез страницы по объединению querysets. Каждая часть до UNION ALL сама отбрасывает строки
+        до курсора, сортируется и ограничивается page_size + 1 строками (диапазон по индексу
+        (поле сортировки, id)), а внешний запрос сортирует и срезает уже не более
+        page_size + 1 строк от каждой части.
+        """
+        if not self.start_page(querysets[0], request, view):
+            return None
+        limit = self.page_size + 1
+        parts = [self.limit_part(queryset, limit) for queryset in querysets]
+        sign = '-' if self.descending else ''
+        union = parts[0].union(*parts[1:], all=True)
+        return union.order_by(sign + self.field, sign + self.tiebreaker)[:limit]
+
+    def limit_part(self, queryset, limit):
+        """
+        Часть составного запроса: (SELECT ... WHERE <курсор> ORDER BY ... LIMIT limit).
+        SQLite не допускает ORDER BY/LIMIT в частях UNION, там срез по индексу уходит
+        в подзапрос: WHERE pk IN (SELECT pk ... ORDER BY ... LIMIT limit).
+        """
+        page = self.seek(queryset)[:limit]
+        if connections[queryset.db].features.supports_slicing_ordering_in_compound:
+            return page
+        return queryset.order_by().filter(pk__in=page.values('pk'))
+
+    def start_page(self, queryset, request, view=None):
+        """
+        Читает из запроса размер страницы, сортировку и курсор. False — пагинация отключена.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return False
+
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.field = self.ordering[0].lstrip('-')
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor.reverse if self.cursor else False
+        # направление обхода: (сортировка по убыванию) XOR (курсор назад)
+        self.descending = self.ordering[0].startswith('-') != reverse
+        return True
+
+    def seek(self, queryset):
+        """
+        Упорядочивает queryset по (field, tiebreaker) и отбрасывает строки до позиции курсора.
+        """
+        sign = '-' if self.descending else ''
+        queryset = queryset.order_by(sign + self.field, sign + self.tiebreaker)
+
+        if self.cursor is not None:
+            value, pk = self.cursor.position
+            lookup = 'lt' if self.descending else 'gt'
+            # (field, id) > (value, pk), записанное так, чтобы ведущее условие по field
+            # давало планировщику диапазонный поиск по индексу, а не сканирование
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{lookup}e': value}),
+                Q(**{f'{self.field}__{lookup}': value}) | Q(**{f'{self.tiebreaker}__{lookup}': pk}),
+            )
+        return queryset
+
+    def set_page(self, results):
+        """
+        Формирует страницу из строк, выбранных срезом get_page_queryset.
+        """
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        has_cursor = self.cursor is not None
+
+        if has_cursor and self.cursor.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = has_cursor, has_more
+        else:
+            self.has_next, self.has_previous = has_more, has_cursor
+
+        if self.page:
+            self.previous_position = self._get_position_from_instance(self.page[0], self.ordering)
+            self.next_position = self._get_position_from_instance(self.page[-1], self.ordering)
+        else:
+            self.has_next = self.has_previous = False
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.previous_position))
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None:
+            return None
+        try:
+            field, value, pk = json.loads(cursor.position)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        # курсор, выданный для другой сортировки, не имеет смысла
+        if field != self.field:
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=cursor.reverse, position=(value, pk))
+
+    def encode_cursor(self, cursor):
+        value, pk = cursor.position
+        position = json.dumps([self.field, value, pk], ensure_ascii=False)
+        return super().encode_cursor(cursor._replace(position=position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        if isinstance(instance, dict):
+            value, pk = instance[self.field], instance[self.tiebreaker]
+        else:
+            value, pk = getattr(instance, self.field), getattr(instance, self.tiebreaker)
+        if hasattr(value, 'isoformat'):
+            # полная точность (с микросекундами), иначе записи на границе страницы потеряются
+            value = value.isoformat()
+        return value, pk
+
+
+class ShipmentFeedPagination(ShipmentCursorPagination):
+    """
+    Keyset-пагинация единой ленты писем и посылок (UNION ALL) по created_at.
+    id писем и посылок пересекаются, поэтому второе поле позиции — feed_key = id * 2 + номер вида,
+    уникальный в ленте и монотонный по id внутри каждого вида.
+    """
+    tiebreaker = 'feed_key'
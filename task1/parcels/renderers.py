@@ -0,0 +1,83 @@
+import msgpack
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+
+DISPLAY_SUFFIX = '_display'
+
+
+def to_columns(rows):
+    """
+    Записи-словари в колоночный вид: {"columns": [...], "rows": [[...], ...], "enums": {...}}.
+    Колонки *_display не передаются: подпись каждого значения типа попадает в enums один раз
+    ({"letter_type": {"1": "письмо"}}), а строки несут только число. Отсутствующее у записи
+    поле (поля чужого вида в единой ленте) — null.
+    """
+    columns = list(dict.fromkeys(name for row in rows for name in row))
+    displays = {
+        name: name[:-len(DISPLAY_SUFFIX)] for name in columns
+        if name.endswith(DISPLAY_SUFFIX) and name[:-len(DISPLAY_SUFFIX)] in columns
+    }
+    enums = {field: {} for field in displays.values()}
+    for row in rows:
+        for display, field in displays.items():
+            if row.get(field) is not None:
+                enums[field][str(row[field])] = row[display]
+    columns = [name for name in columns if name not in displays]
+    return {
+        "columns": columns,
+        "rows": [[row.get(name) for name in columns] for row in rows],
+        "enums": enums,
+    }
+
+
+def columnar(data):
+    """
+    Колоночный вид ответа: список записей или страница (results) — в колонки, остальные ключи
+    страницы (next, previous, count, sync_token, missing, ...) как есть. Карточки и ошибки не меняются.
+    """
+    if isinstance(data, list) and all(isinstance(row, dict) for row in data):
+        return to_columns(data)
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        page = {key: value for key, value in data.items() if key != 'results'}
+        page.update(to_columns(data['results']))
+        return page
+    return data
+
+
+class ShipmentColumnarRenderer(JSONRenderer):
+    """
+    Колоночный JSON (Accept: application/vnd.shipments.columnar+json или ?format=columnar):
+    имена полей один раз, затем массивы значений. Для межсервисных клиентов, которым не нужны
+    повторяющиеся ключи и подписи типов в каждой записи.
+    """
+    media_type = 'application/vnd.shipments.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(columnar(data), accepted_media_type, renderer_context)
+
+
+class ShipmentMessagePackRenderer(BaseRenderer):
+    """
+    MessagePack (Accept: application/msgpack или ?format=msgpack): та же структура, что у JSON,
+    в двоичном виде. Типы, которых нет в MessagePack (Decimal, даты, ленивые строки), кодируются
+    как в JSON-ответах.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=DjangoJSONEncoder().default, use_bin_type=True)
+
+
+# рендереры API писем и посылок: первыми — стандартные DRF, поэтому без Accept ответ остаётся JSON
+SHIPMENT_RENDERER_CLASSES = (
+    *api_settings.DEFAULT_RENDERER_CLASSES,
+    ShipmentColumnarRenderer,
+    ShipmentMessagePackRenderer,
+)
@@ -0,0 +1,198 @@
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import BigIntegerField, Count, F, Sum
+from django.db.models.functions import Cast, Round, TruncDate
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ArchivedLetter, ArchivedParcel, Letter, Parcel, ShipmentRollup
+from .signals import shipments_changed
+
+Dimension = ShipmentRollup.Dimension
+
+
+class RollupSource:
+    """
+    Как отправления одной модели раскладываются по сводкам: поле типа и суммируемое поле.
+    """
+
+    def __init__(self, model, type_field, total_field, archive_model=None):
+        self.model = model
+        # перенос в архив не меняет сводок, поэтому пересчёт учитывает и архивные записи
+        self.archive_model = archive_model
+        self.kind = model._meta.model_name
+        self.total_field = total_field
+        self.decimal_places = model._meta.get_field(total_field).decimal_places
+        self.scale = 10 ** self.decimal_places
+        self.fields = {
+            Dimension.TYPE: type_field,
+            Dimension.ORIGIN_POSTCODE: 'origin_postcode',
+            Dimension.DESTINATION_POSTCODE: 'destination_postcode',
+        }
+
+    def to_units(self, value):
+        return int(Decimal(str(value)) * self.scale)
+
+    def from_units(self, units):
+        return str(Decimal(units).scaleb(-self.decimal_places))
+
+    def deltas(self, instances, sign):
+        """
+        Изменения сводок от добавления (sign=1) или удаления (sign=-1) отправлений:
+        {(dimension, day, key): [count, total]}.
+        """
+        deltas = {}
+        for instance in instances:
+            day = timezone.localdate(instance.created_at)
+            total = self.to_units(getattr(instance, self.total_field))
+            for dimension, field in self.fields.items():
+                delta = deltas.setdefault((dimension, day, int(getattr(instance, field))), [0, 0])
+                delta[0] += sign
+                delta[1] += sign * total
+        return deltas
+
+    def aggregate(self, using=None):
+        """
+        Сводки, посчитанные заново по таблице отправлений и её архиву: {(dimension, day, key): (count, total)}.
+        """
+        units = Cast(Round(F(self.total_field) * self.scale), BigIntegerField())
+        result = {}
+        for model in filter(None, (self.model, self.archive_model)):
+            queryset = model.objects.using(using).annotate(rollup_day=TruncDate('created_at'))
+            for dimension, field in self.fields.items():
+                rows = queryset.values('rollup_day', field).annotate(count=Count('id'), total=Sum(units))
+                for row in rows.order_by():
+                    key = (dimension, row['rollup_day'], row[field])
+                    count, total = result.get(key, (0, 0))
+                    result[key] = (count + row['count'], total + int(row['total']))
+        return result
+
+    def rollups(self, aggregated, rollup_model=ShipmentRollup):
+        return [
+            rollup_model(kind=self.kind, dimension=dimension, day=day, key=key, count=count, total=total)
+            for (dimension, day, key), (count, total) in aggregated.items()
+        ]
+
+
+# модель -> (поле типа, суммируемое поле)
+ROLLUP_FIELDS = {
+    'letter': ('letter_type', 'weight_kg'),
+    'parcel': ('parcel_type', 'payment_amount'),
+}
+
+ROLLUP_SOURCES = {
+    model: RollupSource(model, *ROLLUP_FIELDS[model._meta.model_name], archive_model=archive_model)
+    for model, archive_model in ((Letter, ArchivedLetter), (Parcel, ArchivedParcel))
+}
+
+
+def apply_deltas(source, deltas, using=None):
+    """
+    Прибавляет изменения к сводкам одним UPSERT'ом (INSERT … ON CONFLICT DO UPDATE):
+    инкремент выполняется в БД, поэтому параллельные записи не теряют друг друга.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    using = using or router.db_for_write(ShipmentRollup)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = qn(ShipmentRollup._meta.db_table)
+    sql = (
+        f'INSERT INTO {table} ({qn("kind")}, {qn("dimension")}, {qn("day")}, {qn("key")}, {qn("count")}, {qn("total")}) '
+        f'VALUES (%s, %s, %s, %s, %s, %s) '
+        f'ON CONFLICT ({qn("kind")}, {qn("dimension")}, {qn("day")}, {qn("key")}) DO UPDATE SET '
+        f'{qn("count")} = {table}.{qn("count")} + excluded.{qn("count")}, '
+        f'{qn("total")} = {table}.{qn("total")} + excluded.{qn("total")}'
+    )
+    params = [
+        (source.kind, dimension, connection.ops.adapt_datefield_value(day), key, count, total)
+        for (dimension, day, key), (count, total) in deltas.items()
+    ]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+@receiver(shipments_changed)
+def update_rollups(sender, action, instances=None, previous=None, **kwargs):
+    source = ROLLUP_SOURCES.get(sender)
+    if source is None or not instances:
+        return
+    if action == 'create':
+        deltas = source.deltas(instances, 1)
+    elif action == 'delete':
+        deltas = source.deltas(instances, -1)
+    else:
+        # обновление: старые значения вычитаются, новые прибавляются
+        deltas = source.deltas(previous or (), -1)
+        for key, (count, total) in source.deltas(instances, 1).items():
+            delta = deltas.setdefault(key, [0, 0])
+            delta[0] += count
+            delta[1] += total
+    apply_deltas(source, deltas)
+
+
+def stored_rollups(source, using=None):
+    rows = ShipmentRollup.objects.using(using).filter(kind=source.kind).exclude(count=0)
+    return {
+        (row.dimension, row.day, row.key): (row.count, row.total)
+        for row in rows.only('dimension', 'day', 'key', 'count', 'total')
+    }
+
+
+def rollup_differences(expected, actual):
+    """
+    Ключи сводок, значения которых расходятся.
+    """
+    return sorted(key for key in expected.keys() | actual.keys() if expected.get(key) != actual.get(key))
+
+
+def rebuild_rollups(source, using=None):
+    """
+    Пересчитывает сводки модели с нуля. Возвращает (пересчитанные сводки, расхождения с прежними).
+    """
+    using = using or router.db_for_write(ShipmentRollup)
+    with transaction.atomic(using=using):
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            # запись отправлений ждёт конца пересчёта, иначе её изменения сводок потерялись бы
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {connection.ops.quote_name(source.model._meta.db_table)} IN SHARE MODE')
+        expected = source.aggregate(using)
+        differences = rollup_differences(expected, stored_rollups(source, using))
+        ShipmentRollup.objects.using(using).filter(kind=source.kind).delete()
+        ShipmentRollup.objects.using(using).bulk_create(source.rollups(expected), batch_size=1000)
+    return expected, differences
+
+
+def stats(source, dimension=None, by_day=False, date_from=None, date_to=None):
+    """
+    Агрегаты из сводок: количество и сумма, сгруппированные по измерению и/или дню.
+    Без измерения суммируются сводки по типу — каждое отправление входит в них ровно один раз.
+    Стоимость зависит от числа дней и значений измерения, но не от числа отправлений.
+    """
+    queryset = ShipmentRollup.objects.filter(kind=source.kind, dimension=dimension or Dimension.TYPE)
+    if date_from:
+        queryset = queryset.filter(day__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(day__lte=date_to)
+
+    group_by = (['key'] if dimension else []) + (['day'] if by_day else [])
+    sums = {'count_sum': Sum('count'), 'total_sum': Sum('total')}
+    if group_by:
+        rows = queryset.values(*group_by).annotate(**sums).filter(count_sum__gt=0).order_by(*group_by)
+    else:
+        rows = [queryset.aggregate(**sums)]
+
+    results = []
+    for row in rows:
+        item = {}
+        if dimension:
+            item[dimension] = row['key']
+        if by_day:
+            item['day'] = row['day'].isoformat()
+        item['count'] = row['count_sum'] or 0
+        item[f'{source.total_field}_sum'] = source.from_units(row['total_sum'] or 0)
+        results.append(item)
+    return results
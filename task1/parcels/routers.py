@@ -0,0 +1,71 @@
+import contextlib
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Cookie, по которому клиент после записи читает с основной базы (read-your-writes).
+PRIMARY_PIN_COOKIE = 'shipment_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Реплика, с которой читает текущий запрос (None — основная база). ContextVar, а не thread-local:
+# async ORM выполняет запросы в потоках sync_to_async, которые получают копию контекста.
+_replica = ContextVar('shipment_read_replica', default=None)
+
+
+class PrimaryReplicaRouter:
+    """
+    Чтения внутри replica_reads() — на реплику, выбранную для запроса; всё остальное
+    (запись, миграции, чтения вне запросов к вьюсетам отправлений) — на основную базу.
+    Подключается в settings.DATABASE_ROUTERS, только если заданы SHIPMENT_DB_REPLICAS.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики содержат те же данные, что и основная база
+        return True
+
+
+def current_replica():
+    return _replica.get()
+
+
+def choose_replica(request):
+    """
+    Реплика для запроса или None: запись, а также чтение клиента, недавно писавшего
+    в базу (cookie PRIMARY_PIN_COOKIE), идут на основную базу.
+    """
+    if not settings.SHIPMENT_DB_REPLICAS or request.method not in SAFE_METHODS:
+        return None
+    if PRIMARY_PIN_COOKIE in request.COOKIES:
+        return None
+    return random.choice(settings.SHIPMENT_DB_REPLICAS)
+
+
+@contextlib.contextmanager
+def replica_reads(request):
+    """
+    Направляет чтения кода внутри блока на реплику, выбранную для запроса.
+    """
+    token = _replica.set(choose_replica(request))
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def pin_to_primary(request, response):
+    """
+    После успешной записи клиент SHIPMENT_DB_STICKY_SECONDS читает с основной базы:
+    реплика могла ещё не получить его изменения.
+    """
+    if settings.SHIPMENT_DB_REPLICAS and request.method not in SAFE_METHODS and response.status_code < 400:
+        response.set_cookie(
+            PRIMARY_PIN_COOKIE, '1', max_age=settings.SHIPMENT_DB_STICKY_SECONDS, httponly=True, samesite='Lax'
+        )
+    return response
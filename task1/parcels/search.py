@@ -0,0 +1,258 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+# Поля, попадающие в полнотекстовый индекс (те же, что BaseShipmentViewSet.search_fields).
+# Пункты — ссылки на словарь Location: в индекс попадают их названия.
+SEARCH_COLUMNS = ('sender_full_name', 'recipient_full_name', 'origin_location', 'destination_location')
+# Имя аннотации релевантности: чем больше, тем релевантнее.
+SEARCH_RANK = 'search_rank'
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def search_tokens(terms):
+    """
+    Разбивает поисковые термины на слова; всё, кроме букв и цифр, отбрасывается,
+    поэтому пользовательский ввод не может изменить синтаксис полнотекстового запроса.
+    """
+    return [token.lower() for term in terms for token in _WORD_RE.findall(term)]
+
+
+def search_fields(model, columns=SEARCH_COLUMNS):
+    # поля модели (в миграциях — исторической): по ним видно, текст это или ссылка на словарь пунктов
+    return [model._meta.get_field(column) for column in columns]
+
+
+class PostgresSearchBackend:
+    """
+    Поиск через tsvector и GIN-индексы выражений (PostgreSQL).
+    Конфигурация 'simple' — без стемминга: ФИО и названия пунктов не являются словами языка.
+    Название пункта в выражение индекса подставляет функция <таблица словаря>_name(id): индекс
+    выражения не может ссылаться на другую таблицу напрямую, а записи словаря не меняются,
+    поэтому функцию можно объявить IMMUTABLE.
+    """
+    config = 'simple'
+
+    def name_function(self, field):
+        return f'{field.related_model._meta.db_table}_name'
+
+    def column_sql(self, table, field):
+        if field.is_relation:
+            return f'{self.name_function(field)}("{table}"."{field.column}")'
+        return f'"{table}"."{field.column}"'
+
+    def vector_sql(self, model, columns):
+        table = model._meta.db_table
+        concatenated = " || ' ' || ".join(self.column_sql(table, field) for field in search_fields(model, columns))
+        return f"to_tsvector('{self.config}'::regconfig, {concatenated})"
+
+    def index_definitions(self, model):
+        # выражения индексов должны совпадать с выражениями в запросах: vector_sql для поиска
+        # и UPPER(<колонка>::text), которое строит icontains, для фильтра sender_full_name (pg_trgm)
+        table = model._meta.db_table
+        return {
+            f'{table}_search_gin': self.vector_sql(model, SEARCH_COLUMNS),
+            f'{table}_sender_trgm': f'UPPER("{table}"."sender_full_name"::text) gin_trgm_ops',
+        }
+
+    def install_name_functions(self, cursor, model):
+        cursor.execute('SELECT current_schema()')
+        schema = cursor.fetchone()[0]
+        for field in search_fields(model):
+            if not field.is_relation:
+                continue
+            # таблица словаря — с именем схемы: pg_restore строит индексы с пустым search_path
+            cursor.execute(
+                f'CREATE OR REPLACE FUNCTION {self.name_function(field)}(integer) RETURNS text '
+                f'LANGUAGE sql IMMUTABLE PARALLEL SAFE AS '
+                f'$$ SELECT name FROM "{schema}"."{field.related_model._meta.db_table}" WHERE id = $1 $$'
+            )
+
+    def install(self, connection, model, rebuild=False):
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            self.install_name_functions(cursor, model)
+            for name, expression in self.index_definitions(model).items():
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin ({expression})')
+
+    def uninstall(self, connection, model):
+        # функции названий общие для всех таблиц и остаются
+        with connection.cursor() as cursor:
+            for name in self.index_definitions(model):
+                cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+    def search(self, queryset, tokens, rank=True):
+        vector = self.vector_sql(queryset.model, SEARCH_COLUMNS)
+        tsquery = ' & '.join(f"'{token}':*" for token in tokens)
+        query = f"to_tsquery('{self.config}'::regconfig, %s)"
+        queryset = queryset.filter(RawSQL(f'{vector} @@ {query}', [tsquery], output_field=BooleanField()))
+        if rank:
+            queryset = queryset.annotate(**{
+                SEARCH_RANK: RawSQL(f'ts_rank({vector}, {query})', [tsquery], output_field=FloatField())
+            })
+        return queryset
+
+
+class SQLiteSearchBackend:
+    """
+    Поиск через теневую FTS5-таблицу с внешним содержимым (SQLite).
+    Таблица <table>_fts синхронизируется с основной триггерами на INSERT/UPDATE/DELETE.
+    Содержимое FTS читает из представления <table>_search, где вместо id пунктов — их названия.
+    """
+
+    def fts_table(self, table):
+        return f'{table}_fts'
+
+    def content_view(self, table):
+        return f'{table}_search'
+
+    def column_sql(self, alias, field):
+        if field.is_relation:
+            return f'(SELECT name FROM {field.related_model._meta.db_table} WHERE id = {alias}.{field.column})'
+        return f'{alias}.{field.column}'
+
+    def install(self, connection, model, rebuild=False):
+        table = model._meta.db_table
+        fts, view = self.fts_table(table), self.content_view(table)
+        fields = search_fields(model)
+        columns = ', '.join(SEARCH_COLUMNS)
+        new_values = ', '.join(self.column_sql('new', field) for field in fields)
+        old_values = ', '.join(self.column_sql('old', field) for field in fields)
+        view_values = ', '.join(
+            f'{self.column_sql(table, field)} AS {column}' for column, field in zip(SEARCH_COLUMNS, fields)
+        )
+        delete_old = f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+        insert_new = f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});"
+        with connection.cursor() as cursor:
+            triggers = [f'{fts}_{suffix}' for suffix in ('ai', 'ad', 'au')]
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)", triggers
+            )
+            # триггеры пропадают, когда миграция SQLite пересоздаёт таблицу; тогда индекс перестраивается
+            rebuild = rebuild or cursor.fetchone()[0] < len(triggers)
+            cursor.execute(f'CREATE VIEW IF NOT EXISTS {view} AS SELECT id, {view_values} FROM {table}')
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                f"{columns}, content='{view}', content_rowid='id')"
+            )
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert_new} END')
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete_old} END')
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {", ".join(field.column for field in fields)} ON {table} '
+                f'BEGIN {delete_old} {insert_new} END'
+            )
+            if rebuild:
+                cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    def uninstall(self, connection, model):
+        table = model._meta.db_table
+        fts = self.fts_table(table)
+        with connection.cursor() as cursor:
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {fts}')
+            cursor.execute(f'DROP VIEW IF EXISTS {self.content_view(table)}')
+
+    def search(self, queryset, tokens, rank=True):
+        table = queryset.model._meta.db_table
+        fts = self.fts_table(table)
+        match = ' AND '.join(f'"{token}"*' for token in tokens)
+        if not rank:
+            return queryset.filter(id__in=RawSQL(f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', [match]))
+        # rank (bm25) доступен только в самом полнотекстовом запросе, поэтому FTS-таблица
+        # присоединяется к основной; коррелированный подзапрос на строку стоил бы O(n²)
+        queryset = queryset.extra(
+            tables=[fts],
+            where=[f'"{fts}"."rowid" = "{table}"."id"', f'"{fts}" MATCH %s'],
+            params=[match],
+        )
+        # bm25 в FTS5 отрицателен (меньше — релевантнее), поэтому знак меняется
+        return queryset.annotate(**{SEARCH_RANK: RawSQL(f'-"{fts}"."rank"', [], output_field=FloatField())})
+
+
+SEARCH_BACKENDS = {
+    'postgresql': PostgresSearchBackend(),
+    'sqlite': SQLiteSearchBackend(),
+}
+
+
+def get_search_backend(using):
+    """
+    Возвращает поисковый бэкенд для подключения или None, если для СУБД
+    индексированного поиска нет (тогда используется icontains из SearchFilter).
+    """
+    return SEARCH_BACKENDS.get(connections[using].vendor)
+
+
+def install_search_indexes(connection, models, rebuild=False):
+    """
+    Ставит поисковые индексы на таблицы models. В миграциях передаются исторические модели:
+    от их полей зависит, из каких колонок строится индекс.
+    """
+    backend = SEARCH_BACKENDS.get(connection.vendor)
+    if backend is None:
+        return
+    existing = set(connection.introspection.table_names())
+    for model in models:
+        if model._meta.db_table in existing:
+            backend.install(connection, model, rebuild=rebuild)
+
+
+def uninstall_search_indexes(connection, models):
+    backend = SEARCH_BACKENDS.get(connection.vendor)
+    if backend is None:
+        return
+    for model in models:
+        backend.uninstall(connection, model)
+
+
+def search_queryset(queryset, terms, rank=True):
+    """
+    Фильтрует queryset по поисковым терминам через индексированный бэкенд.
+    Возвращает None, если бэкенд для СУБД не поддерживается.
+    """
+    backend = get_search_backend(queryset.db)
+    if backend is None:
+        return None
+    tokens = search_tokens(terms)
+    if not tokens:
+        return queryset
+    return backend.search(queryset, tokens, rank=rank)
+
+
+class ShipmentSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter, использующий полнотекстовый индекс текущей СУБД.
+    Результаты аннотируются релевантностью (search_rank), если rank=True.
+    """
+    rank = True
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        result = search_queryset(queryset, terms, rank=self.rank)
+        if result is None:
+            return super().filter_queryset(request, queryset, view)
+        return result
+
+
+class ShipmentOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter, который при поиске без явного ?ordering= сортирует по релевантности,
+    а при синхронизации (?updated_since=) — всегда по updated_at: клиент дочитывает изменения
+    страницами по индексу (updated_at, id), и ни одно изменение не проскакивает между страницами.
+    """
+    sync_param = 'updated_since'
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get(self.sync_param):
+            return ['updated_at']
+        if not request.query_params.get(self.ordering_param) and SEARCH_RANK in queryset.query.annotations:
+            return ['-' + SEARCH_RANK]
+        return super().get_ordering(request, queryset, view)
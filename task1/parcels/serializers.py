@@ -1,9 +1,75 @@
 from rest_framework import serializers
 from django.core.validators import MinValueValidator
-from .models import Letter, Parcel
+from django.core.exceptions import FieldDoesNotExist
+from django.db import router, transaction
+from django.db.models import BigIntegerField, ExpressionWrapper, F, Value
+from django.db.models.constants import LOOKUP_SEP
+from functools import lru_cache
+from .locations import intern_locations, location_key
+from .models import Letter, Location, Parcel
 from . import constants as const
 
+class ShipmentListSerializer(serializers.ListSerializer):
+    """
+    many=True-сериализатор для пакетной регистрации.
+    Элементы валидируются независимо: ошибки собираются в item_errors по индексу элемента,
+    а валидные элементы сохраняются через bulk_create одной транзакцией.
+    """
+
+    def run_child_validation(self, data):
+        # ошибка одного элемента не должна отменять валидацию всего пакета
+        try:
+            return super().run_child_validation(data)
+        except serializers.ValidationError as exc:
+            return exc
+
+    def to_internal_value(self, data):
+        self.item_errors = {}
+        self.item_indexes = []
+        validated = []
+        for index, item in enumerate(super().to_internal_value(data)):
+            if isinstance(item, serializers.ValidationError):
+                self.item_errors[index] = item.detail
+            else:
+                self.item_indexes.append(index)
+                validated.append(item)
+        return validated
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        with transaction.atomic(using=router.db_for_write(model)):
+            instances = [model(**attrs) for attrs in intern_locations(validated_data)]
+            for start in range(0, len(instances), const.BULK_CREATE_BATCH_SIZE):
+                model.objects.bulk_create(instances[start:start + const.BULK_CREATE_BATCH_SIZE])
+        return instances
+
+
+class LocationField(serializers.CharField):
+    """
+    Пункт из словаря (Location) по названию: в ответе — название, на входе — название, которое
+    проверяется как текстовое поле. Формат API тот же, что у прежнего текстового поля; быстрый путь
+    чтения берёт название JOIN-ом (<поле>__name).
+    Валидация в базу не пишет и возвращает несохранённую запись словаря: в словарь пункт заносит
+    сохранение (intern_locations) в транзакции записи, поэтому отклонённый запрос, dry_run и
+    невалидный элемент пакета словарь не пополняют.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_length', const.LOCATION_MAX_LENGTH)
+        super().__init__(**kwargs)
+
+    def run_validation(self, data=serializers.empty):
+        # длина и пустота проверяются у строки, поэтому в словарь попадает только допустимое название
+        name = super().run_validation(data)
+        return Location(name=name.strip(), key=location_key(name))
+
+    def to_representation(self, value):
+        return value.name
+
+
 class BaseShipmentSerializer(serializers.ModelSerializer):
+    origin_location = LocationField()
+    destination_location = LocationField()
     origin_postcode = serializers.IntegerField(
         validators=[MinValueValidator(const.POSTCODE_MIN_VALUE, message=const.ERROR_MSG_POSTCODE_LENGTH)],
     )
@@ -11,6 +77,13 @@ class BaseShipmentSerializer(serializers.ModelSerializer):
         validators=[MinValueValidator(const.POSTCODE_MIN_VALUE, message=const.ERROR_MSG_POSTCODE_LENGTH)],
     )
 
+    def __init__(self, *args, fields=None, **kwargs):
+        # fields — разреженный набор полей ответа (?fields= / ?omit=), остальные поля убираются
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in [name for name in self.fields if name not in fields]:
+                self.fields.pop(name)
+
     class Meta:
         fields = [
             'id', 'sender_full_name', 'recipient_full_name', 'origin_location',
@@ -18,16 +91,26 @@ class BaseShipmentSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at',
         ]
         read_only_fields = ('created_at', 'updated_at')
+        list_serializer_class = ShipmentListSerializer
 
     def validate(self, data):
         if 'origin_postcode' in data and 'destination_postcode' in data:
             if data['origin_postcode'] == data['destination_postcode']:
                 raise serializers.ValidationError(const.ERROR_MSG_POSTCODE_MATCH)
+        # пункты сравниваются по ключу словаря: без учёта регистра и лишних пробелов
         if 'origin_location' in data and 'destination_location' in data:
-            if data['origin_location'].lower() == data['destination_location'].lower():
+            if data['origin_location'].key == data['destination_location'].key:
                 raise serializers.ValidationError(const.ERROR_MSG_LOCATION_MATCH)
         return data
 
+    def create(self, validated_data):
+        with transaction.atomic(using=router.db_for_write(self.Meta.model)):
+            return super().create(intern_locations([validated_data])[0])
+
+    def update(self, instance, validated_data):
+        with transaction.atomic(using=router.db_for_write(self.Meta.model)):
+            return super().update(instance, intern_locations([validated_data])[0])
+
 class LetterSerializer(BaseShipmentSerializer):
     letter_type_display = serializers.CharField(source='get_letter_type_display', read_only=True)
 
@@ -52,4 +135,202 @@ class ParcelSerializer(BaseShipmentSerializer):
 
     class Meta(BaseShipmentSerializer.Meta):
         model = Parcel
-        fields = BaseShipmentSerializer.Meta.fields + ['notification_phone', 'parcel_type', 'parcel_type_display', 'payment_amount']
\ No newline at end of file
+        fields = BaseShipmentSerializer.Meta.fields + ['notification_phone', 'parcel_type', 'parcel_type_display', 'payment_amount']
+
+
+class ShipmentBulkSerializer(serializers.Serializer):
+    """
+    Тело массовой операции: ids — выбранные записи (вместе с фильтрами из строки запроса),
+    changes — новые значения полей (проверяются сериализатором модели с partial=True).
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, allow_empty=False, max_length=const.BULK_MAX_IDS,
+    )
+    changes = serializers.DictField(required=False)
+
+
+class ShipmentFastReader:
+    """
+    Быстрый путь чтения для списков и выгрузок.
+    Читает только нужные колонки кортежами (values_list) и собирает словари в плотном цикле,
+    минуя механизм полей DRF. *_display берутся из заранее построенных таблиц IntegerChoices,
+    даты и Decimal форматируются теми же полями сериализатора, поэтому вывод байт-в-байт
+    совпадает с полным сериализатором. Запись по-прежнему идёт через валидирующие сериализаторы.
+    """
+    # поля, для которых значение из БД уже совпадает с представлением
+    passthrough_fields = (serializers.IntegerField, serializers.CharField)
+
+    def __init__(self, serializer_class, fields=None):
+        serializer = serializer_class(fields=fields)
+        model = serializer_class.Meta.model
+        self.columns = []
+        self.layout = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            source = field.source
+            if isinstance(field, LocationField):
+                source = f'{source}__name'
+                convert = None
+            elif source.startswith('get_') and source.endswith('_display'):
+                source = source[len('get_'):-len('_display')]
+                labels = {value: str(label) for value, label in model._meta.get_field(source).flatchoices}
+                convert = self._display_converter(labels)
+            elif type(field) in self.passthrough_fields:
+                convert = None
+            else:
+                convert = field.to_representation
+            if source not in self.columns:
+                self.columns.append(source)
+            self.layout.append((name, self.columns.index(source), convert))
+        self.field_names = [name for name, index, convert in self.layout]
+
+    @staticmethod
+    def _display_converter(labels):
+        # как get_FOO_display: неизвестное значение выводится как есть
+        def convert(value):
+            return labels[value] if value in labels else str(value)
+        return convert
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def for_serializer(cls, serializer_class, fields=None):
+        return cls(serializer_class, fields)
+
+    def rows(self, queryset):
+        """
+        Queryset строк-кортежей с нужными колонками. Поля сортировки, id и аннотации (например,
+        search_rank) добавляются в конец строки, чтобы пагинация могла взять из них позицию курсора,
+        даже если в ответ они не выводятся.
+        """
+        columns = list(self.columns)
+        ordering = [name.lstrip('-') for name in queryset.query.order_by if isinstance(name, str)]
+        for name in (*ordering, 'id', *queryset.query.annotations):
+            if name not in columns:
+                columns.append(name)
+        return queryset.values_list(*columns, named=True)
+
+    def represent_row(self, row):
+        data = {}
+        for name, index, convert in self.layout:
+            value = row[index]
+            data[name] = value if convert is None or value is None else convert(value)
+        return data
+
+    def to_representation(self, rows):
+        represent_row = self.represent_row
+        return [represent_row(row) for row in rows]
+
+
+class ShipmentFeedReader:
+    """
+    Чтение единой ленты писем и посылок одним запросом UNION ALL.
+    Части объединения выбирают одинаковый набор колонок: общие поля BaseShipment, вид (kind),
+    ключ ленты (feed_key) и запрошенные поля конкретных видов — у чужого вида вместо них NULL.
+    В ответе поля вида есть только у записей этого вида.
+    """
+    kinds = {'letter': LetterSerializer, 'parcel': ParcelSerializer}
+    # поле позиции курсора ленты: читается всегда, даже если его нет среди выбранных полей
+    position_column = 'created_at'
+
+    def __init__(self, include=(), fields=None):
+        readers = {kind: ShipmentFastReader.for_serializer(serializer) for kind, serializer in self.kinds.items()}
+        base_reader = readers['letter']
+        base_fields = BaseShipmentSerializer.Meta.fields if fields is None else fields
+        base_layout = [item for item in base_reader.layout if item[0] in base_fields]
+        self.columns = [base_reader.columns[index] for name, index, convert in base_layout]
+        if self.position_column not in self.columns:
+            self.columns.append(self.position_column)
+        self.columns += ['kind', 'feed_key']
+        base = [(name, self.columns.index(base_reader.columns[index]), convert) for name, index, convert in base_layout]
+        base.append(('kind', self.columns.index('kind'), None))
+
+        self.layouts = {kind: list(base) for kind in self.kinds}
+        self.own_columns = {kind: set() for kind in self.kinds}
+        for kind, reader in readers.items():
+            for name, index, convert in reader.layout:
+                if name not in include:
+                    continue
+                column = reader.columns[index]
+                if column not in self.columns:
+                    self.columns.append(column)
+                self.own_columns[kind].add(column)
+                self.layouts[kind].append((name, self.columns.index(column), convert))
+
+    @classmethod
+    def type_fields(cls):
+        """
+        Поля, которые есть только у одного вида отправлений (их можно запросить через include).
+        """
+        fields = []
+        for serializer in cls.kinds.values():
+            fields += [name for name in serializer.Meta.fields if name not in BaseShipmentSerializer.Meta.fields]
+        return fields
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def for_include(cls, include, fields=None):
+        return cls(include, fields)
+
+    def rows(self, kind, queryset):
+        """
+        Часть объединения для одного вида: queryset строк-кортежей с колонками ленты.
+        """
+        model = queryset.model
+        number = list(self.kinds).index(kind)
+        annotations = {
+            'kind': Value(kind),
+            'feed_key': ExpressionWrapper(F('id') * len(self.kinds) + number, output_field=BigIntegerField()),
+        }
+        for column in self.columns:
+            if column not in annotations and not _has_field(model, column):
+                annotations[column] = Value(None, output_field=self._column_field(column))
+        return queryset.annotate(**annotations).values_list(*self.columns, named=True)
+
+    def _column_field(self, column):
+        for kind, serializer in self.kinds.items():
+            if column in self.own_columns[kind]:
+                return serializer.Meta.model._meta.get_field(column).clone()
+        raise LookupError(column)
+
+    def represent_row(self, row):
+        data = {}
+        for name, index, convert in self.layouts[row.kind]:
+            value = row[index]
+            data[name] = value if convert is None or value is None else convert(value)
+        return data
+
+    def to_representation(self, rows):
+        represent_row = self.represent_row
+        return [represent_row(row) for row in rows]
+
+
+def sparse_fields(query_params, available):
+    """
+    Разреженный набор полей ответа по ?fields= и ?omit= (имена через запятую): кортеж имён
+    в порядке available или None, если ни один из параметров не задан.
+    Неизвестное имя — ошибка валидации (400).
+    """
+    selected = None
+    for param in ('fields', 'omit'):
+        value = query_params.get(param)
+        if not value:
+            continue
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        if not names <= set(available):
+            message = const.ERROR_MSG_SPARSE_FIELDS.format(param=param, fields=', '.join(available))
+            raise serializers.ValidationError({"error": message})
+        if selected is None:
+            selected = set(available)
+        selected = selected & names if param == 'fields' else selected - names
+    if selected is None:
+        return None
+    return tuple(name for name in available if name in selected)
+
+
+def _has_field(model, name):
+    try:
+        model._meta.get_field(name.split(LOOKUP_SEP)[0])
+    except FieldDoesNotExist:
+        return False
+    return True
@@ -0,0 +1,21 @@
+from django.dispatch import Signal
+
+# Отправляется после изменения писем/посылок через API и пакетные операции
+# (bulk_create и т.п. не вызывают post_save/post_delete).
+# Аргументы: sender — класс модели, action — 'create' | 'update' | 'delete',
+# pks — id затронутых записей (пусто, если id неизвестны, как при импорте через COPY),
+# instances — сами объекты (None, если запись шла в обход моделей),
+# previous — для 'update' копии объектов до изменения (нужны сводкам, чтобы вычесть старые значения).
+shipments_changed = Signal()
+
+
+def notify_shipments_changed(model, action, instances=None, pks=None, previous=None):
+    if pks is None:
+        pks = [instance.pk for instance in instances]
+    shipments_changed.send(sender=model, action=action, instances=instances, pks=pks, previous=previous)
+
+
+async def anotify_shipments_changed(model, action, instances=None, pks=None, previous=None):
+    if pks is None:
+        pks = [instance.pk for instance in instances]
+    await shipments_changed.asend(sender=model, action=action, instances=instances, pks=pks, previous=previous)
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import constants as const
+from .models import ShipmentTombstone
+from .signals import shipments_changed
+
+
+class SyncExpired(APIException):
+    """
+    410 на запрос синхронизации: изменения с updated_since отдать нельзя, клиент загружает данные заново.
+    Тело — как у ответа sync_expired_response.
+    """
+    status_code = status.HTTP_410_GONE
+
+    def __init__(self, message):
+        super().__init__({"error": message})
+
+
+@receiver(shipments_changed)
+def record_tombstones(sender, action, pks, **kwargs):
+    if action != 'delete' or not pks:
+        return
+    deleted_at = timezone.now()
+    kind = sender._meta.model_name
+    ShipmentTombstone.objects.bulk_create(
+        [ShipmentTombstone(kind=kind, shipment_id=pk, deleted_at=deleted_at) for pk in pks],
+        batch_size=const.BULK_CREATE_BATCH_SIZE,
+    )
+
+
+def sync_token(lag=0):
+    """
+    Значение updated_since для следующей синхронизации клиента (lag — отставание источника данных, с).
+    """
+    return (timezone.now() - timedelta(seconds=const.SYNC_OVERLAP_SECONDS + lag)).isoformat()
+
+
+def sync_horizon():
+    """
+    Момент, раньше которого отметки об удалениях могли быть уже удалены.
+    """
+    return timezone.now() - timedelta(days=settings.SHIPMENT_TOMBSTONE_RETENTION_DAYS)
+
+
+def deleted_since(model, since):
+    """
+    id записей модели, удалённых после since (по индексу (kind, deleted_at)).
+    """
+    tombstones = ShipmentTombstone.objects.filter(kind=model._meta.model_name, deleted_at__gt=since)
+    return tombstones.order_by('deleted_at').values_list('shipment_id', flat=True)
+
+
+def compact_tombstones(before=None):
+    """
+    Удаляет отметки старше окна хранения. Возвращает число удалённых.
+    """
+    deleted, _ = ShipmentTombstone.objects.filter(deleted_at__lt=before or sync_horizon()).delete()
+    return deleted
@@ -1,9 +1,75 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+import msgpack
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
-from .models import Letter, Parcel
+from . import constants as const
+from .models import ArchivedLetter, Letter, Location, Parcel, ShipmentImportCheckpoint, ShipmentTombstone
+from .archive import archive_shipments
+from .bulk import bulk_delete, bulk_update
+from .middleware import accepted_encodings
+from .renderers import ShipmentColumnarRenderer
+from .cache import get_cache, get_generation
+from .serializers import LetterSerializer, ParcelSerializer, ShipmentFastReader
+from .async_views import AsyncLetterView, AsyncParcelView
+from .indexing import FILTER_SAMPLES, SHIPMENT_VIEWSETS, PlanCase, describe_index, inspect_case
+from .locations import intern_location, location_cache, location_key
+from .importing import SQLiteLoader, init_worker
+from .ingest import flush_journal, get_journal, ingest_metrics, ticket_status, write_entries
+from .instrumentation import metrics
+from .routers import PRIMARY_PIN_COOKIE, PrimaryReplicaRouter, replica_reads
+from .live import OVERFLOW_EVENT, LiveApplication, LivePublisher, LiveSubscription, broker, live_event, live_publisher
+from .filters import LetterFilter, ParcelFilter
+
+
+def model_generation(label):
+    # выполняется в отдельном процессе: поколение данных модели, которое видит другой воркер
+    from django.apps import apps
+    return get_generation(apps.get_model(label))
+
+
+def generation_in_other_process(label):
+    # spawn, а не fork: копия памяти родителя скрыла бы кеш, который в другом процессе не виден
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'), initializer=init_worker) as executor:
+        return executor.submit(model_generation, label).result()
+
+
+@override_settings(SHIPMENT_DB_REPLICAS=[])
+class ShipmentTestCase(APITestCase):
+    """
+    Базовый класс тестов API: тестовые данные создаются через ORM в обход API
+    и не инвалидируют кеш ответов, поэтому кеш очищается перед каждым тестом.
+    Чтения с реплик (если они настроены) включают только тесты маршрутизации.
+    """
+
+    def setUp(self):
+        get_cache().clear()
+        # id пунктов из откаченных транзакций тестов не должны оставаться в кеше словаря
+        self.addCleanup(location_cache.clear)
+
 
-class ShipmentAPITests(APITestCase):
+class ShipmentAPITests(ShipmentTestCase):
     """
     Набор тестов для API писем и посылок.
     """
@@ -12,6 +78,7 @@ class ShipmentAPITests(APITestCase):
         """
         Предустановка начальных данных
         """
+        super().setUp()
         self.letter_list_url = reverse('letter-list')
         self.parcel_list_url = reverse('parcel-list')
 
@@ -40,8 +107,8 @@ class ShipmentAPITests(APITestCase):
         self.existing_letter = Letter.objects.create(
             sender_full_name="Иванов Иван Иванович",
             recipient_full_name="Сергеев Сергей Сергеевич",
-            origin_location="Казань",
-            destination_location="Уфа",
+            origin_location=intern_location("Казань"),
+            destination_location=intern_location("Уфа"),
             origin_postcode=420000,
             destination_postcode=450000,
             letter_type=Letter.LetterType.REGULAR,
@@ -82,8 +149,8 @@ class ShipmentAPITests(APITestCase):
         response = self.client.get(self.letter_list_url, format='json')
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['letter_type_display'], 'письмо')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['letter_type_display'], 'письмо')
 
 
     def test_get_single_letter(self):
@@ -138,4 +205,2182 @@ class ShipmentAPITests(APITestCase):
         response = self.client.post(self.parcel_list_url, invalid_data, format='json')
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertIn('details', response.data)
\ No newline at end of file
+        self.assertIn('details', response.data)
+
+
+class ShipmentPaginationTests(ShipmentTestCase):
+    """
+    Тесты keyset-пагинации списков.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.letter_list_url = reverse('letter-list')
+        # часть писем с одинаковым created_at, чтобы проверить разрешение совпадений по id
+        self.letters = [
+            Letter.objects.create(
+                sender_full_name=f"Отправитель {i % 3}",
+                recipient_full_name="Получатель",
+                origin_location=intern_location("Казань"),
+                destination_location=intern_location("Уфа"),
+                origin_postcode=420000,
+                destination_postcode=450000,
+                weight_kg="0.100"
+            )
+            for i in range(7)
+        ]
+        Letter.objects.filter(pk__in=[l.pk for l in self.letters[2:5]]).update(created_at=timezone.now())
+
+    def walk(self, params):
+        """
+        Проходит все страницы по ссылкам next и возвращает id в порядке выдачи.
+        """
+        ids = []
+        response = self.client.get(self.letter_list_url, params, format='json')
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.data['results'])
+            if response.data['next'] is None:
+                return ids, response
+            response = self.client.get(response.data['next'], format='json')
+
+    def test_pages_cover_all_rows_once(self):
+        """
+        Тест: проход по страницам выдаёт каждую запись ровно один раз и в порядке -created_at.
+        """
+        ids, _ = self.walk({'page_size': 2})
+        expected = list(Letter.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_ordering_by_name(self):
+        """
+        Тест: пагинация по полю из ordering_fields с повторяющимися значениями.
+        """
+        ids, _ = self.walk({'page_size': 3, 'ordering': 'sender_full_name'})
+        expected = list(Letter.objects.order_by('sender_full_name', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_link(self):
+        """
+        Тест: ссылка previous возвращает предыдущую страницу в том же порядке.
+        """
+        first = self.client.get(self.letter_list_url, {'page_size': 3}, format='json')
+        second = self.client.get(first.data['next'], format='json')
+        back = self.client.get(second.data['previous'], format='json')
+
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_cursor_from_other_ordering_rejected(self):
+        """
+        Тест: курсор, выданный для другой сортировки, отклоняется.
+        """
+        first = self.client.get(self.letter_list_url, {'page_size': 3}, format='json')
+        response = self.client.get(first.data['next'] + '&ordering=sender_full_name', format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+
+class ShipmentBatchTests(ShipmentTestCase):
+    """
+    Тесты пакетной регистрации (POST /api/v1/<letters|parcels>/batch).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.letter_batch_url = reverse('letter-batch')
+        self.parcel_batch_url = reverse('parcel-batch')
+        self.letter_data = {
+            "sender_full_name": "Бачурин Даниил Юрьевич",
+            "recipient_full_name": "Дачурин Баниил Вучич",
+            "origin_location": "Москва",
+            "destination_location": "Биробиджан",
+            "origin_postcode": 100001,
+            "destination_postcode": 100002,
+            "letter_type": Letter.LetterType.REGISTERED,
+            "weight_kg": "1.000"
+        }
+
+    def test_batch_create_letters(self):
+        """
+        Тест: все элементы пакета валидны — создаются одним запросом, ответ содержит id.
+        """
+        response = self.client.post(self.letter_batch_url, [self.letter_data] * 3, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Letter.objects.count(), 3)
+        self.assertEqual([item['index'] for item in response.data['created']], [0, 1, 2])
+        self.assertEqual(
+            sorted(item['id'] for item in response.data['created']),
+            sorted(Letter.objects.values_list('id', flat=True))
+        )
+        self.assertEqual(response.data['errors'], [])
+
+    def test_batch_partial_errors(self):
+        """
+        Тест: невалидный элемент возвращается с индексом, остальные сохраняются.
+        """
+        invalid = dict(self.letter_data, destination_postcode=self.letter_data['origin_postcode'])
+        response = self.client.post(self.letter_batch_url, [self.letter_data, invalid, self.letter_data], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(Letter.objects.count(), 2)
+        self.assertEqual([item['index'] for item in response.data['created']], [0, 2])
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertIn('non_field_errors', response.data['errors'][0]['details'])
+
+    def test_batch_requires_list(self):
+        """
+        Тест: тело запроса должно быть массивом.
+        """
+        response = self.client.post(self.parcel_batch_url, {"sender_full_name": "Иванов"}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('details', response.data)
+        self.assertEqual(Parcel.objects.count(), 0)
+
+
+
+class ShipmentExportTests(ShipmentTestCase):
+    """
+    Тесты потоковой выгрузки (GET /api/v1/<letters|parcels>/export).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.letter_export_url = reverse('letter-export')
+        for i, location in enumerate(["Казань", "Казань", "Уфа"]):
+            Letter.objects.create(
+                sender_full_name=f"Отправитель {i}",
+                recipient_full_name="Получатель",
+                origin_location=intern_location(location),
+                destination_location=intern_location("Самара"),
+                origin_postcode=420000 + i,
+                destination_postcode=443000,
+                weight_kg="0.250"
+            )
+
+    def read(self, response):
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_export_ndjson_with_filter(self):
+        """
+        Тест: NDJSON-выгрузка учитывает фильтры и совпадает с представлением сериализатора.
+        """
+        response = self.client.get(self.letter_export_url, {'origin_location': 'Казань'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row['origin_location'] for row in rows}, {'Казань'})
+        self.assertEqual(rows[0]['weight_kg'], '0.250')
+
+    def test_export_csv(self):
+        """
+        Тест: CSV-выгрузка содержит заголовок и все записи в порядке сортировки.
+        """
+        response = self.client.get(self.letter_export_url, {'export_format': 'csv', 'ordering': 'sender_full_name'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(csv.DictReader(io.StringIO(self.read(response))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual([row['sender_full_name'] for row in rows], ["Отправитель 0", "Отправитель 1", "Отправитель 2"])
+        self.assertEqual(rows[0]['letter_type_display'], 'письмо')
+
+    def test_export_unknown_format(self):
+        """
+        Тест: неизвестный формат выгрузки отклоняется.
+        """
+        response = self.client.get(self.letter_export_url, {'export_format': 'xml'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+
+class ShipmentSearchTests(ShipmentTestCase):
+    """
+    Тесты индексированного поиска (?search= и фильтр sender_full_name).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.letter_list_url = reverse('letter-list')
+        self.letter_data = {
+            "recipient_full_name": "Получатель",
+            "origin_postcode": 420000,
+            "destination_postcode": 450000,
+            "weight_kg": "0.100",
+        }
+        self.ivanov = Letter.objects.create(
+            sender_full_name="Иванов Иван Иванович", origin_location=intern_location("Казань"), destination_location=intern_location("Уфа"),
+            **self.letter_data
+        )
+        self.petrov = Letter.objects.create(
+            sender_full_name="Петров Пётр", origin_location=intern_location("Иваново"), destination_location=intern_location("Уфа"),
+            **self.letter_data
+        )
+        self.sidorov = Letter.objects.create(
+            sender_full_name="Сидоров Сидор", origin_location=intern_location("Самара"), destination_location=intern_location("Уфа"),
+            **self.letter_data
+        )
+
+    def search(self, params):
+        response = self.client.get(self.letter_list_url, params, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+
+    def test_search_ranks_by_relevance(self):
+        """
+        Тест: поиск по префиксу слова находит записи во всех колонках, более релевантные — выше.
+        """
+        ids = self.search({'search': 'иван'})
+        first_page = self.client.get(self.letter_list_url, {'search': 'иван', 'page_size': 1}, format='json')
+        second_page = self.client.get(first_page.data['next'], format='json')
+
+        self.assertEqual(ids, [self.ivanov.pk, self.petrov.pk])
+        self.assertEqual([item['id'] for item in second_page.data['results']], [self.petrov.pk])
+
+    def test_search_multiple_words(self):
+        """
+        Тест: все слова запроса должны присутствовать в записи.
+        """
+        self.assertEqual(self.search({'search': 'петров иваново'}), [self.petrov.pk])
+        self.assertEqual(self.search({'search': 'петров казань'}), [])
+
+    def test_search_with_explicit_ordering(self):
+        """
+        Тест: явная сортировка имеет приоритет над релевантностью.
+        """
+        ids = self.search({'search': 'иван', 'ordering': 'created_at'})
+
+        self.assertEqual(ids, [self.ivanov.pk, self.petrov.pk])
+
+    def test_search_index_follows_updates(self):
+        """
+        Тест: индекс синхронизируется при изменении и удалении записей.
+        """
+        Letter.objects.filter(pk=self.ivanov.pk).update(sender_full_name="Смирнов Олег")
+        self.petrov.delete()
+
+        self.assertEqual(self.search({'search': 'иван'}), [])
+        self.assertEqual(len(self.search({'search': 'смирнов'})), 1)
+
+    def test_sender_full_name_filter(self):
+        """
+        Тест: фильтр sender_full_name ищет подстроку ФИО отправителя без учёта регистра,
+        в том числе с середины слова (в отличие от поиска по началу слов в search).
+        """
+        self.assertEqual(self.search({'sender_full_name': 'иван'}), [self.ivanov.pk])
+        self.assertEqual(self.search({'sender_full_name': 'ванов'}), [self.ivanov.pk])
+        self.assertEqual(self.search({'sender_full_name': 'ИВАНОВИЧ'}), [self.ivanov.pk])
+        self.assertEqual(self.search({'sender_full_name': 'ров'}), [self.sidorov.pk, self.petrov.pk])
+        self.assertEqual(self.search({'search': 'ванов'}), [])
+
+    def test_search_ignores_query_syntax(self):
+        """
+        Тест: служебные символы полнотекстового синтаксиса в запросе не вызывают ошибку.
+        """
+        self.assertEqual(self.search({'search': '"иван* OR (NEAR'}), [])
+
+
+
+class ShipmentCacheTests(ShipmentTestCase):
+    """
+    Тесты кеша ответов, инвалидации по поколениям и условных запросов.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.letter_list_url = reverse('letter-list')
+        self.letter = Letter.objects.create(
+            sender_full_name="Иванов Иван Иванович",
+            recipient_full_name="Сергеев Сергей Сергеевич",
+            origin_location=intern_location("Казань"),
+            destination_location=intern_location("Уфа"),
+            origin_postcode=420000,
+            destination_postcode=450000,
+            weight_kg="0.100"
+        )
+        self.letter_detail_url = reverse('letter-detail', kwargs={'pk': self.letter.pk})
+        self.letter_data = {
+            "sender_full_name": "Бачурин Даниил Юрьевич",
+            "recipient_full_name": "Дачурин Баниил Вучич",
+            "origin_location": "Москва",
+            "destination_location": "Биробиджан",
+            "origin_postcode": 100001,
+            "destination_postcode": 100002,
+            "weight_kg": "1.000"
+        }
+
+    def test_repeated_list_served_from_cache(self):
+        """
+        Тест: повторный запрос списка с теми же (переставленными) параметрами не обращается к БД.
+        """
+        first = self.client.get(self.letter_list_url + '?origin_location=Казань&page_size=10')
+        with self.assertNumQueries(0):
+            second = self.client.get(self.letter_list_url + '?page_size=10&origin_location=Казань&search=')
+
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_write_invalidates_list(self):
+        """
+        Тест: создание, изменение и удаление через API инвалидируют закешированный список.
+        """
+        etag = self.client.get(self.letter_list_url)['ETag']
+        self.client.post(self.letter_list_url, self.letter_data, format='json')
+        response = self.client.get(self.letter_list_url)
+
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertNotEqual(response['ETag'], etag)
+
+        self.client.delete(self.letter_detail_url)
+        self.assertEqual(len(self.client.get(self.letter_list_url).data['results']), 1)
+
+    def test_batch_invalidates_list(self):
+        """
+        Тест: пакетная регистрация инвалидирует закешированный список.
+        """
+        self.client.get(self.letter_list_url)
+        self.client.post(reverse('letter-batch'), [self.letter_data] * 2, format='json')
+
+        self.assertEqual(len(self.client.get(self.letter_list_url).data['results']), 3)
+
+    def test_list_not_modified(self):
+        """
+        Тест: If-None-Match с актуальным ETag списка даёт 304.
+        """
+        etag = self.client.get(self.letter_list_url)['ETag']
+        response = self.client.get(self.letter_list_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_retrieve_not_modified(self):
+        """
+        Тест: запись отдаётся с ETag/Last-Modified, повторный условный запрос даёт 304,
+        а после изменения ETag становится другим.
+        """
+        response = self.client.get(self.letter_detail_url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        not_modified = self.client.get(self.letter_detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(self.letter_detail_url, {"weight_kg": "0.500"}, format='json')
+        updated = self.client.get(self.letter_detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(updated.status_code, status.HTTP_200_OK)
+        self.assertEqual(updated.data['weight_kg'], '0.500')
+        self.assertNotEqual(updated['ETag'], etag)
+
+    def test_file_backend(self):
+        """
+        Тест: кеш работает и с файловым бэкендом.
+        """
+        with tempfile.TemporaryDirectory() as location:
+            caches = {
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'shipments': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+            }
+            with override_settings(CACHES=caches):
+                first = self.client.get(self.letter_detail_url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(self.letter_detail_url)
+                self.client.post(self.letter_list_url, self.letter_data, format='json')
+                listed = self.client.get(self.letter_list_url)
+
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(listed.data['results']), 2)
+
+
+
+class ShipmentFastReaderTests(ShipmentTestCase):
+    """
+    Тесты быстрого пути чтения: вывод должен совпадать с полными сериализаторами байт в байт.
+    """
+
+    def setUp(self):
+        super().setUp()
+        common = {
+            "recipient_full_name": "Сергеев Сергей Сергеевич",
+            "origin_location": intern_location("Казань"),
+            "destination_location": intern_location("Уфа"),
+            "origin_postcode": 420000,
+            "destination_postcode": 450000,
+        }
+        for letter_type, weight in zip(Letter.LetterType.values, ["0.001", "1.5", "12", "9999.999"]):
+            Letter.objects.create(sender_full_name=f"Отправитель {letter_type}", letter_type=letter_type, weight_kg=weight, **common)
+        for parcel_type, amount in zip(Parcel.ParcelType.values, ["0", "0.10", "1500", "99999999.99", "7.5", "42.42"]):
+            Parcel.objects.create(
+                sender_full_name=f"Отправитель {parcel_type}", notification_phone="+79991234567",
+                parcel_type=parcel_type, payment_amount=amount, **common
+            )
+
+    def assertSameRendering(self, serializer_class, queryset):
+        reader = ShipmentFastReader.for_serializer(serializer_class)
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        actual = JSONRenderer().render(reader.to_representation(reader.rows(queryset)))
+        self.assertEqual(actual, expected)
+
+    def test_letters_byte_identical(self):
+        """
+        Тест: письма всех типов сериализуются идентично LetterSerializer.
+        """
+        self.assertSameRendering(LetterSerializer, Letter.objects.order_by('id'))
+
+    def test_parcels_byte_identical(self):
+        """
+        Тест: посылки всех типов сериализуются идентично ParcelSerializer.
+        """
+        self.assertSameRendering(ParcelSerializer, Parcel.objects.order_by('id'))
+
+    def test_list_endpoint_matches_serializer(self):
+        """
+        Тест: страница списка содержит те же данные, что и полный сериализатор.
+        """
+        response = self.client.get(reverse('parcel-list'), {'ordering': 'created_at'})
+        expected = ParcelSerializer(Parcel.objects.order_by('created_at', 'id'), many=True).data
+
+        self.assertEqual(JSONRenderer().render(response.data['results']), JSONRenderer().render(expected))
+
+
+
+class SparseFieldsTests(ShipmentTestCase):
+    """
+    Тесты разреженных наборов полей (?fields= / ?omit=): и вывод, и читаемые колонки.
+    """
+
+    def setUp(self):
+        super().setUp()
+        for number in range(5):
+            Letter.objects.create(
+                sender_full_name=f"Иванов Иван {number}",
+                recipient_full_name="Сергеев Сергей Сергеевич",
+                origin_location=intern_location("Казань"),
+                destination_location=intern_location("Уфа"),
+                origin_postcode=420000,
+                destination_postcode=450000,
+                letter_type=Letter.LetterType.REGISTERED,
+                weight_kg="0.100",
+            )
+        self.letter = Letter.objects.order_by('id').first()
+        self.list_url = reverse('letter-list')
+        self.detail_url = reverse('letter-detail', kwargs={'pk': self.letter.pk})
+
+    def test_list_fields_and_pagination(self):
+        """
+        Тест: список отдаёт только выбранные поля, не читает остальные колонки и листается курсором.
+        """
+        params = {'fields': 'id,letter_type_display', 'page_size': 2}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_url, params)
+        self.assertEqual(response.data['results'][0], {'id': self.letter.pk + 4, 'letter_type_display': 'заказное письмо'})
+        self.assertNotIn('sender_full_name', queries[0]['sql'])
+
+        ids, url, params = [], self.list_url, dict(params, ordering='sender_full_name')
+        while url:
+            response = self.client.get(url, params)
+            ids += [item['id'] for item in response.data['results']]
+            url, params = response.data['next'], None
+        self.assertEqual(ids, list(Letter.objects.order_by('sender_full_name', 'id').values_list('id', flat=True)))
+
+    def test_retrieve_and_export_omit(self):
+        """
+        Тест: omit убирает поля из карточки и выгрузки; у разреженной карточки свой ETag.
+        """
+        full = self.client.get(self.detail_url)
+        params = {'omit': 'sender_full_name,recipient_full_name'}
+        with CaptureQueriesContext(connection) as queries:
+            sparse = self.client.get(self.detail_url, params)
+        self.assertEqual(set(full.data) - set(sparse.data), {'sender_full_name', 'recipient_full_name'})
+        self.assertNotIn('full_name', queries[0]['sql'])
+        self.assertNotEqual(sparse['ETag'], full['ETag'])
+
+        response = self.client.get(reverse('letter-export'), {'export_format': 'csv', 'fields': 'id,weight_kg'})
+        header = b''.join(response.streaming_content).decode('utf-8').splitlines()[0]
+        self.assertEqual(header, 'id,weight_kg')
+
+    def test_unknown_field_rejected(self):
+        """
+        Тест: неизвестное поле — 400 с тем же телом в синхронном и асинхронном API и в ленте.
+        """
+        response = self.client.get(self.list_url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('error', response.data)
+
+        request = AsyncRequestFactory().get(self.list_url, {'fields': 'id,password'})
+        async_response = async_to_sync(AsyncLetterView.as_view())(request)
+        self.assertEqual(json.loads(async_response.content), response.data)
+
+        response = self.client.get(reverse('shipment-feed'), {'omit': 'weight_kg'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('shipment-feed'), {'fields': 'id', 'include': 'weight_kg', 'page_size': 2})
+        self.assertEqual(response.data['results'][0], {'id': self.letter.pk + 4, 'kind': 'letter', 'weight_kg': '0.100'})
+        self.assertIsNotNone(response.data['next'])
+
+
+class ShipmentRendererTests(ShipmentTestCase):
+    """
+    Тесты форматов ответа (колоночный JSON, MessagePack) и сжатия.
+    """
+
+    def setUp(self):
+        super().setUp()
+        for number in range(30):
+            Letter.objects.create(
+                sender_full_name=f"Иванов Иван {number}",
+                recipient_full_name="Сергеев Сергей Сергеевич",
+                origin_location=intern_location("Казань"),
+                destination_location=intern_location("Уфа"),
+                origin_postcode=420000,
+                destination_postcode=450000,
+                letter_type=Letter.LetterType.REGISTERED if number % 2 else Letter.LetterType.REGULAR,
+                weight_kg="0.100",
+            )
+        self.list_url = reverse('letter-list')
+
+    def test_columnar_list(self):
+        """
+        Тест: колоночный список — имена полей один раз, подписи типов в enums вместо *_display.
+        """
+        expected = self.client.get(self.list_url, {'page_size': 5}).data
+        response = self.client.get(self.list_url, {'page_size': 5}, HTTP_ACCEPT=ShipmentColumnarRenderer.media_type)
+        self.assertEqual(response['Content-Type'], ShipmentColumnarRenderer.media_type)
+        self.assertIn('Accept', response['Vary'])
+        data = json.loads(response.content)
+        self.assertNotIn('letter_type_display', data['columns'])
+        self.assertEqual(data['enums'], {'letter_type': {'1': 'письмо', '2': 'заказное письмо'}})
+        self.assertEqual(data['next'], expected['next'])
+        rows = [dict(zip(data['columns'], row)) for row in data['rows']]
+        self.assertEqual(rows, [
+            {name: value for name, value in item.items() if name != 'letter_type_display'} for item in expected['results']
+        ])
+
+        detail = self.client.get(reverse('letter-detail', kwargs={'pk': rows[0]['id']}), {'format': 'columnar'})
+        self.assertEqual(json.loads(detail.content)['letter_type_display'], expected['results'][0]['letter_type_display'])
+
+    def test_msgpack_sync_and_async(self):
+        """
+        Тест: MessagePack несёт те же данные, что JSON, в синхронном и асинхронном API.
+        """
+        expected = json.loads(self.client.get(self.list_url).content)
+        response = self.client.get(self.list_url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), expected)
+
+        # асинхронный список идёт мимо кеша, и sync_token у него свой
+        request = AsyncRequestFactory().get(self.list_url, {'format': 'msgpack'})
+        async_response = async_to_sync(AsyncLetterView.as_view())(request)
+        self.assertEqual(msgpack.unpackb(async_response.content)['results'], expected['results'])
+
+    def test_compression(self):
+        """
+        Тест: крупные ответы сжимаются по Accept-Encoding (ETag становится слабым), мелкие — нет.
+        """
+        self.assertEqual(accepted_encodings('gzip;q=1.0, br;q=0, identity'), {'gzip', 'identity'})
+        plain = self.client.get(self.list_url)
+        self.assertNotIn('Content-Encoding', plain)
+
+        response = self.client.get(self.list_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+        self.assertLess(len(response.content), len(plain.content) // 3)
+
+        with override_settings(SHIPMENT_COMPRESS_MIN_BYTES=len(plain.content) + 1):
+            response = self.client.get(self.list_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+
+class MultiGetTests(ShipmentTestCase):
+    """
+    Тесты выборки по списку id (GET /api/v1/<letters|parcels>?ids=1,2,3).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('parcel-list')
+        self.parcels = [
+            Parcel.objects.create(
+                sender_full_name=f"Смирнов Посылка {number}",
+                recipient_full_name="Олегов Олег Олегович",
+                origin_location=intern_location("Екатеринбург"),
+                destination_location=intern_location("Новосибирск"),
+                origin_postcode=620000,
+                destination_postcode=630000 + number,
+                notification_phone="+79991234567",
+                payment_amount="10.00",
+            )
+            for number in range(4)
+        ]
+
+    def test_results_in_requested_order(self):
+        """
+        Тест: записи возвращаются одним запросом в порядке ids, отсутствующие перечислены в missing.
+        """
+        first, second, third, fourth = (parcel.pk for parcel in self.parcels)
+        ids = f'{third},999,{first},{third},{fourth}'
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'ids': ids, 'fields': 'destination_postcode'})
+        self.assertEqual(response.data, {
+            "results": [{'destination_postcode': 630002}, {'destination_postcode': 630000}, {'destination_postcode': 630003}],
+            "missing": [999],
+        })
+
+        response = self.client.get(self.url, {'ids': f'{first},{second}', 'destination_postcode_min': 630001})
+        self.assertEqual(([item['id'] for item in response.data['results']], response.data['missing']), ([second], [first]))
+
+        request = AsyncRequestFactory().get(self.url, {'ids': ids})
+        async_response = async_to_sync(AsyncParcelView.as_view())(request)
+        self.assertEqual(json.loads(async_response.content), json.loads(self.client.get(self.url, {'ids': ids}).content))
+
+    @override_settings(SHIPMENT_MULTI_GET_MAX_IDS=3)
+    def test_invalid_ids(self):
+        """
+        Тест: нечисловые id и превышение лимита — 400.
+        """
+        for ids in ('1,x', '1,2,3,4'):
+            response = self.client.get(self.url, {'ids': ids})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('3', response.data['error'])
+
+
+class ShipmentCountTests(ShipmentTestCase):
+    """
+    Тесты числа записей списка (?count=true): точный счёт, оценка планировщика и кеш по фильтрам.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('letter-list')
+        self.letter_data = {
+            "sender_full_name": "Иванов Иван Иванович",
+            "recipient_full_name": "Сергеев Сергей Сергеевич",
+            "origin_location": "Казань",
+            "destination_location": "Уфа",
+            "origin_postcode": 420000,
+            "destination_postcode": 450000,
+            "weight_kg": "0.100",
+        }
+        for number in range(3):
+            Letter.objects.create(**dict(
+                self.letter_data, origin_postcode=420000 + number,
+                origin_location=intern_location("Казань"), destination_location=intern_location("Уфа"),
+            ))
+
+    def test_count_is_cached_per_filter(self):
+        """
+        Тест: точное число считается один раз на фильтр и переживает записи до истечения TTL.
+        """
+        self.assertNotIn('count', self.client.get(self.url).data)
+
+        response = self.client.get(self.url, {'count': 'true', 'page_size': 1})
+        self.assertEqual((response.data['count'], response.data['count_exact']), (3, True))
+
+        self.client.post(self.url, self.letter_data, format='json')
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'count': 'true', 'page_size': 1})
+        self.assertEqual(response.data['count'], 3)
+
+        response = self.client.get(self.url, {'count': 'true', 'origin_postcode_min': 420001})
+        self.assertEqual((response.data['count'], response.data['count_exact']), (2, True))
+
+        request = AsyncRequestFactory().get(self.url, {'count': 'true', 'origin_postcode_max': 420001})
+        data = json.loads(async_to_sync(AsyncLetterView.as_view())(request).content)
+        self.assertEqual((data['count'], data['count_exact']), (3, True))
+
+    @skipUnless(connection.vendor == 'postgresql', 'оценка планировщика есть только у PostgreSQL')
+    @override_settings(SHIPMENT_EXACT_COUNT_LIMIT=0)
+    def test_broad_query_count_is_estimated(self):
+        """
+        Тест: для широкой выборки отдаётся оценка планировщика без COUNT(*).
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'count': 'true', 'origin_postcode_min': 420000})
+        self.assertFalse(response.data['count_exact'])
+        self.assertGreaterEqual(response.data['count'], 0)
+        self.assertFalse(any('COUNT(*)' in query['sql'] for query in queries))
+
+
+class AsyncShipmentViewTests(ShipmentTestCase):
+    """
+    Тесты асинхронных представлений: ответы и ошибки должны совпадать с синхронными вьюсетами.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.factory = AsyncRequestFactory()
+        self.letter = Letter.objects.create(
+            sender_full_name="Иванов Иван Иванович",
+            recipient_full_name="Сергеев Сергей Сергеевич",
+            origin_location=intern_location("Казань"),
+            destination_location=intern_location("Уфа"),
+            origin_postcode=420000,
+            destination_postcode=450000,
+            weight_kg="0.100"
+        )
+        self.parcel_data = {
+            "sender_full_name": "Коннор Сара Эдуардовна",
+            "recipient_full_name": "Олегов Олег Олегович",
+            "origin_location": "Екатеринбург",
+            "destination_location": "Новосибирск",
+            "origin_postcode": 620000,
+            "destination_postcode": 630000,
+            "notification_phone": "+79991234567",
+            "parcel_type": Parcel.ParcelType.FIRST_CLASS,
+            "payment_amount": "1500.00"
+        }
+
+    async def call(self, view, method, path, data=None, headers=None, **kwargs):
+        factory_method = getattr(self.factory, method)
+        if data is None:
+            request = factory_method(path, headers=headers)
+        else:
+            request = factory_method(path, data, content_type='application/json', headers=headers)
+        response = await view.as_view()(request, **kwargs)
+        return response, json.loads(response.content) if response.content else None
+
+    async def test_list_matches_sync(self):
+        """
+        Тест: асинхронный список совпадает с синхронным (включая фильтры и пагинацию).
+        """
+        path = reverse('letter-list') + '?origin_location=Казань&page_size=10'
+        response, data = await self.call(AsyncLetterView, 'get', path)
+        expected = json.loads((await self.async_client.get(path)).content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # sync_token зависит от момента запроса
+        self.assertLessEqual(data.pop('sync_token'), expected.pop('sync_token'))
+        self.assertEqual(data, expected)
+
+    async def test_conditional_requests(self):
+        """
+        Тест: список и запись отдают ETag (запись — и Last-Modified) из общего с синхронным API кеша;
+        If-None-Match с актуальным ETag — 304, после изменения записи — новый ETag.
+        """
+        list_path = reverse('letter-list') + '?page_size=10'
+        response, data = await self.call(AsyncLetterView, 'get', list_path)
+        etag = response['ETag']
+        self.assertEqual((await self.async_client.get(list_path))['ETag'], etag)
+        response, data = await self.call(AsyncLetterView, 'get', list_path, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        path = reverse('letter-detail', kwargs={'pk': self.letter.pk})
+        response, data = await self.call(AsyncLetterView, 'get', path, pk=self.letter.pk)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        # второй ответ — из кеша, с теми же валидаторами
+        response, data = await self.call(AsyncLetterView, 'get', path, headers={'If-None-Match': etag}, pk=self.letter.pk)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        await self.call(AsyncLetterView, 'patch', path, {"weight_kg": "0.500"}, pk=self.letter.pk)
+        response, data = await self.call(AsyncLetterView, 'get', path, headers={'If-None-Match': etag}, pk=self.letter.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(data['weight_kg'], '0.500')
+
+    async def test_create_and_validation_errors(self):
+        """
+        Тест: создание посылки и ответ на невалидные данные такие же, как у синхронного API.
+        """
+        path = reverse('parcel-list')
+        response, data = await self.call(AsyncParcelView, 'post', path, self.parcel_data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(data['parcel_type_display'], 'посылка 1 класса')
+        self.assertEqual(await Parcel.objects.acount(), 1)
+
+        invalid = dict(self.parcel_data, destination_location=self.parcel_data['origin_location'].lower())
+        response, data = await self.call(AsyncParcelView, 'post', path, invalid)
+        expected = await self.async_client.post(path, invalid, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(data, json.loads(expected.content))
+
+    async def test_retrieve_update_destroy(self):
+        """
+        Тест: чтение, частичное обновление и удаление письма.
+        """
+        path = reverse('letter-detail', kwargs={'pk': self.letter.pk})
+        response, data = await self.call(AsyncLetterView, 'get', path, pk=self.letter.pk)
+        self.assertEqual(data['id'], self.letter.pk)
+
+        response, data = await self.call(AsyncLetterView, 'patch', path, {"weight_kg": "0.500"}, pk=self.letter.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(data['weight_kg'], '0.500')
+
+        response, data = await self.call(AsyncLetterView, 'patch', path, {"origin_postcode": 1}, pk=self.letter.pk)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('origin_postcode', data['details'])
+
+        response, data = await self.call(AsyncLetterView, 'delete', path, pk=self.letter.pk)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(await Letter.objects.acount(), 0)
+
+    async def test_not_found(self):
+        """
+        Тест: 404 с тем же телом, что и у синхронного API.
+        """
+        path = reverse('letter-detail', kwargs={'pk': 999})
+        response, data = await self.call(AsyncLetterView, 'get', path, pk=999)
+        expected = await self.async_client.get(path)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(data, json.loads(expected.content))
+
+
+class IngestTests(ShipmentTestCase):
+    """
+    Тесты приёма с отложенной записью: 202 с квитанцией, запись журнала пакетами и повтор после сбоя.
+    """
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            SHIPMENT_INGEST_MODE='queued',
+            SHIPMENT_INGEST_JOURNAL=os.path.join(directory.name, 'journal.sqlite3'),
+            SHIPMENT_INGEST_BACKGROUND_FLUSH=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.journal = get_journal()
+        self.addCleanup(self.journal.connection().close)
+        ingest_metrics.reset()
+        self.url = reverse('letter-list')
+        self.letter_data = {
+            "sender_full_name": "Иванов Иван Иванович",
+            "recipient_full_name": "Сергеев Сергей Сергеевич",
+            "origin_location": "Казань",
+            "destination_location": "Уфа",
+            "origin_postcode": 420000,
+            "destination_postcode": 450000,
+            "weight_kg": "0.100",
+        }
+
+    def accept(self, count):
+        tickets = []
+        for number in range(count):
+            response = self.client.post(self.url, dict(self.letter_data, sender_full_name=f"Иванов {number}"), format='json')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            tickets.append(response.data['ticket'])
+        return tickets
+
+    def test_accept_then_flush_in_one_batch(self):
+        """
+        Тест: POST отвечает 202 без записи в БД; flush_ingest записывает очередь одним INSERT, квитанция — done.
+        """
+        invalid = self.client.post(self.url, dict(self.letter_data, weight_kg="0"), format='json')
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+        tickets = self.accept(3)
+        status_url = reverse('ingest-ticket', kwargs={'ticket': tickets[0]})
+        self.assertEqual(self.client.get(status_url).data['status'], 'queued')
+        self.assertEqual((Letter.objects.count(), self.journal.depth()), (0, 3))
+        # пункты заносятся в словарь при записи журнала, а не при приёме
+        self.assertFalse(Location.objects.exists())
+        self.assertIn('shipment_ingest_queue_depth 3', self.client.get(reverse('metrics')).content.decode())
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('flush_ingest', stdout=io.StringIO())
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "parcels_letter"')]
+        self.assertEqual(len(inserts), 1)
+
+        data = self.client.get(status_url).data
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual(Letter.objects.get(pk=data['id']).sender_full_name, "Иванов 0")
+        self.assertEqual(self.client.get(data['url']).status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self.client.get(self.url).data['results']), 3)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('shipment_ingest_queue_depth 0', body)
+        self.assertIn('shipment_ingest_flush_latency_seconds_count 3', body)
+
+        self.assertEqual(self.client.get(reverse('ingest-ticket', kwargs={'ticket': 'unknown'})).status_code, 404)
+
+    def test_replay_after_crash_has_no_duplicates(self):
+        """
+        Тест: записи упавшего процесса берутся повторно после таймаута, уже записанные в БД не дублируются.
+        """
+        tickets = self.accept(3)
+        # процесс взял порцию и успел записать в БД две записи, но не отметил их в журнале
+        claimed = self.journal.claim(10, stale_before=0)
+        written = write_entries(claimed[:2])
+        self.assertEqual(flush_journal(self.journal), 0)
+
+        self.assertEqual(flush_journal(self.journal, claim_timeout=0), 3)
+        self.assertEqual(Letter.objects.count(), 3)
+        self.assertEqual(self.journal.depth(), 0)
+        for ticket in tickets[:2]:
+            self.assertEqual(ticket_status(ticket)['id'], written[ticket])
+        self.assertEqual(ticket_status(tickets[2])['status'], 'done')
+        call_command('rebuild_rollups', check=True, stdout=io.StringIO())
+
+    def test_journal_entries_with_location_ids(self):
+        """
+        Тест: записи журнала, принятые до хранения пунктов названиями (id под <поле>_id), записываются как раньше.
+        """
+        payload = dict(self.letter_data, origin_location_id=intern_location("Казань").pk,
+                       destination_location_id=intern_location("Уфа").pk)
+        del payload['origin_location'], payload['destination_location']
+        ticket = self.journal.append('letter', payload)
+        self.assertEqual(flush_journal(self.journal), 1)
+        letter = Letter.objects.get(pk=ticket_status(ticket)['id'])
+        self.assertEqual((letter.origin_location.name, letter.destination_location.name), ("Казань", "Уфа"))
+
+    def test_poison_entry_does_not_block_queue(self):
+        """
+        Тест: запись, которая не записывается, не держит очередь — записи за ней записываются,
+        а она после INGEST_MAX_ATTEMPTS попыток отмечается failed с текстом ошибки.
+        """
+        poison = self.journal.append('letter', dict(self.letter_data, weight_kg="не число"))
+        tickets = self.accept(3)
+
+        self.assertEqual(flush_journal(self.journal), 3)
+        self.assertEqual(Letter.objects.count(), 3)
+        self.assertEqual([ticket_status(ticket)['status'] for ticket in tickets], ['done'] * 3)
+        self.assertEqual(ticket_status(poison)['status'], 'queued')
+
+        for _ in range(const.INGEST_MAX_ATTEMPTS - 2):
+            self.assertEqual(flush_journal(self.journal), 0)
+        self.assertEqual(flush_journal(self.journal), 1)
+        self.assertEqual(self.journal.depth(), 0)
+        self.assertEqual(flush_journal(self.journal), 0)
+
+        response = self.client.get(reverse('ingest-ticket', kwargs={'ticket': poison}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'failed')
+        self.assertIn('ValidationError', response.data['error'])
+        self.assertNotIn('url', response.data)
+
+    def test_async_create_accepted(self):
+        """
+        Тест: асинхронное представление тоже принимает запись в журнал.
+        """
+        request = AsyncRequestFactory().post(self.url, self.letter_data, content_type='application/json')
+        response = async_to_sync(AsyncLetterView.as_view())(request)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(ticket_status(json.loads(response.content)['ticket'])['status'], 'queued')
+        self.assertTrue(response['Location'].endswith(json.loads(response.content)['ticket']))
+
+
+class ImportShipmentsCommandTests(ShipmentTestCase):
+    """
+    Тесты команды import_shipments.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.letter = {
+            'sender_full_name': 'Импортов Иван', 'recipient_full_name': 'Получателев Петр',
+            'origin_location': 'Москва', 'destination_location': 'Казань',
+            'origin_postcode': '101000', 'destination_postcode': '420000', 'weight_kg': '0.050',
+        }
+
+    def write_file(self, name, records):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            if name.endswith('.csv'):
+                writer = csv.DictWriter(f, fieldnames=list(self.letter) + ['letter_type'])
+                writer.writeheader()
+                writer.writerows(records)
+            else:
+                f.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        return path
+
+    def import_file(self, *args, **options):
+        out = io.StringIO()
+        call_command('import_shipments', *args, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_csv_with_rejects(self):
+        """
+        Тест: валидные строки CSV загружаются, невалидные попадают в файл отказов с ошибками.
+        """
+        invalid = dict(self.letter, destination_postcode='101000')
+        path = self.write_file('letters.csv', [self.letter, invalid, dict(self.letter, letter_type='2')])
+
+        output = self.import_file('letters', path, workers=0)
+
+        self.assertIn('Загружено: 2, отклонено: 1', output)
+        self.assertEqual(list(Letter.objects.order_by('id').values_list('letter_type', flat=True)), [1, 2])
+        with open(f'{path}.rejects.jsonl', encoding='utf-8') as f:
+            rejects = [json.loads(line) for line in f]
+        self.assertEqual(len(rejects), 1)
+        self.assertEqual(rejects[0]['record_number'], 1)
+        self.assertIn('non_field_errors', rejects[0]['errors'])
+
+    def test_import_resumes_from_checkpoint(self):
+        """
+        Тест: с --resume уже обработанные по контрольной точке записи пропускаются.
+        """
+        records = [dict(self.letter, sender_full_name=f'Отправитель {i}') for i in range(5)]
+        path = self.write_file('letters.jsonl', records)
+        ShipmentImportCheckpoint.objects.create(name=os.path.abspath(path), records=3, loaded=3)
+
+        self.import_file('letters', path, workers=0, chunk_size=1, resume=True)
+
+        self.assertEqual(
+            list(Letter.objects.order_by('id').values_list('sender_full_name', flat=True)),
+            ['Отправитель 3', 'Отправитель 4'],
+        )
+        self.assertEqual(
+            ShipmentImportCheckpoint.objects.values('records', 'loaded', 'rejected', 'completed').get(),
+            {'records': 5, 'loaded': 5, 'rejected': 0, 'completed': True},
+        )
+
+    def test_resume_after_crash_reloads_nothing_twice(self):
+        """
+        Тест: сбой при загрузке порции откатывает и её строки, и контрольную точку; --resume дозагружает
+        остаток без дублей строк и отказов.
+        """
+        invalid = dict(self.letter, destination_postcode='101000')
+        records = [
+            self.letter, dict(self.letter, sender_full_name='Второй'), invalid, dict(self.letter, sender_full_name='Третий'),
+        ]
+        path = self.write_file('letters.jsonl', records)
+        load = SQLiteLoader.load
+        calls = []
+
+        def crash_on_second_chunk(loader, rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise OSError('сбой загрузки')
+            return load(loader, rows)
+
+        with mock.patch.object(SQLiteLoader, 'load', crash_on_second_chunk), self.assertRaises(OSError):
+            self.import_file('letters', path, workers=0, chunk_size=2)
+        self.assertEqual(Letter.objects.count(), 2)
+        self.assertEqual(ShipmentImportCheckpoint.objects.get().records, 2)
+
+        self.import_file('letters', path, workers=0, chunk_size=2, resume=True)
+        self.assertEqual(
+            list(Letter.objects.order_by('id').values_list('sender_full_name', flat=True)),
+            ['Импортов Иван', 'Второй', 'Третий'],
+        )
+        with open(f'{path}.rejects.jsonl', encoding='utf-8') as f:
+            self.assertEqual([json.loads(line)['record_number'] for line in f], [2])
+
+    def test_import_in_process_pool_invalidates_cache(self):
+        """
+        Тест: валидация в пуле процессов сохраняет порядок записей, а импорт сбрасывает кеш списка —
+        и в других процессах: поколение данных, которое видят отдельные процессы, общее и меняется.
+        """
+        self.client.get(reverse('letter-list'))
+        before = generation_in_other_process('parcels.letter')
+        self.assertEqual(generation_in_other_process('parcels.letter'), before)
+        records = [dict(self.letter, sender_full_name=f'Отправитель {i}') for i in range(7)]
+        path = self.write_file('letters.jsonl', records)
+
+        self.import_file('letters', path, workers=2, chunk_size=2)
+
+        self.assertEqual(
+            list(Letter.objects.order_by('id').values_list('sender_full_name', flat=True)),
+            [record['sender_full_name'] for record in records],
+        )
+        response = self.client.get(reverse('letter-list'))
+        self.assertEqual(len(response.data['results']), 7)
+        self.assertNotEqual(generation_in_other_process('parcels.letter'), before)
+
+
+class RequestInstrumentationTests(ShipmentTestCase):
+    """
+    Тесты замеров запросов: Server-Timing, журнал медленных запросов и метрики.
+    """
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.letter = Letter.objects.create(
+            sender_full_name="Иванов Иван Иванович",
+            recipient_full_name="Сергеев Сергей Сергеевич",
+            origin_location=intern_location("Казань"),
+            destination_location=intern_location("Уфа"),
+            origin_postcode=420000,
+            destination_postcode=450000,
+            weight_kg="0.100"
+        )
+
+    def test_server_timing_header(self):
+        """
+        Тест: ответ содержит Server-Timing с числом SQL-запросов и фазами filter и serialize.
+        """
+        response = self.client.get(reverse('letter-list'))
+        timing = response['Server-Timing']
+
+        self.assertIn('desc="1 queries"', timing)
+        self.assertIn('filter;dur=', timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    async def test_server_timing_header_async(self):
+        """
+        Тест: SQL-запросы из потоков async ORM учитываются в Server-Timing.
+        """
+        response = await self.async_client.get(reverse('letter-detail', kwargs={'pk': self.letter.pk}))
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    @override_settings(SHIPMENT_SLOW_REQUEST_MS=0)
+    def test_slow_request_logged_with_explain(self):
+        """
+        Тест: запрос дольше порога пишется в журнал вместе с SQL и планом выполнения.
+        """
+        with self.assertLogs('parcels.requests', level='WARNING') as logs:
+            self.client.get(reverse('letter-list') + '?origin_location=Казань')
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['endpoint'], 'letter-list')
+        self.assertEqual(record['queries'], 1)
+        self.assertIn('origin_location', record['sql'][0]['sql'])
+        self.assertTrue(record['sql'][0]['plan'])
+
+    def test_metrics_endpoint(self):
+        """
+        Тест: метрики содержат гистограмму задержки по эндпоинтам.
+        """
+        self.client.get(reverse('letter-list'))
+        self.client.get(reverse('letter-list'))
+
+        response = self.client.get(reverse('metrics'))
+        body = response.content.decode()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('shipment_request_duration_seconds_count{method="GET",endpoint="letter-list"} 2', body)
+        # второй ответ взят из кеша и в БД не ходил
+        self.assertIn('shipment_request_queries_total{method="GET",endpoint="letter-list"} 1', body)
+
+        # строки каждого семейства идут подряд после его # TYPE (иначе строгий парсер отвергнет ответ)
+        family = None
+        for line in body.splitlines():
+            if line.startswith('# TYPE '):
+                family = line.split()[2]
+            elif line.startswith('shipment_request_'):
+                name = line.split('{')[0]
+                self.assertIn(name, (family, f'{family}_bucket', f'{family}_sum', f'{family}_count'), line)
+
+
+class ShipmentRollupTests(ShipmentTestCase):
+    """
+    Тесты сводок: инкрементальное обновление, /api/v1/stats и rebuild_rollups.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.stats_url = reverse('stats')
+        self.parcel_data = {
+            "sender_full_name": "Коннор Сара Эдуардовна",
+            "recipient_full_name": "Олегов Олег Олегович",
+            "origin_location": "Екатеринбург",
+            "destination_location": "Новосибирск",
+            "origin_postcode": 620000,
+            "destination_postcode": 630000,
+            "notification_phone": "+79991234567",
+            "parcel_type": Parcel.ParcelType.FIRST_CLASS,
+            "payment_amount": "1500.00"
+        }
+
+    def get_stats(self, **params):
+        response = self.client.get(self.stats_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_rollups_follow_create_update_delete(self):
+        """
+        Тест: сводки учитывают создание, изменение (с вычитанием старых значений), пакет и удаление.
+        """
+        url = reverse('parcel-list')
+        first = self.client.post(url, self.parcel_data, format='json').data
+        self.client.post(url + '/batch', [dict(self.parcel_data, payment_amount="0.50")], format='json')
+        self.assertEqual(self.get_stats(kind='parcels'), [{'count': 2, 'payment_amount_sum': '1500.50'}])
+
+        detail = reverse('parcel-detail', kwargs={'pk': first['id']})
+        self.client.patch(detail, {"parcel_type": Parcel.ParcelType.PARCEL, "payment_amount": "100.00"}, format='json')
+        self.assertEqual(self.get_stats(kind='parcels', group_by='type'), [
+            {'type': Parcel.ParcelType.PARCEL, 'count': 1, 'payment_amount_sum': '100.00'},
+            {'type': Parcel.ParcelType.FIRST_CLASS, 'count': 1, 'payment_amount_sum': '0.50'},
+        ])
+
+        self.client.delete(detail)
+        today = timezone.localdate().isoformat()
+        self.assertEqual(self.get_stats(kind='parcels', group_by='origin_postcode,day'), [
+            {'origin_postcode': 620000, 'day': today, 'count': 1, 'payment_amount_sum': '0.50'},
+        ])
+        call_command('rebuild_rollups', check=True, stdout=io.StringIO())
+
+    def test_rebuild_rollups_repairs_drift(self):
+        """
+        Тест: запись в обход API расходится со сводками; rebuild_rollups находит и исправляет это.
+        """
+        Letter.objects.create(
+            sender_full_name="Иванов Иван Иванович",
+            recipient_full_name="Сергеев Сергей Сергеевич",
+            origin_location=intern_location("Казань"),
+            destination_location=intern_location("Уфа"),
+            origin_postcode=420000,
+            destination_postcode=450000,
+            weight_kg="0.125"
+        )
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', check=True, stdout=io.StringIO())
+
+        call_command('rebuild_rollups', stdout=io.StringIO())
+
+        call_command('rebuild_rollups', check=True, stdout=io.StringIO())
+        self.assertEqual(self.get_stats(kind='letters', group_by='destination_postcode'), [
+            {'destination_postcode': 450000, 'count': 1, 'weight_kg_sum': '0.125'},
+        ])
+
+    def test_stats_invalid_params(self):
+        """
+        Тест: неизвестный вид, недопустимая группировка и неверная дата дают 400.
+        """
+        for params in ({}, {'kind': 'parcels', 'group_by': 'type,origin_postcode'},
+                       {'kind': 'letters', 'date_from': '2025-13-01'}):
+            response = self.client.get(self.stats_url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('error', response.data)
+
+
+class ShipmentBulkTests(ShipmentTestCase):
+    """
+    Тесты массовых изменений и удалений по фильтрам (/api/v1/<letters|parcels>/bulk).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.bulk_url = reverse('parcel-bulk')
+        self.parcels = [
+            Parcel.objects.create(
+                sender_full_name=f"Смирнов Посылка {number}",
+                recipient_full_name="Олегов Олег Олегович",
+                origin_location=intern_location("Екатеринбург"),
+                destination_location=intern_location("Новосибирск" if number < 4 else "Омск"),
+                origin_postcode=620000 + number,
+                destination_postcode=630000 if number < 4 else 644000,
+                notification_phone="+79991234567",
+                parcel_type=Parcel.ParcelType.PARCEL,
+                payment_amount="10.00",
+            )
+            for number in range(6)
+        ]
+        # записи созданы в обход API, сводки для них строятся заново
+        call_command('rebuild_rollups', stdout=io.StringIO())
+
+    def test_bulk_update_by_filter(self):
+        """
+        Тест: PATCH меняет все записи под фильтром, сдвигает updated_at и поддерживает сводки и кеш.
+        """
+        list_url = reverse('parcel-list')
+        self.client.get(list_url)
+        params = '?destination_postcode_min=630000&destination_postcode_max=630000'
+        changes = {"changes": {"parcel_type": Parcel.ParcelType.VALUABLE}}
+
+        response = self.client.patch(self.bulk_url + params + '&dry_run=true', changes, format='json')
+        self.assertEqual(response.data, {"matched": 4, "dry_run": True})
+        self.assertFalse(Parcel.objects.filter(parcel_type=Parcel.ParcelType.VALUABLE).exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.bulk_url + params, changes, format='json')
+        self.assertEqual(response.data, {"updated": 4})
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE "parcels_parcel"')]), 1)
+
+        valuable = Parcel.objects.filter(parcel_type=Parcel.ParcelType.VALUABLE)
+        self.assertEqual(set(valuable.values_list('id', flat=True)), {parcel.pk for parcel in self.parcels[:4]})
+        self.assertTrue(all(parcel.updated_at > self.parcels[0].updated_at for parcel in valuable))
+        types = {item['parcel_type'] for item in self.client.get(list_url).data['results']}
+        self.assertEqual(types, {Parcel.ParcelType.PARCEL, Parcel.ParcelType.VALUABLE})
+        call_command('rebuild_rollups', check=True, stdout=io.StringIO())
+
+    def test_bulk_update_checks_invariants(self):
+        """
+        Тест: изменение, после которого индексы отправки и получения совпали бы, отклоняется целиком.
+        """
+        response = self.client.patch(
+            self.bulk_url + '?origin_location=Екатеринбург', {"changes": {"destination_postcode": 620002}}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['conflicts'], [self.parcels[2].pk])
+        self.assertFalse(Parcel.objects.filter(destination_postcode=620002).exists())
+
+        response = self.client.patch(self.bulk_url, {"changes": {"payment_amount": "-1"}, "ids": [1]}, format='json')
+        self.assertIn('payment_amount', response.data['details'])
+
+        queryset = Parcel.objects.filter(destination_location=intern_location("Новосибирск"))
+        self.assertEqual(bulk_update(queryset, {"destination_location": intern_location("Екатеринбург")}, chunk_size=3), 0)
+        self.assertEqual(bulk_update(queryset, {"payment_amount": Decimal("5.00")}, chunk_size=3), 4)
+
+    def test_bulk_delete(self):
+        """
+        Тест: DELETE удаляет записи по ids и фильтрам порциями и оставляет отметки об удалении.
+        """
+        response = self.client.delete(self.bulk_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        ids = [parcel.pk for parcel in self.parcels[2:]]
+        response = self.client.delete(self.bulk_url + '?destination_location=Омск', {"ids": ids}, format='json')
+        self.assertEqual(response.data, {"deleted": 2})
+        self.assertEqual(Parcel.objects.count(), 4)
+
+        self.assertEqual(bulk_delete(Parcel.objects.all(), chunk_size=3), 4)
+        self.assertEqual(ShipmentTombstone.objects.filter(kind='parcel').count(), 6)
+        call_command('rebuild_rollups', check=True, stdout=io.StringIO())
+
+
+class ShipmentArchiveTests(ShipmentTestCase):
+    """
+    Тесты переноса старых отправлений в архив и чтения архива списками.
+    """
+
+    def setUp(self):
+        super().setUp()
+        old = timezone.now() - timedelta(days=settings.SHIPMENT_ARCHIVE_AFTER_DAYS + 30)
+        for number in range(5):
+            letter = Letter.objects.create(
+                sender_full_name=f"{'Архивов' if number < 3 else 'Текущев'} Отправитель {number}",
+                recipient_full_name="Сергеев Сергей Сергеевич",
+                origin_location=intern_location("Казань"),
+                destination_location=intern_location("Уфа"),
+                origin_postcode=420000 + number,
+                destination_postcode=450000,
+                weight_kg="0.100",
+            )
+            if number < 3:
+                # auto_now_add не даёт задать дату при создании
+                moment = old + timedelta(days=number)
+                Letter.objects.filter(pk=letter.pk).update(created_at=moment, updated_at=moment)
+        self.old_ids = list(Letter.objects.filter(created_at__lt=old + timedelta(days=3)).values_list('id', flat=True))
+        call_command('rebuild_rollups', stdout=io.StringIO())
+
+    def list_ids(self, **params):
+        ids, url = [], reverse('letter-list')
+        while url:
+            data = self.client.get(url, params).data
+            ids += [item['id'] for item in data['results']]
+            url, params = data['next'], {}
+        return ids
+
+    def test_archive_moves_old_rows(self):
+        """
+        Тест: старые записи переносятся порциями с прежними id и датами, сводки не меняются.
+        """
+        with self.assertRaises(CommandError):
+            call_command('archive_shipments', days=1, stdout=io.StringIO())
+        created = dict(Letter.objects.filter(pk__in=self.old_ids).values_list('id', 'created_at'))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(archive_shipments(Letter, chunk_size=2), 3)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('INSERT INTO "parcels_archivedletter"')]), 2)
+        self.assertEqual(dict(ArchivedLetter.objects.values_list('id', 'created_at')), created)
+        self.assertEqual(Letter.objects.count(), 2)
+        call_command('rebuild_rollups', check=True, stdout=io.StringIO())
+
+        out = io.StringIO()
+        call_command('archive_shipments', kind=['letters'], stdout=out)
+        self.assertIn('перенесено в архив 0', out.getvalue())
+
+    @skipUnless(connection.vendor == 'postgresql', "секционирование архива — только на PostgreSQL")
+    def test_archive_partitions(self):
+        """
+        Тест: архив секционирован, перенос создаёт секции месяцев переносимых записей.
+        """
+        archive_shipments(Letter)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+                'WHERE pg_inherits.inhparent = %s::regclass', ['parcels_archivedletter']
+            )
+            partitions = {row[0] for row in cursor.fetchall()}
+            cursor.execute('SELECT count(*) FROM parcels_archivedletter_default')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        created = ArchivedLetter.objects.values_list('created_at', flat=True)
+        months = {moment.strftime('parcels_archivedletter_y%Ym%m') for moment in created}
+        self.assertLessEqual(months, partitions)
+
+    def test_list_reads_archive_for_old_dates(self):
+        """
+        Тест: без фильтра по дате и со свежей датой список читает только рабочую таблицу,
+        с датой в архивном периоде — объединение с архивом (с пагинацией, поиском, числом и выгрузкой).
+        """
+        archive_shipments(Letter)
+        recent = (timezone.now() - timedelta(days=1)).isoformat()
+        long_ago = (timezone.now() - timedelta(days=settings.SHIPMENT_ARCHIVE_AFTER_DAYS + 60)).isoformat()
+        archive_edge = (timezone.now() - timedelta(days=settings.SHIPMENT_ARCHIVE_AFTER_DAYS)).isoformat()
+
+        self.assertEqual(len(self.list_ids()), 2)
+        self.assertEqual(len(self.list_ids(created_at_after=recent)), 2)
+
+        ids = self.list_ids(created_at_after=long_ago, page_size=2)
+        self.assertEqual(ids, list(Letter.objects.order_by('-created_at').values_list('id', flat=True)) + self.old_ids[::-1])
+        self.assertEqual(sorted(self.list_ids(created_at_before=archive_edge)), sorted(self.old_ids))
+        self.assertEqual(len(self.list_ids(created_at_after=long_ago, search='Архивов')), 3)
+
+        data = self.client.get(reverse('letter-list'), {'created_at_after': long_ago, 'count': 'true'}).data
+        self.assertEqual((data['count'], data['count_exact']), (5, True))
+
+        response = self.client.get(reverse('letter-export'), {'created_at_after': long_ago})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 5)
+
+        request = AsyncRequestFactory().get(reverse('letter-list'), {'created_at_after': long_ago})
+        response = async_to_sync(AsyncLetterView.as_view())(request)
+        self.assertEqual(len(json.loads(response.content)['results']), 5)
+
+
+class ShipmentLocationTests(ShipmentTestCase):
+    """
+    Тесты словаря пунктов: формат API, свёртка регистра, фильтр по id и кеш названий.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('letter-list')
+        self.letter_data = {
+            "sender_full_name": "Иванов Иван Иванович",
+            "recipient_full_name": "Сергеев Сергей Сергеевич",
+            "origin_location": "Казань",
+            "destination_location": "Уфа",
+            "origin_postcode": 420000,
+            "destination_postcode": 450000,
+            "weight_kg": "0.100",
+        }
+
+    def test_names_interned_case_insensitively(self):
+        """
+        Тест: названия, различающиеся регистром и пробелами, — один пункт; в ответе остаётся название.
+        """
+        first = self.client.post(self.url, self.letter_data, format='json')
+        second = self.client.post(self.url, dict(self.letter_data, origin_location="  КАЗАНЬ "), format='json')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(first.data['origin_location'], "Казань")
+        self.assertEqual(second.data['origin_location'], "Казань")
+        self.assertEqual(Location.objects.count(), 2)
+        self.assertEqual(Letter.objects.filter(origin_location__key="казань").count(), 2)
+
+        response = self.client.get(self.url, {'origin_location': 'казань'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['origin_location'] for item in response.data['results']], ["Казань", "Казань"])
+        self.assertEqual(self.client.get(self.url, {'origin_location': 'Самара'}).data['results'], [])
+
+        response = self.client.post(self.url, dict(self.letter_data, destination_location="казань"), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(const.ERROR_MSG_LOCATION_MATCH, str(response.data))
+
+    def test_rejected_writes_do_not_add_locations(self):
+        """
+        Тест: валидация словарь не пополняет — пункты из отклонённого запроса, dry_run и невалидного
+        элемента пакета в нём не остаются; пункт заносится в словарь, только когда запись сохраняется.
+        """
+        self.client.post(self.url, self.letter_data, format='json')
+        invalid = dict(self.letter_data, origin_location="Самара", destination_postcode=420000)
+        response = self.client.post(self.url, invalid, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        bulk_url = reverse('letter-bulk') + '?origin_location=Казань'
+        changes = {"changes": {"destination_location": "Самара"}}
+        response = self.client.patch(bulk_url + '&dry_run=true', changes, format='json')
+        self.assertEqual(response.data, {"matched": 1, "dry_run": True})
+
+        response = self.client.post(reverse('letter-batch'), [self.letter_data, invalid], format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(set(Location.objects.values_list('key', flat=True)), {"казань", "уфа"})
+
+        # совпадение с текущим пунктом записи ищется по ключу, без записи в словарь
+        response = self.client.patch(bulk_url, {"changes": {"destination_location": " казань"}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data['conflicts']), 2)
+
+        response = self.client.patch(bulk_url, changes, format='json')
+        self.assertEqual(response.data, {"updated": 2})
+        self.assertEqual(Letter.objects.filter(destination_location__name="Самара").count(), 2)
+
+    def test_cache_filled_after_commit(self):
+        """
+        Тест: пункт попадает в кеш только после коммита, дальше названия разрешаются без запросов.
+        """
+        with self.captureOnCommitCallbacks() as callbacks:
+            location = intern_location("Казань")
+        self.assertIsNone(location_cache.get(('default', "казань")))
+        for callback in callbacks:
+            callback()
+        with self.assertNumQueries(0):
+            self.assertEqual(intern_location("казань").pk, location.pk)
+
+    def test_filter_is_single_query(self):
+        """
+        Тест: фильтр по пункту — условие на id в том же запросе, что и страница списка.
+        """
+        Letter.objects.create(**dict(
+            self.letter_data, origin_location=intern_location("Казань"), destination_location=intern_location("Уфа"),
+        ))
+        location_cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'origin_location': 'КАЗАНЬ', 'destination_location': 'уфа'})
+        self.assertEqual(len(response.data['results']), 1)
+
+
+class ShipmentIndexPlanTests(ShipmentTestCase):
+    """
+    Регрессия планов списков: сочетания фильтров и сортировок, под которые есть индексы,
+    должны читаться по индексу без сортировки и проверки каждой строки.
+    """
+    # обычные запросы клиентов; новое сочетание с индексом — сюда, после проверки shipment_index_report
+    INDEXED_CASES = [
+        *(PlanCase(kind, {}, ordering) for kind in SHIPMENT_VIEWSETS
+          for ordering in ('-created_at', 'created_at', '-updated_at', 'updated_at', '-sender_full_name')),
+        PlanCase('letters', {'letter_type': '2'}, '-created_at'),
+        PlanCase('letters', {'letter_type': '2'}, 'created_at'),
+        PlanCase('parcels', {'parcel_type': '2'}, '-created_at'),
+        PlanCase('parcels', {'notification_phone': '+79991234567'}, '-created_at'),
+        PlanCase('letters', {'created_at_after': '2024-01-01T00:00:00Z'}, '-created_at'),
+        PlanCase('parcels', {'updated_since': '2024-01-01T00:00:00Z'}, 'updated_at'),
+        PlanCase('letters', {'origin_location': 'Казань'}, '-created_at'),
+        PlanCase('parcels', {'destination_location': 'Уфа'}, 'created_at'),
+    ]
+
+    def test_every_filter_has_sample(self):
+        """
+        Тест: у каждого фильтра списков есть образец значения, иначе отчёт не покроет его сочетания.
+        """
+        for kind, viewset_class in SHIPMENT_VIEWSETS.items():
+            with self.subTest(kind=kind):
+                self.assertLessEqual(set(viewset_class.filterset_class.base_filters), set(FILTER_SAMPLES))
+
+    def test_indexed_combinations(self):
+        """
+        Тест: сочетания из INDEXED_CASES обходятся без полного чтения, сортировки и фильтра по строкам.
+        """
+        for case in self.INDEXED_CASES:
+            with self.subTest(case=case):
+                report = inspect_case(case)
+                self.assertEqual(report.issues, [], '\n'.join(report.plan))
+
+    def test_report_does_not_depend_on_allowed_hosts(self):
+        """
+        Тест: отчёт строится при любых ALLOWED_HOSTS — запрос страницы не проверяет Host.
+        """
+        case = PlanCase('letters', {'letter_type': '2'}, '-created_at')
+        for hosts in (['*'], ['.example.com']):
+            with self.subTest(hosts=hosts), override_settings(ALLOWED_HOSTS=hosts):
+                self.assertEqual(inspect_case(case).issues, [])
+
+    def test_advisor_proposes_indexes(self):
+        """
+        Тест: фильтр без индекса отмечается, предлагается составной индекс, для типа — ещё и частичный.
+        """
+        report = inspect_case(PlanCase('letters', {'recipient_full_name': 'Сергеев'}, '-created_at'))
+        self.assertTrue(report.issues)
+        self.assertEqual([describe_index(index) for index in report.proposals],
+                         ["models.Index(fields=['recipient_full_name', 'created_at', 'id'])"])
+
+        report = inspect_case(PlanCase('parcels', {'parcel_type': '2'}, 'updated_at'))
+        self.assertEqual([describe_index(index) for index in report.proposals], [
+            "models.Index(fields=['parcel_type', 'updated_at', 'id'])",
+            "models.Index(fields=['updated_at', 'id'], condition=models.Q(parcel_type=2), name='parcel_type_2_updated_at')",
+        ])
+
+        out = io.StringIO()
+        call_command('shipment_index_report', kind=['letters'], stdout=out)
+        self.assertIn("letters recipient_full_name=Сергеев Сергей Сергеевич ordering=-created_at", out.getvalue())
+        self.assertNotIn("letters letter_type=2 ordering=-created_at", out.getvalue())
+        self.assertNotIn("parcels ", out.getvalue())
+
+
+class PostcodeFilterTests(ShipmentTestCase):
+    """
+    Тесты фильтров по индексам: границы, регионы, направления и планы запросов.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.list_url = reverse('letter-list')
+        routes = [(101000, 420000), (109999, 630000), (190000, 420500), (344000, 101000)]
+        for origin, destination in routes:
+            Letter.objects.create(
+                sender_full_name="Иванов Иван Иванович",
+                recipient_full_name="Сергеев Сергей Сергеевич",
+                origin_location=intern_location(f"Пункт {origin}"),
+                destination_location=intern_location(f"Пункт {destination}"),
+                origin_postcode=origin,
+                destination_postcode=destination,
+                weight_kg="0.100"
+            )
+
+    def origins(self, **params):
+        response = self.client.get(self.list_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(item['origin_postcode'] for item in response.data['results'])
+
+    def test_postcode_bounds_and_regions(self):
+        """
+        Тест: min/max и регионы-префиксы (пересекающиеся префиксы объединяются).
+        """
+        self.assertEqual(self.origins(origin_postcode_min=109999, origin_postcode_max=344000), [109999, 190000, 344000])
+        self.assertEqual(self.origins(origin_region='10,101,34'), [101000, 109999, 344000])
+        self.assertEqual(self.origins(destination_region='42'), [101000, 190000])
+
+    def test_corridor(self):
+        """
+        Тест: направление «регион отправки -> регион получения».
+        """
+        self.assertEqual(self.origins(corridor='10-42,34-1'), [101000, 344000])
+
+    def test_invalid_region(self):
+        """
+        Тест: префикс не из цифр или длиннее индекса даёт 400.
+        """
+        for params in ({'origin_region': '1a'}, {'destination_region': '1234567'}, {'corridor': '10'}):
+            response = self.client.get(self.list_url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(connection.vendor == 'sqlite', 'проверяется формат EXPLAIN QUERY PLAN SQLite')
+    def test_filters_use_postcode_indexes(self):
+        """
+        Тест: фильтры компилируются в диапазонный поиск по индексам почтовых индексов, без полного сканирования.
+        """
+        cases = [
+            (LetterFilter, {'origin_postcode_min': '100000', 'origin_postcode_max': '199999'}, 'origin'),
+            (LetterFilter, {'origin_region': '10,19'}, 'origin'),
+            (ParcelFilter, {'destination_region': '42'}, 'destination'),
+            (ParcelFilter, {'corridor': '10-42,19-63'}, None),
+        ]
+        for filterset_class, params, field in cases:
+            with self.subTest(params=params):
+                filterset = filterset_class(params, queryset=filterset_class.Meta.model.objects.all())
+                plan = filterset.qs.explain()
+                table = filterset_class.Meta.model._meta.db_table
+                self.assertNotIn(f'SCAN {table}', plan)
+                self.assertIn(f'SEARCH {table} USING INDEX', plan)
+                index = f'{field}_postcode>? AND' if field else '_postcode>? AND'
+                self.assertIn(index, plan)
+
+
+class ShipmentFeedTests(ShipmentTestCase):
+    """
+    Тесты единой ленты писем и посылок (GET /api/v1/shipments).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.feed_url = reverse('shipment-feed')
+        base = {
+            "recipient_full_name": "Сергеев Сергей Сергеевич",
+            "origin_location": intern_location("Казань"),
+            "destination_location": intern_location("Уфа"),
+            "origin_postcode": 420000,
+            "destination_postcode": 450000,
+        }
+        moment = timezone.now()
+        self.expected = []
+        for number in range(3):
+            letter = Letter.objects.create(sender_full_name=f"Петров Письмо {number}", weight_kg="0.100", **base)
+            parcel = Parcel.objects.create(
+                sender_full_name=f"Смирнов Посылка {number}", notification_phone="+79991234567",
+                payment_amount="10.00", **dict(base, origin_postcode=101000),
+            )
+            # письмо и посылка с одинаковыми created_at и id различаются вторым полем позиции
+            Letter.objects.filter(pk=letter.pk).update(created_at=moment - timezone.timedelta(minutes=number))
+            Parcel.objects.filter(pk=parcel.pk).update(created_at=moment - timezone.timedelta(minutes=number))
+            self.expected += [('parcel', parcel.pk), ('letter', letter.pk)]
+
+    def walk(self, **params):
+        items, url, params = [], self.feed_url, dict(params, page_size=2)
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            items += response.data['results']
+            url, params = response.data['next'], None
+        return items
+
+    def test_feed_merges_kinds_chronologically(self):
+        """
+        Тест: лента содержит письма и посылки в порядке created_at без пропусков и повторов.
+        """
+        items = self.walk()
+        self.assertEqual([(item['kind'], item['id']) for item in items], self.expected)
+        self.assertNotIn('weight_kg', items[0])
+
+    def test_feed_is_one_query(self):
+        """
+        Тест: страница ленты — один SQL-запрос.
+        """
+        with self.assertNumQueries(1):
+            self.client.get(self.feed_url)
+
+    def test_feed_parts_limited_before_union(self):
+        """
+        Тест: каждая часть UNION ALL сама ограничена page_size + 1 строками (плюс LIMIT внешнего запроса),
+        поэтому страница не читает виды целиком; курсор следующей страницы накладывается на каждую часть.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.feed_url, {'page_size': 2})
+        sql = queries.captured_queries[-1]['sql']
+        self.assertEqual(sql.count('UNION ALL'), 1)
+        self.assertEqual(sql.count('LIMIT 3'), 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(response.data['next'])
+        sql = queries.captured_queries[-1]['sql']
+        self.assertEqual(sql.count('LIMIT 3'), 3)
+        self.assertEqual(sql.count('"created_at" <='), 2)
+
+    def test_feed_include_type_fields(self):
+        """
+        Тест: поля вида возвращаются по include и только у записей этого вида.
+        """
+        items = self.client.get(self.feed_url, {'include': 'weight_kg,parcel_type_display'}).data['results']
+        parcel, letter = items[0], items[1]
+        self.assertEqual(parcel['parcel_type_display'], 'посылка')
+        self.assertNotIn('weight_kg', parcel)
+        self.assertEqual(letter['weight_kg'], '0.100')
+        self.assertNotIn('parcel_type_display', letter)
+
+        response = self.client.get(self.feed_url, {'include': 'unknown'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_feed_filters_and_search(self):
+        """
+        Тест: общие фильтры и поиск применяются к обоим видам.
+        """
+        items = self.walk(origin_region='10')
+        self.assertEqual({item['kind'] for item in items}, {'parcel'})
+
+        items = self.walk(search='петров')
+        self.assertEqual([item['kind'] for item in items], ['letter'] * 3)
+
+
+class ShipmentSyncTests(ShipmentTestCase):
+    """
+    Тесты инкрементальной синхронизации: ?updated_since=, отметки об удалениях и их сжатие.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('letter-list')
+        self.letter_data = {
+            "sender_full_name": "Иванов Иван Иванович",
+            "recipient_full_name": "Сергеев Сергей Сергеевич",
+            "origin_location": "Казань",
+            "destination_location": "Уфа",
+            "origin_postcode": 420000,
+            "destination_postcode": 450000,
+            "letter_type": Letter.LetterType.REGULAR,
+            "weight_kg": "0.100"
+        }
+        locations = {
+            "origin_location": intern_location("Казань"), "destination_location": intern_location("Уфа"),
+        }
+        self.letters = [Letter.objects.create(**dict(self.letter_data, **locations)) for _ in range(5)]
+        # исходные записи изменены давно и не попадают в окно перекрытия sync_token
+        Letter.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def sync(self, token, page_size=3):
+        """
+        Дочитывает изменения после token по всем страницам: (изменённые записи, удалённые id, новый токен).
+        """
+        response = self.client.get(self.url, {'updated_since': token, 'page_size': page_size})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        changed, deleted, new_token = data['results'], data['deleted'], data['sync_token']
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            self.assertNotIn('deleted', data)
+            changed += data['results']
+        return changed, deleted, new_token
+
+    def test_sync_returns_changes_and_deletions(self):
+        """
+        Тест: синхронизация возвращает изменённые и созданные записи по updated_at и id удалённых.
+        """
+        token = (timezone.now() - timedelta(minutes=30)).isoformat()
+        updated, deleted = self.letters[3], self.letters[1]
+        self.client.patch(reverse('letter-detail', kwargs={'pk': updated.pk}), {"weight_kg": "0.500"}, format='json')
+        self.client.delete(reverse('letter-detail', kwargs={'pk': deleted.pk}))
+        created = self.client.post(self.url, self.letter_data, format='json').data
+
+        changed, deleted_ids, new_token = self.sync(token, page_size=1)
+        self.assertEqual([item['id'] for item in changed], [updated.pk, created['id']])
+        self.assertEqual(changed[0]['weight_kg'], '0.500')
+        self.assertEqual(deleted_ids, [deleted.pk])
+        self.assertGreater(new_token, token)
+
+        # обычный список тоже отдаёт токен, с которого можно начать синхронизацию
+        self.assertIn('sync_token', self.client.get(self.url).data)
+
+    def test_too_many_deletions_require_full_reload(self):
+        """
+        Тест: если удалённых с updated_since больше SYNC_MAX_DELETED, синхронизация отвечает 410.
+        """
+        token = self.client.get(self.url).data['sync_token']
+        for letter in self.letters[:2]:
+            self.client.delete(reverse('letter-detail', kwargs={'pk': letter.pk}))
+
+        with mock.patch.object(const, 'SYNC_MAX_DELETED', 2):
+            self.assertEqual(len(self.client.get(self.url, {'updated_since': token}).data['deleted']), 2)
+        get_cache().clear()
+        with mock.patch.object(const, 'SYNC_MAX_DELETED', 1):
+            response = self.client.get(self.url, {'updated_since': token})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertIn('error', response.data)
+
+    def test_expired_sync_and_compaction(self):
+        """
+        Тест: отметки старше окна хранения удаляет compact_tombstones, а updated_since старше окна даёт 410.
+        """
+        self.client.delete(reverse('letter-detail', kwargs={'pk': self.letters[0].pk}))
+        self.client.delete(reverse('letter-detail', kwargs={'pk': self.letters[1].pk}))
+        ShipmentTombstone.objects.filter(shipment_id=self.letters[0].pk).update(
+            deleted_at=timezone.now() - timedelta(days=settings.SHIPMENT_TOMBSTONE_RETENTION_DAYS + 1)
+        )
+        call_command('compact_tombstones', stdout=io.StringIO())
+        self.assertEqual(list(ShipmentTombstone.objects.values_list('shipment_id', flat=True)), [self.letters[1].pk])
+
+        since = timezone.now() - timedelta(days=settings.SHIPMENT_TOMBSTONE_RETENTION_DAYS, minutes=1)
+        response = self.client.get(self.url, {'updated_since': since.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertIn('error', response.data)
+
+        response = self.client.get(self.url, {'updated_since': 'вчера'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_many_clients_sync_incrementally(self):
+        """
+        Тест: клиенты, синхронизирующиеся в случайные моменты между случайными изменениями,
+        в итоге получают те же данные, что и полная загрузка.
+        """
+        rng = random.Random(14)
+
+        def full_load():
+            data = self.client.get(self.url, {'page_size': const.MAX_PAGE_SIZE}).json()
+            return {item['id']: item for item in data['results']}, data['sync_token']
+
+        clients = [full_load() for _ in range(10)]
+        for step in range(60):
+            ids = list(Letter.objects.values_list('id', flat=True))
+            operation = rng.choice(['create', 'update', 'delete']) if ids else 'create'
+            if operation == 'create':
+                self.client.post(self.url, dict(self.letter_data, weight_kg=f"0.{step + 100}"), format='json')
+            elif operation == 'update':
+                detail = reverse('letter-detail', kwargs={'pk': rng.choice(ids)})
+                self.client.patch(detail, {"weight_kg": f"1.{step + 100}"}, format='json')
+            else:
+                self.client.delete(reverse('letter-detail', kwargs={'pk': rng.choice(ids)}))
+
+            for index in rng.sample(range(len(clients)), 3):
+                replica, token = clients[index]
+                changed, deleted, token = self.sync(token)
+                replica.update((item['id'], item) for item in changed)
+                for pk in deleted:
+                    replica.pop(pk, None)
+                clients[index] = (replica, token)
+
+        expected, _ = full_load()
+        for replica, token in clients:
+            changed, deleted, _ = self.sync(token)
+            replica.update((item['id'], item) for item in changed)
+            for pk in deleted:
+                replica.pop(pk, None)
+            self.assertEqual(replica, expected)
+
+
+class LiveClient:
+    """
+    Клиент живой ленты: соединение к LiveApplication без сети, полученные события — в очереди.
+    """
+
+    def __init__(self, path, query_string='', scope_type='http', method='GET'):
+        self.scope_type = scope_type
+        self.events = asyncio.Queue()
+        self.disconnected = asyncio.Event()
+        self.connected = False
+        self.status = None
+        scope = {'type': scope_type, 'path': path, 'query_string': query_string.encode(), 'headers': []}
+        if scope_type == 'http':
+            scope['method'] = method
+        self.task = asyncio.ensure_future(LiveApplication(None)(scope, self.receive, self.send))
+
+    async def receive(self):
+        if not self.connected:
+            self.connected = True
+            return {'type': 'http.request', 'body': b''} if self.scope_type == 'http' else {'type': 'websocket.connect'}
+        await self.disconnected.wait()
+        return {'type': f'{self.scope_type}.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        elif message['type'] == 'http.response.body' and self.status != 200:
+            self.events.put_nowait(('response', json.loads(message['body'])))
+        elif message['type'] == 'http.response.body':
+            for block in message['body'].decode().split('\n\n'):
+                fields = dict(line.split(': ', 1) for line in block.splitlines() if line.startswith(('event:', 'data:')))
+                if 'event' in fields:
+                    self.events.put_nowait((fields['event'], json.loads(fields['data'])))
+        elif message['type'] == 'websocket.send':
+            data = json.loads(message['text'])
+            self.events.put_nowait((data['event'], data.get('data')))
+        elif message['type'] == 'websocket.close':
+            self.events.put_nowait(('close', message['code']))
+
+    async def next_event(self):
+        return await asyncio.wait_for(self.events.get(), 5)
+
+    async def close(self):
+        self.disconnected.set()
+        await self.task
+
+
+class LiveFeedTests(ShipmentTestCase):
+    """
+    Тесты живой ленты изменений (/api/v1/letters/live): фильтры подписок, транспорты, буфер.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # рассылку разбирает тест (live_publisher.drain): фоновый поток не видит данных транзакции теста
+        settings_override = override_settings(SHIPMENT_LIVE_BACKGROUND_PUBLISH=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(live_publisher.drain)
+        self.letter_data = {
+            "sender_full_name": "Иванов Иван Иванович",
+            "recipient_full_name": "Сергеев Сергей Сергеевич",
+            "origin_location": "Казань",
+            "destination_location": "Уфа",
+            "origin_postcode": 420000,
+            "destination_postcode": 450000,
+            "letter_type": Letter.LetterType.REGULAR,
+            "weight_kg": "0.100"
+        }
+
+    def write(self, method, url, data=None):
+        """
+        Запрос к API; события подписчикам рассылаются после фиксации транзакции.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            data = getattr(self.client, method)(url, data, format='json').data
+        live_publisher.drain()
+        return data
+
+    async def test_events_follow_subscription_filters(self):
+        """
+        Тест: подписчик без фильтров получает все изменения, с фильтром — только подходящие,
+        а изменённая запись, вышедшая из-под фильтра, приходит ему как удалённая.
+        """
+        everything = LiveClient('/api/v1/letters/live')
+        kazan = LiveClient('/api/v1/letters/live', 'origin_region=42')
+        for client in (everything, kazan):
+            event, data = await client.next_event()
+            self.assertEqual(event, 'ready')
+            self.assertIn('sync_token', data)
+
+        write = sync_to_async(self.write)
+        url = reverse('letter-list')
+        first = await write('post', url, self.letter_data)
+        second = await write('post', url, dict(self.letter_data, origin_postcode=100000))
+        await write('patch', reverse('letter-detail', kwargs={'pk': first['id']}), {"origin_postcode": 100001})
+        await write('delete', reverse('letter-detail', kwargs={'pk': second['id']}))
+
+        received = [await everything.next_event() for _ in range(4)]
+        self.assertEqual([(event, data['action']) for event, data in received],
+                         [('change', 'create'), ('change', 'create'), ('change', 'update'), ('change', 'delete')])
+        self.assertEqual(received[0][1]['results'], [first])
+        self.assertEqual(received[2][1]['results'][0]['origin_postcode'], 100001)
+        self.assertEqual(received[3][1]['ids'], [second['id']])
+
+        received = [await kazan.next_event() for _ in range(3)]
+        self.assertEqual([data['action'] for _, data in received], ['create', 'delete', 'delete'])
+        self.assertEqual([data.get('ids') for _, data in received], [None, [first['id']], [second['id']]])
+
+        await everything.close()
+        await kazan.close()
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    async def test_websocket_and_rejected_subscriptions(self):
+        """
+        Тест: подписка по WebSocket; неверные фильтры и метод отклоняются.
+        """
+        client = LiveClient('/api/v1/parcels/live', 'parcel_type=2', scope_type='websocket')
+        self.assertEqual((await client.next_event())[0], 'ready')
+        await client.close()
+
+        client = LiveClient('/api/v1/letters/live', 'origin_region=4x')
+        event, data = await client.next_event()
+        self.assertEqual((client.status, event), (400, 'response'))
+        self.assertIn('origin_region', data['details'])
+
+        client = LiveClient('/api/v1/letters/live', method='POST')
+        await client.next_event()
+        self.assertEqual(client.status, 405)
+
+        client = LiveClient('/api/v1/letters/live', 'origin_region=4x', scope_type='websocket')
+        self.assertEqual((await client.next_event())[0], 'error')
+        self.assertEqual(await client.next_event(), ('close', 1008))
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    def test_slow_client_buffer_is_bounded(self):
+        """
+        Тест: непрочитанные события не копятся сверх LIVE_BUFFER_SIZE — подписка закрывается с overflow.
+        """
+        subscription = LiveSubscription(Letter, (), loop=None)
+        for index in range(const.LIVE_BUFFER_SIZE + 10):
+            subscription.put(live_event('change', {'ids': [index]}))
+        self.assertTrue(subscription.overflowed)
+        self.assertEqual(subscription.buffer, [OVERFLOW_EVENT])
+
+    def test_publisher_queue_is_coalesced_and_bounded(self):
+        """
+        Тест: подряд идущие изменения одного вида рассылаются одним publish, а переполненная очередь
+        сворачивается в resync по моделям.
+        """
+        target = mock.Mock()
+        publisher = LivePublisher(target)
+        publisher.enqueue(Letter, 'create', [1])
+        publisher.enqueue(Letter, 'create', [2])
+        publisher.enqueue(Letter, 'delete', [1])
+        self.assertEqual(publisher.drain(), 2)
+        self.assertEqual(target.publish.call_args_list, [
+            mock.call(Letter, 'create', [1, 2]), mock.call(Letter, 'delete', [1]),
+        ])
+
+        target.reset_mock()
+        for pk in range(const.LIVE_PUBLISH_QUEUE_SIZE + 1):
+            publisher.enqueue(Letter if pk % 2 else Parcel, 'update', [pk])
+        publisher.drain()
+        self.assertEqual(target.publish.call_args_list, [
+            mock.call(Parcel, 'resync', []), mock.call(Letter, 'resync', []),
+        ])
+
+    async def test_many_idle_subscribers(self):
+        """
+        Тест: тысяча подписчиков с тремя разными фильтрами получает изменение; совпадения
+        проверяются одним запросом на группу одинаковых фильтров, а не на подписчика, и не в пишущем запросе.
+        """
+        queries = ['', 'origin_region=42', 'letter_type=1&origin_region=42']
+        clients = [LiveClient('/api/v1/letters/live', queries[index % 3]) for index in range(1000)]
+        for client in clients:
+            await client.next_event()
+
+        def create():
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.client.post(reverse('letter-list'), self.letter_data, format='json')
+            with self.assertNumQueries(0):
+                for callback in callbacks:
+                    callback()
+            with self.assertNumQueries(len(queries)):
+                live_publisher.drain()
+
+        await sync_to_async(create)()
+        for client in clients:
+            event, data = await client.next_event()
+            self.assertEqual((event, data['action']), ('change', 'create'))
+        for client in clients:
+            await client.close()
+        self.assertEqual(broker.subscriber_count(), 0)
+
+
+class ReplicaRoutingTests(ShipmentTestCase):
+    """
+    Тесты маршрутизации чтений на реплики и закрепления клиента за основной базой после записи.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        self.router = PrimaryReplicaRouter()
+
+    @override_settings(SHIPMENT_DB_REPLICAS=['replica'])
+    def test_reads_go_to_replica_unless_pinned(self):
+        """
+        Тест: безопасные запросы читают с реплики; запись и запросы закреплённого клиента — с основной базы.
+        """
+        with replica_reads(self.factory.get('/api/v1/letters')):
+            self.assertEqual(self.router.db_for_read(Letter), 'replica')
+            self.assertEqual(self.router.db_for_write(Letter), 'default')
+        self.assertIsNone(self.router.db_for_read(Letter))
+
+        with replica_reads(self.factory.post('/api/v1/letters')):
+            self.assertIsNone(self.router.db_for_read(Letter))
+
+        pinned = self.factory.get('/api/v1/letters')
+        pinned.COOKIES[PRIMARY_PIN_COOKIE] = '1'
+        with replica_reads(pinned):
+            self.assertIsNone(self.router.db_for_read(Letter))
+
+    @override_settings(SHIPMENT_DB_REPLICAS=['replica'], SHIPMENT_DB_STICKY_SECONDS=7)
+    def test_write_pins_client_to_primary(self):
+        """
+        Тест: успешная запись ставит cookie закрепления на SHIPMENT_DB_STICKY_SECONDS, ошибка — нет.
+        """
+        data = {
+            "sender_full_name": "Иванов Иван Иванович",
+            "recipient_full_name": "Сергеев Сергей Сергеевич",
+            "origin_location": "Казань",
+            "destination_location": "Уфа",
+            "origin_postcode": 420000,
+            "destination_postcode": 450000,
+            "weight_kg": "0.100"
+        }
+        response = self.client.post(reverse('letter-list'), data, format='json')
+        self.assertEqual(response.cookies[PRIMARY_PIN_COOKIE]['max-age'], 7)
+
+        self.client.cookies.clear()
+        response = self.client.post(reverse('letter-list'), dict(data, weight_kg="-1"), format='json')
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+    def test_no_replicas_no_routing(self):
+        """
+        Тест: без SHIPMENT_DB_REPLICAS всё читается с основной базы и cookie не ставится.
+        """
+        with replica_reads(self.factory.get('/api/v1/letters')):
+            self.assertIsNone(self.router.db_for_read(Letter))
+        response = self.client.post(reverse('letter-list'), {}, format='json')
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+
+@skipUnless('replica' in settings.DATABASES, "нужна реплика: SHIPMENT_DB_REPLICAS=replica python manage.py test")
+@override_settings(SHIPMENT_DB_REPLICAS=['replica'])
+class ReplicaDatabaseTests(ShipmentTestCase):
+    """
+    Маршрутизация на двух настоящих базах SQLite. Репликации между тестовыми базами нет,
+    поэтому реплика «отстаёт» всегда, и по содержимому ответа видно, откуда он прочитан.
+    """
+    # без реплики класс пропускается, но набор баз тест-раннер собирает и у пропущенных тестов
+    databases = {'default', 'replica'}.intersection(settings.DATABASES)
+
+    def setUp(self):
+        super().setUp()
+        self.letter_data = {
+            "sender_full_name": "Иванов Иван Иванович",
+            "recipient_full_name": "Сергеев Сергей Сергеевич",
+            "origin_location": "Казань",
+            "destination_location": "Уфа",
+            "origin_postcode": 420000,
+            "destination_postcode": 450000,
+            "weight_kg": "0.100"
+        }
+        # в реплике свой словарь пунктов: intern_location пишет в основную базу
+        locations = {
+            field: Location.objects.using('replica').create(name=name, key=location_key(name))
+            for field, name in (("origin_location", "Казань"), ("destination_location", "Уфа"))
+        }
+        Letter.objects.using('replica').create(**dict(self.letter_data, sender_full_name="Репликов Реплик", **locations))
+
+    def senders(self, client):
+        return [item['sender_full_name'] for item in client.get(reverse('letter-list')).data['results']]
+
+    def test_read_your_writes(self):
+        """
+        Тест: до записи клиент читает с реплики, после — с основной базы; другие клиенты — с реплики.
+        """
+        self.assertEqual(self.senders(self.client), ["Репликов Реплик"])
+
+        response = self.client.post(reverse('letter-list'), self.letter_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Letter.objects.using('replica').filter(pk=response.data['id'], sender_full_name="Иванов Иван Иванович").exists())
+
+        self.assertEqual(self.senders(self.client), ["Иванов Иван Иванович"])
+        self.assertEqual(self.senders(self.client_class()), ["Репликов Реплик"])
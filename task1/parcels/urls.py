@@ -1,11 +1,31 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import LetterViewSet, ParcelViewSet
+from .views import LetterViewSet, ParcelViewSet, MetricsView, ShipmentStatsView, ShipmentFeedView, IngestTicketView
 
 router = DefaultRouter(trailing_slash=False)
 router.register(r'letters', LetterViewSet, basename='letter')
 router.register(r'parcels', ParcelViewSet, basename='parcel')
 
 urlpatterns = [
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('stats', ShipmentStatsView.as_view(), name='stats'),
+    path('shipments', ShipmentFeedView.as_view(), name='shipment-feed'),
+    path('ingest/<str:ticket>', IngestTicketView.as_view(), name='ingest-ticket'),
+]
+
+if settings.SHIPMENT_ASYNC_API:
+    # Под ASGI основные CRUD-маршруты обслуживают асинхронные представления;
+    # дополнительные действия (batch, export) остаются за DRF-роутером.
+    from .async_views import AsyncLetterView, AsyncParcelView
+
+    urlpatterns += [
+        path('letters', AsyncLetterView.as_view(), name='letter-list'),
+        path('letters/<int:pk>', AsyncLetterView.as_view(), name='letter-detail'),
+        path('parcels', AsyncParcelView.as_view(), name='parcel-list'),
+        path('parcels/<int:pk>', AsyncParcelView.as_view(), name='parcel-detail'),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
@@ -1,32 +1,338 @@
-from rest_framework import viewsets, status, filters
+import copy
+import logging
+
+from rest_framework import generics, viewsets, status
+from rest_framework.decorators import action
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.exceptions import NotFound, ValidationError
-from django.shortcuts import get_object_or_404
-from .models import Letter, Parcel
-from .serializers import LetterSerializer, ParcelSerializer
-from .filters import LetterFilter, ParcelFilter
+from django.conf import settings
+from django.db import connections
+from django.db.models.constants import LOOKUP_SEP
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import Letter, Parcel, ShipmentRollup
+from .serializers import (
+    BaseShipmentSerializer, LetterSerializer, ParcelSerializer, ShipmentBulkSerializer, ShipmentFastReader,
+    ShipmentFeedReader, sparse_fields,
+)
+from .filters import LetterFilter, ParcelFilter, LetterFeedFilter, ParcelFeedFilter
+from django.views import View
 from django.views.generic import TemplateView
+from django_filters import utils as filter_utils
 from django_filters.rest_framework import DjangoFilterBackend
+from . import constants as const
+from .exports import EXPORT_FORMATS
+from .search import ShipmentSearchFilter, ShipmentOrderingFilter
+from .pagination import ShipmentFeedPagination
+from .cache import CachedRead, instance_validators
+from .signals import notify_shipments_changed
+from .instrumentation import metrics, timed
+from .rollups import ROLLUP_SOURCES, stats
+from .sync import SyncExpired, deleted_since, sync_horizon, sync_token
+from .routers import current_replica, pin_to_primary, replica_reads
+from .bulk import bulk_delete, bulk_update, invariant_conflicts
+from .counting import count_rows
+from .renderers import SHIPMENT_RENDERER_CLASSES
+from .archive import ARCHIVE_MODELS, reaches_archive
+from .ingest import INGEST_MODELS, enqueue, get_journal, ingest_enabled, ingest_metrics, ticket_status
+
+logger = logging.getLogger(__name__)
+
 
 class BaseShipmentViewSet(viewsets.ModelViewSet):
     """
     Базовый ViewSet для общей логики.
     """
-    filter_backends = (filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend)
-    search_fields = ['sender_full_name', 'recipient_full_name', 'origin_location', 'destination_location']
+    filter_backends = (ShipmentSearchFilter, ShipmentOrderingFilter, DjangoFilterBackend)
+    # JSON, колоночный JSON и MessagePack по Accept или ?format=
+    renderer_classes = SHIPMENT_RENDERER_CLASSES
+    # для СУБД без полнотекстового индекса (icontains); пункты — по названию из словаря
+    search_fields = ['sender_full_name', 'recipient_full_name', 'origin_location__name', 'destination_location__name']
     ordering_fields = ['created_at', 'updated_at', 'sender_full_name']
     ordering = ['-created_at'] # standard ordering by creation date
 
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # представление зависит от Accept, а ETag — нет: общим кешам нужен Vary
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    def dispatch(self, request, *args, **kwargs):
+        # чтения безопасных запросов — с реплики (если они настроены), после записи клиент закрепляется за основной базой
+        with replica_reads(request):
+            response = super().dispatch(request, *args, **kwargs)
+        return pin_to_primary(request, response)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список через кеш ответов. Ключ и ETag зависят от поколения данных модели,
+        поэтому любая запись через API делает их недействительными.
+        """
+        expired = self.sync_expired_response()
+        if expired is not None:
+            return expired
+
+        read = self.cached_read('list')
+        not_modified = read.not_modified()
+        if not_modified is not None:
+            return not_modified
+        data = read.load()
+        if data is None:
+            data = read.store(self.get_list_data())
+        return read.finish(Response(data))
+
+    def cached_read(self, kind):
+        """
+        Кеш ответа и условный GET запроса list/retrieve (см. CachedRead); им пользуются и async_views.
+        """
+        return CachedRead(self.queryset.model, self.request, kind)
+
+    def filter_queryset(self, queryset):
+        with timed('filter'):
+            return super().filter_queryset(queryset)
+
+    def get_list_data(self):
+        """
+        Данные списка через быстрый путь чтения (ShipmentFastReader).
+        """
+        ids = self.get_requested_ids()
+        if ids is not None:
+            rows = [row for queryset in self.get_multi_get_querysets(ids) for row in queryset]
+            with timed('serialize'):
+                return self.multi_get_data(ids, rows)
+        # токен берётся до чтения: изменения, зафиксированные во время чтения, попадут в следующую синхронизацию
+        token = self.get_sync_token()
+        reader = self.get_fast_reader()
+        querysets = self.get_list_querysets()
+        parts = [reader.rows(queryset) for queryset in querysets]
+        page_rows = self.get_page_rows(parts)
+        if page_rows is not None:
+            page = self.paginator.set_page(list(page_rows))
+            with timed('serialize'):
+                data = self.get_paginated_response(reader.to_representation(page)).data
+            self.add_count_data(data, self.get_count(querysets))
+            return self.add_sync_data(data, token, self.get_deleted_ids())
+        rows = list(self.union_rows(parts))
+        with timed('serialize'):
+            return reader.to_representation(rows)
+
+    def get_list_querysets(self):
+        """
+        Отфильтрованные querysets списка: рабочая таблица и, если фильтр по дате создания
+        заходит в архивный период, архив модели (parcels/archive.py).
+        """
+        querysets = [self.filter_queryset(self.get_queryset())]
+        archive = self.filter_archive_queryset()
+        if archive is not None:
+            querysets.append(archive)
+        return querysets
+
+    def filter_archive_queryset(self):
+        """
+        Архив модели с фильтрами, поиском и сортировкой списка или None, если фильтр по дате
+        архива не касается. DjangoFilterBackend требует queryset своей модели, поэтому FilterSet
+        применяется напрямую, как в единой ленте.
+        """
+        archive_model = ARCHIVE_MODELS.get(self.queryset.model)
+        if archive_model is None:
+            return None
+        with timed('filter'):
+            filterset = self.filterset_class(
+                self.request.query_params, queryset=archive_model.objects.all(), request=self.request
+            )
+            if not filterset.is_valid():
+                raise filter_utils.translate_validation(filterset.errors)
+            dates = filterset.form.cleaned_data
+            if not reaches_archive(dates.get('created_at_after'), dates.get('created_at_before')):
+                return None
+            queryset = filterset.qs
+            for backend in (ShipmentSearchFilter, ShipmentOrderingFilter):
+                queryset = backend().filter_queryset(self.request, queryset, self)
+            return queryset
+
+    def get_page_rows(self, parts):
+        """
+        Ленивый срез страницы по строкам списка: одной таблицы или объединения с архивом.
+        None — пагинация отключена.
+        """
+        if self.paginator is None:
+            return None
+        if len(parts) == 1:
+            return self.paginator.get_page_queryset(parts[0], self.request, view=self)
+        return self.paginator.get_union_page(parts, self.request, view=self)
+
+    @staticmethod
+    def union_rows(parts):
+        """
+        Строки всех частей списка одним запросом UNION ALL в порядке сортировки списка.
+        """
+        if len(parts) == 1:
+            return parts[0]
+        ordering = parts[0].query.order_by
+        union = parts[0].order_by().union(*(part.order_by() for part in parts[1:]), all=True)
+        return union.order_by(*ordering)
+
+    def get_requested_ids(self):
+        """
+        id из ?ids=1,2,3 (без повторов, в порядке запроса) или None. Не более SHIPMENT_MULTI_GET_MAX_IDS.
+        """
+        value = self.request.query_params.get('ids')
+        if not value:
+            return None
+        limit = settings.SHIPMENT_MULTI_GET_MAX_IDS
+        try:
+            ids = list(dict.fromkeys(int(item) for item in value.split(',')))
+        except ValueError:
+            ids = None
+        if ids is None or len(ids) > limit:
+            raise ValidationError({"error": const.ERROR_MSG_IDS.format(limit=limit)})
+        return ids
+
+    def get_multi_get_querysets(self, ids):
+        """
+        Строки записей с id из ids, с фильтрами списка. Как в QuerySet.in_bulk, id делятся на порции
+        по лимиту параметров СУБД, поэтому обычно это один запрос.
+        """
+        queryset = self.get_fast_reader().rows(self.filter_queryset(self.get_queryset()).order_by())
+        batch_size = connections[queryset.db].features.max_query_params or len(ids)
+        return [queryset.filter(pk__in=ids[start:start + batch_size]) for start in range(0, len(ids), batch_size)]
+
+    def multi_get_data(self, ids, rows):
+        """
+        Ответ выборки по id: найденные записи в порядке запроса и id, которых нет (или они не прошли фильтры).
+        """
+        found = {row.id: row for row in rows}
+        return {
+            "results": self.get_fast_reader().to_representation(found[pk] for pk in ids if pk in found),
+            "missing": [pk for pk in ids if pk not in found],
+        }
+
+    def get_fast_reader(self):
+        return ShipmentFastReader.for_serializer(self.get_serializer_class(), self.get_field_selection())
+
+    def get_field_selection(self):
+        """
+        Поля ответа из ?fields= / ?omit= или None (все поля). Только для чтения:
+        запись валидируется и возвращается полным сериализатором.
+        """
+        if self.request.method not in SAFE_METHODS:
+            return None
+        available = ShipmentFastReader.for_serializer(self.get_serializer_class()).field_names
+        return sparse_fields(self.request.query_params, available)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        columns = self.get_fast_reader().columns
+        # названия пунктов карточки читаются из словаря JOIN-ом, а не отдельными запросами
+        queryset = queryset.select_related(*(column.split(LOOKUP_SEP)[0] for column in columns if LOOKUP_SEP in column))
+        if self.get_field_selection() is not None:
+            # колонки невыбранных полей не читаются из базы; updated_at нужен для ETag и Last-Modified
+            queryset = queryset.only(*columns, 'updated_at')
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_field_selection())
+        return super().get_serializer(*args, **kwargs)
+
+    @staticmethod
+    def get_sync_token():
+        # реплика может отставать, поэтому для её данных токен отодвигается на допустимое отставание
+        return sync_token(lag=settings.SHIPMENT_DB_REPLICA_LAG_SECONDS if current_replica() else 0)
+
+    def count_requested(self):
+        # число записей — по запросу: без него страница списка остаётся одним SQL-запросом
+        return self.request.query_params.get('count') in ('1', 'true')
+
+    def get_count(self, querysets):
+        """
+        (число записей, точное ли оно) при ?count=true, иначе None. С архивом — сумма по частям списка.
+        """
+        if not self.count_requested():
+            return None
+        counts = [count_rows(queryset) for queryset in querysets]
+        return sum(count for count, exact in counts), all(exact for count, exact in counts)
+
+    @staticmethod
+    def add_count_data(data, count):
+        if count is not None:
+            data['count'], data['count_exact'] = count
+        return data
+
+    def get_updated_since(self):
+        """
+        Момент из ?updated_since= или None. Неверное значение отклонит фильтр (400).
+        """
+        value = self.request.query_params.get(ShipmentOrderingFilter.sync_param)
+        return parse_datetime(value) if value else None
+
+    def sync_expired_response(self):
+        """
+        410, если отметки об удалениях после updated_since могли быть уже удалены
+        (compact_tombstones): клиент должен загрузить данные заново.
+        """
+        since = self.get_updated_since()
+        if since is None or since >= sync_horizon():
+            return None
+        message = const.ERROR_MSG_SYNC_EXPIRED.format(days=settings.SHIPMENT_TOMBSTONE_RETENTION_DAYS)
+        return Response({"error": message}, status=status.HTTP_410_GONE)
+
+    def get_deleted_ids(self):
+        """
+        Ленивый queryset id, удалённых после updated_since; только для первой страницы синхронизации.
+        Читается на одну отметку больше SYNC_MAX_DELETED, чтобы add_sync_data узнал о превышении.
+        """
+        since = self.get_updated_since()
+        if since is None or self.paginator.cursor is not None:
+            return None
+        return deleted_since(self.queryset.model, since)[:const.SYNC_MAX_DELETED + 1]
+
+    @staticmethod
+    def add_sync_data(data, token, deleted_ids=None):
+        """
+        Дополняет страницу списка sync_token (значение updated_since для следующей синхронизации)
+        и, при синхронизации, списком удалённых id. Удалённых больше SYNC_MAX_DELETED — 410 (SyncExpired).
+        """
+        data['sync_token'] = token
+        if deleted_ids is not None:
+            deleted_ids = list(deleted_ids)
+            if len(deleted_ids) > const.SYNC_MAX_DELETED:
+                raise SyncExpired(const.ERROR_MSG_SYNC_TOO_MANY_DELETED.format(limit=const.SYNC_MAX_DELETED))
+            data['deleted'] = deleted_ids
+        return data
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Запись через кеш ответов, с ETag/Last-Modified по updated_at.
+        На If-None-Match с актуальным ETag отвечает 304 без сериализации.
+        """
+        read = self.cached_read('retrieve')
+        data = read.load()
+        if data is None:
+            instance = self.get_object()
+            read.validate(*instance_validators(instance, self.get_field_selection()))
+        not_modified = read.not_modified()
+        if not_modified is not None:
+            return not_modified
+        if data is None:
+            with timed('serialize'):
+                data = read.store(self.get_serializer(instance).data)
+        return read.finish(Response(data))
+
     def create(self, request, *args, **kwargs): # Custom create method with error handling
         serializer = self.get_serializer(data=request.data)
         try:
             serializer.is_valid(raise_exception=True)
+            if ingest_enabled():
+                return self.ingest_response(request, enqueue(self.queryset.model, serializer.validated_data))
             self.perform_create(serializer)
             headers = self.get_success_headers(serializer.data)
             return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
         except ValidationError as e:
-            error_message = f"Ошибка валидации при создании: {e.detail}"
-            print(error_message)
+            logger.info("Ошибка валидации при создании: %s", e.detail)
             return Response({"error": "Неверные данные", "details": e.detail}, status=status.HTTP_400_BAD_REQUEST)
 
     def update(self, request, *args, **kwargs):
@@ -40,6 +346,141 @@ class BaseShipmentViewSet(viewsets.ModelViewSet):
         except ValidationError as e:
             return Response({"error": "Не удалось обновить. Ошибки валидации.", "details": e.detail}, status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def ingest_response(request, ticket):
+        """
+        202 на приём с отложенной записью: квитанция и адрес, по которому видно, записано ли отправление.
+        """
+        status_url = request.build_absolute_uri(reverse('ingest-ticket', kwargs={'ticket': ticket}))
+        return Response(
+            {"ticket": ticket, "status": "queued", "status_url": status_url},
+            status=status.HTTP_202_ACCEPTED, headers={'Location': status_url},
+        )
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        notify_shipments_changed(self.queryset.model, 'create', [serializer.instance])
+
+    def perform_update(self, serializer):
+        # save() меняет объект на месте, поэтому состояние до изменения копируется заранее
+        previous = [copy.copy(serializer.instance)]
+        super().perform_update(serializer)
+        notify_shipments_changed(self.queryset.model, 'update', [serializer.instance], previous=previous)
+
+    def perform_destroy(self, instance):
+        # после delete() у объекта сбрасывается pk, поэтому id запоминается заранее
+        pks = [instance.pk]
+        super().perform_destroy(instance)
+        notify_shipments_changed(self.queryset.model, 'delete', [instance], pks=pks)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request, *args, **kwargs):
+        """
+        Пакетная регистрация (POST /api/v1/<letters|parcels>/batch).
+        Принимает массив объектов; невалидные элементы не мешают сохранить остальные.
+        """
+        serializer = self.get_serializer(data=request.data, many=True, max_length=const.BATCH_MAX_SIZE)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except ValidationError as e:
+            return Response({"error": "Неверные данные", "details": e.detail}, status=status.HTTP_400_BAD_REQUEST)
+
+        instances = self.perform_batch_create(serializer)
+        created = [{"index": index, "id": instance.pk} for index, instance in zip(serializer.item_indexes, instances)]
+        errors = [{"index": index, "details": detail} for index, detail in serializer.item_errors.items()]
+
+        if not errors:
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({"created": created, "errors": errors}, status=response_status)
+
+    def perform_batch_create(self, serializer):
+        instances = serializer.save()
+        if instances:
+            notify_shipments_changed(self.queryset.model, 'create', instances)
+        return instances
+
+    @action(detail=False, methods=['patch', 'delete'])
+    def bulk(self, request, *args, **kwargs):
+        """
+        Массовое изменение (PATCH) или удаление (DELETE) записей (/api/v1/<letters|parcels>/bulk).
+        Записи выбираются фильтрами и поиском списка из строки запроса и/или списком ids из тела;
+        PATCH принимает новые значения в changes: {"ids": [...], "changes": {"parcel_type": 3}}.
+        Выполняется одним UPDATE/DELETE на порцию, без сериализации отдельных записей.
+        ?dry_run=true — только число выбранных записей.
+        """
+        body = ShipmentBulkSerializer(data=request.data)
+        if not body.is_valid():
+            return Response({"error": "Неверные данные", "details": body.errors}, status=status.HTTP_400_BAD_REQUEST)
+        ids = body.validated_data.get('ids')
+        if ids is None and not self.has_list_filters():
+            return Response({"error": const.ERROR_MSG_BULK_SELECTION}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if ids is not None:
+            queryset = queryset.filter(pk__in=ids)
+
+        changes = None
+        if request.method == 'PATCH':
+            serializer = self.get_serializer(data=body.validated_data.get('changes', {}), partial=True)
+            if not serializer.is_valid():
+                return Response(
+                    {"error": "Не удалось обновить. Ошибки валидации.", "details": serializer.errors},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            changes = serializer.validated_data
+            if not changes:
+                return Response({"error": const.ERROR_MSG_BULK_CHANGES}, status=status.HTTP_400_BAD_REQUEST)
+            # правила validate, которые зависят от текущих значений записей, проверяются запросом
+            conflicts = invariant_conflicts(changes)
+            if conflicts is not None:
+                conflicting = list(
+                    queryset.filter(conflicts).order_by('pk').values_list('pk', flat=True)[:const.BULK_MAX_REPORTED_CONFLICTS]
+                )
+                if conflicting:
+                    return Response(
+                        {"error": const.ERROR_MSG_BULK_CONFLICT, "conflicts": conflicting},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+        if request.query_params.get('dry_run') in ('1', 'true'):
+            return Response({"matched": queryset.count(), "dry_run": True})
+        if changes is None:
+            return Response({"deleted": bulk_delete(queryset)})
+        return Response({"updated": bulk_update(queryset, changes)})
+
+    def has_list_filters(self):
+        """
+        Есть ли в запросе непустые фильтры или поиск списка.
+        """
+        names = set(self.filterset_class.base_filters) | {ShipmentSearchFilter.search_param}
+        return any(value for name in names for value in self.request.query_params.getlist(name))
+
+    @action(detail=False, methods=['get'])
+    def export(self, request, *args, **kwargs):
+        """
+        Потоковая выгрузка (GET /api/v1/<letters|parcels>/export?export_format=ndjson|csv).
+        Учитывает те же фильтры, поиск и сортировку, что и список; строки читаются
+        серверным курсором порциями, поэтому потребление памяти не зависит от объёма выгрузки.
+        """
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            message = const.ERROR_MSG_EXPORT_FORMAT.format(formats=', '.join(EXPORT_FORMATS))
+            return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
+        content_type, extension, stream = EXPORT_FORMATS[export_format]
+
+        reader = self.get_fast_reader()
+        fields = [name for name, index, convert in reader.layout]
+        queryset = self.union_rows([reader.rows(queryset) for queryset in self.get_list_querysets()])
+        rows = (reader.represent_row(row) for row in queryset.iterator(chunk_size=const.EXPORT_CHUNK_SIZE))
+
+        response = StreamingHttpResponse(stream(rows, fields), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{self.basename}s.{extension}"'
+        return response
+
 
 class LetterViewSet(BaseShipmentViewSet):
     """
@@ -52,9 +493,7 @@ class LetterViewSet(BaseShipmentViewSet):
 
     def retrieve(self, request, *args, **kwargs):
         try:
-            instance = self.get_object()
-            serializer = self.get_serializer(instance)
-            return Response(serializer.data)
+            return super().retrieve(request, *args, **kwargs)
         except NotFound:
             return Response({"error": "Письмо с таким ID не найдено."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -74,11 +513,120 @@ class ParcelViewSet(BaseShipmentViewSet):
     queryset = Parcel.objects.all()
     serializer_class = ParcelSerializer
     filterset_class = ParcelFilter
-    
-    def retrieve(self, request, *args, **kwargs):
-        instance = get_object_or_404(self.queryset, pk=kwargs.get('pk'))
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
-    
+
+
 class IndexView(TemplateView):
-    template_name = "index.html"
\ No newline at end of file
+    template_name = "index.html"
+
+class MetricsView(View):
+    """
+    Гистограммы задержки по эндпоинтам в текстовом формате Prometheus (GET /api/v1/metrics),
+    в режиме отложенной записи — ещё глубина журнала и задержка записи из него.
+    """
+
+    def get(self, request, *args, **kwargs):
+        body = metrics.render()
+        if ingest_enabled():
+            body += ingest_metrics.render(get_journal().depth())
+        return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class IngestTicketView(APIView):
+    """
+    Состояние квитанции приёма с отложенной записью (GET /api/v1/ingest/<ticket>):
+    status=queued, пока отправление в журнале, status=done с id записанного отправления
+    и status=failed с текстом ошибки, если запись не удалась за INGEST_MAX_ATTEMPTS попыток.
+    """
+
+    def get(self, request, ticket, *args, **kwargs):
+        data = ticket_status(ticket)
+        if data is None:
+            return Response({"error": const.ERROR_MSG_INGEST_TICKET}, status=status.HTTP_404_NOT_FOUND)
+        if data['status'] == 'done':
+            model = INGEST_MODELS[data['kind']]
+            data['url'] = request.build_absolute_uri(
+                reverse(f'{model._meta.model_name}-detail', kwargs={'pk': data['id']})
+            )
+        return Response(data)
+
+
+class ShipmentStatsView(APIView):
+    """
+    Количество и суммы отправлений из сводок (GET /api/v1/stats).
+    Параметры: kind=letters|parcels, group_by — через запятую day и одно из type, origin_postcode,
+    destination_postcode; date_from/date_to — границы по дню создания (включительно).
+    """
+    kinds = {'letters': Letter, 'parcels': Parcel}
+
+    def get(self, request, *args, **kwargs):
+        kind = request.query_params.get('kind')
+        if kind not in self.kinds:
+            message = const.ERROR_MSG_STATS_KIND.format(kinds=', '.join(self.kinds))
+            return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
+
+        group_by = [name for name in request.query_params.get('group_by', '').split(',') if name]
+        dimensions = [name for name in group_by if name != 'day']
+        if len(dimensions) > 1 or not set(dimensions) <= set(ShipmentRollup.Dimension.values):
+            message = const.ERROR_MSG_STATS_GROUP_BY.format(dimensions=', '.join(ShipmentRollup.Dimension.values))
+            return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
+
+        dates = {}
+        for param in ('date_from', 'date_to'):
+            value = request.query_params.get(param)
+            try:
+                dates[param] = parse_date(value) if value else None
+            except ValueError:
+                dates[param] = None
+            if value and dates[param] is None:
+                return Response({"error": const.ERROR_MSG_STATS_DATE}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = stats(
+            ROLLUP_SOURCES[self.kinds[kind]],
+            dimension=dimensions[0] if dimensions else None,
+            by_day='day' in group_by,
+            **dates,
+        )
+        return Response({"kind": kind, "group_by": group_by, "results": results})
+
+
+class ShipmentFeedSearchFilter(ShipmentSearchFilter):
+    # релевантность в разных таблицах несравнима, лента всегда хронологическая
+    rank = False
+
+
+class ShipmentFeedView(generics.GenericAPIView):
+    """
+    Единая хронологическая лента писем и посылок (GET /api/v1/shipments): один запрос UNION ALL
+    вместо двух полных загрузок. Поддерживает общие фильтры BaseShipmentFilter, поиск (search)
+    и keyset-пагинацию по created_at. Поля конкретных видов возвращаются только по запросу:
+    include=letter_type,weight_kg,parcel_type,...; общие поля сужаются через fields/omit.
+    """
+    pagination_class = ShipmentFeedPagination
+    renderer_classes = SHIPMENT_RENDERER_CLASSES
+    search_fields = BaseShipmentViewSet.search_fields
+    feed = {
+        'letter': (Letter, LetterFeedFilter),
+        'parcel': (Parcel, ParcelFeedFilter),
+    }
+
+    def get(self, request, *args, **kwargs):
+        include = tuple(sorted({name for name in request.query_params.get('include', '').split(',') if name}))
+        allowed = ShipmentFeedReader.type_fields()
+        if not set(include) <= set(allowed):
+            message = const.ERROR_MSG_FEED_INCLUDE.format(fields=', '.join(allowed))
+            return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
+        fields = sparse_fields(request.query_params, BaseShipmentSerializer.Meta.fields)
+        reader = ShipmentFeedReader.for_include(include, fields)
+
+        parts = []
+        with timed('filter'):
+            for kind, (model, filterset_class) in self.feed.items():
+                filterset = filterset_class(request.query_params, queryset=model.objects.all(), request=request)
+                if not filterset.is_valid():
+                    raise filter_utils.translate_validation(filterset.errors)
+                queryset = ShipmentFeedSearchFilter().filter_queryset(request, filterset.qs, self)
+                parts.append(reader.rows(kind, queryset))
+
+        page = self.paginator.set_page(list(self.paginator.get_union_page(parts, request, view=self)))
+        with timed('serialize'):
+            return self.get_paginated_response(reader.to_representation(page))
@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'post_service.settings')
+# Под ASGI CRUD писем и посылок обслуживают асинхронные представления (parcels/async_views.py).
+os.environ.setdefault('SHIPMENT_ASYNC_API', 'True')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Живая лента изменений (/api/v1/letters/live, /api/v1/parcels/live) обслуживается до Django.
+from parcels.live import LiveApplication  # noqa: E402 — после настройки Django
+
+application = LiveApplication(django_application)
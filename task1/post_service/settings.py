@@ -43,10 +43,16 @@ INSTALLED_APPS = [
 ]
 
 REST_FRAMEWORK = {
-    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
+    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    # keyset-пагинация: стоимость страницы не зависит от её номера
+    'DEFAULT_PAGINATION_CLASS': 'parcels.pagination.ShipmentCursorPagination',
 }
 
 MIDDLEWARE = [
+    # первым, чтобы замер покрывал всю обработку запроса
+    'parcels.middleware.RequestInstrumentationMiddleware',
+    # сразу за замерами: время сжатия попадает в замер запроса
+    'parcels.middleware.ResponseCompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,6 +81,50 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'post_service.wsgi.application'
 
+# Асинхронные обработчики CRUD писем и посылок. post_service/asgi.py включает их по умолчанию,
+# под WSGI они не нужны (каждый вызов стоил бы лишнего цикла событий).
+SHIPMENT_ASYNC_API = os.environ.get('SHIPMENT_ASYNC_API', 'False') == 'True'
+
+# Ответы API от SHIPMENT_COMPRESS_MIN_BYTES байт сжимаются brotli (если установлен модуль brotli) или gzip
+# по Accept-Encoding клиента.
+SHIPMENT_COMPRESS_MIN_BYTES = int(os.environ.get('SHIPMENT_COMPRESS_MIN_BYTES', 1024))
+
+# Запросы дольше порога (мс) пишутся в журнал parcels.requests с SQL и планами EXPLAIN.
+SHIPMENT_SLOW_REQUEST_MS = float(os.environ.get('SHIPMENT_SLOW_REQUEST_MS', 500))
+
+# Сколько дней хранятся отметки об удалениях для синхронизации по updated_since (compact_tombstones).
+SHIPMENT_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SHIPMENT_TOMBSTONE_RETENTION_DAYS', 30))
+
+# Сколько id можно запросить одним GET /api/v1/<letters|parcels>?ids=1,2,3.
+SHIPMENT_MULTI_GET_MAX_IDS = int(os.environ.get('SHIPMENT_MULTI_GET_MAX_IDS', 500))
+
+# Число записей списка (?count=true): если планировщик оценивает выборку не меньше чем в
+# SHIPMENT_EXACT_COUNT_LIMIT строк, отдаётся оценка (count_exact=false), иначе точный COUNT(*).
+# Числа кешируются по фильтрам на SHIPMENT_COUNT_CACHE_SECONDS секунд.
+SHIPMENT_EXACT_COUNT_LIMIT = int(os.environ.get('SHIPMENT_EXACT_COUNT_LIMIT', 10000))
+SHIPMENT_COUNT_CACHE_SECONDS = int(os.environ.get('SHIPMENT_COUNT_CACHE_SECONDS', 30))
+
+# Изменения рассылаются подписчикам живой ленты фоновым потоком процесса: фильтры подписок проверяются
+# там, а не в пишущем запросе. При False очередь разбирает live_publisher.drain() (так делают тесты).
+SHIPMENT_LIVE_BACKGROUND_PUBLISH = os.environ.get('SHIPMENT_LIVE_BACKGROUND_PUBLISH', 'True') == 'True'
+
+# Приём с отложенной записью: при SHIPMENT_INGEST_MODE=queued POST /api/v1/<letters|parcels> валидирует
+# запись, добавляет её в журнал (отдельный файл SQLite SHIPMENT_INGEST_JOURNAL) и сразу отвечает 202
+# с квитанцией. Журнал записывается в БД пакетами фоновым потоком процесса (если
+# SHIPMENT_INGEST_BACKGROUND_FLUSH) и/или командой manage.py flush_ingest --loop.
+SHIPMENT_INGEST_MODE = os.environ.get('SHIPMENT_INGEST_MODE', 'sync')
+SHIPMENT_INGEST_JOURNAL = os.environ.get('SHIPMENT_INGEST_JOURNAL', str(BASE_DIR / 'ingest_journal.sqlite3'))
+SHIPMENT_INGEST_BACKGROUND_FLUSH = os.environ.get('SHIPMENT_INGEST_BACKGROUND_FLUSH', 'True') == 'True'
+# Интервал, с которым фоновый поток проверяет журнал, даже если в процесс ничего не поступало (с).
+SHIPMENT_INGEST_FLUSH_SECONDS = float(os.environ.get('SHIPMENT_INGEST_FLUSH_SECONDS', 1))
+# Сколько часов хранятся квитанции записанных отправлений (flush_ingest удаляет старые).
+SHIPMENT_INGEST_TICKET_RETENTION_HOURS = int(os.environ.get('SHIPMENT_INGEST_TICKET_RETENTION_HOURS', 24))
+
+# Архив: записи старше SHIPMENT_ARCHIVE_AFTER_DAYS дней переносятся командой archive_shipments из рабочих
+# таблиц в архивные (на PostgreSQL — секционированные по месяцам). Списки читают архив, только если
+# фильтр по дате создания (created_at_after/created_at_before) заходит в архивный период.
+SHIPMENT_ARCHIVE_AFTER_DAYS = int(os.environ.get('SHIPMENT_ARCHIVE_AFTER_DAYS', 365))
+
 # динамически выбирает базу данных в зависимости от переменной DB_ENGINE.
 # По умолчанию используем 'sqlite', если переменная не задана.
 DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
@@ -100,6 +150,96 @@ else:
         }
     }
 
+# --- Реплики для чтения ---
+# SHIPMENT_DB_REPLICAS — имена реплик через запятую (например, replica1,replica2). Параметры реплики
+# берутся из переменных с её именем в верхнем регистре: для postgres <ИМЯ>_HOST, <ИМЯ>_PORT, <ИМЯ>_DB,
+# <ИМЯ>_USER, <ИМЯ>_PASSWORD (по умолчанию — как у основной базы), для sqlite <ИМЯ>_NAME (путь к файлу).
+# Чтения безопасных запросов к API писем и посылок идут на реплики, запись — на основную базу;
+# клиент, который только что писал, SHIPMENT_DB_STICKY_SECONDS читает с основной базы.
+SHIPMENT_DB_REPLICAS = [alias.strip() for alias in os.environ.get('SHIPMENT_DB_REPLICAS', '').split(',') if alias.strip()]
+SHIPMENT_DB_STICKY_SECONDS = int(os.environ.get('SHIPMENT_DB_STICKY_SECONDS', 10))
+# Допустимое отставание реплик (с): на столько раньше выдаётся sync_token ответов, прочитанных с реплики.
+SHIPMENT_DB_REPLICA_LAG_SECONDS = float(os.environ.get('SHIPMENT_DB_REPLICA_LAG_SECONDS', 30))
+
+for alias in SHIPMENT_DB_REPLICAS:
+    prefix = alias.upper()
+    if DB_ENGINE == 'postgres':
+        DATABASES[alias] = {
+            **DATABASES['default'],
+            'NAME': os.environ.get(f'{prefix}_DB', DATABASES['default']['NAME']),
+            'USER': os.environ.get(f'{prefix}_USER', DATABASES['default']['USER']),
+            'PASSWORD': os.environ.get(f'{prefix}_PASSWORD', DATABASES['default']['PASSWORD']),
+            'HOST': os.environ.get(f'{prefix}_HOST', DATABASES['default']['HOST']),
+            'PORT': os.environ.get(f'{prefix}_PORT', DATABASES['default']['PORT']),
+        }
+    else:
+        DATABASES[alias] = {
+            **DATABASES['default'],
+            'NAME': os.environ.get(f'{prefix}_NAME', BASE_DIR / f'{alias}.sqlite3'),
+        }
+
+if SHIPMENT_DB_REPLICAS:
+    DATABASE_ROUTERS = ['parcels.routers.PrimaryReplicaRouter']
+
+
+# --- Кеш ответов API ---
+# Бэкенд кеша ответов списков и записей выбирается переменной SHIPMENT_CACHE_BACKEND:
+# 'file' (по умолчанию), 'redis', 'locmem' или 'dummy' (кеш отключён); расположение — SHIPMENT_CACHE_LOCATION.
+# В кеше лежат и поколения данных, которые сбрасывает любая запись, поэтому кеш должен быть общим для всех
+# процессов, которые пишут и читают: воркеров, фоновой записи журнала и команд (import_shipments, archive).
+# 'file' общий для процессов одного хоста, для нескольких хостов нужен 'redis'; 'locmem' — только для
+# одного процесса (runserver): запись в другом процессе его не сбрасывает, и он отдаёт устаревшие ответы и 304.
+SHIPMENT_CACHE_BACKEND = os.environ.get('SHIPMENT_CACHE_BACKEND', 'file')
+SHIPMENT_CACHE_TIMEOUT = int(os.environ.get('SHIPMENT_CACHE_TIMEOUT', 300))
+
+if SHIPMENT_CACHE_BACKEND == 'file':
+    SHIPMENT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('SHIPMENT_CACHE_LOCATION', BASE_DIR / 'cache'),
+    }
+elif SHIPMENT_CACHE_BACKEND == 'redis':
+    SHIPMENT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('SHIPMENT_CACHE_LOCATION', 'redis://127.0.0.1:6379'),
+    }
+elif SHIPMENT_CACHE_BACKEND == 'dummy':
+    SHIPMENT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+else:
+    SHIPMENT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shipments',
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shipments': dict(SHIPMENT_CACHE, TIMEOUT=SHIPMENT_CACHE_TIMEOUT),
+}
+
+
+# --- Журналирование ---
+# parcels.requests: по строке JSON на запрос (INFO) и медленные запросы с SQL и EXPLAIN (WARNING).
+# По умолчанию выводятся только медленные; SHIPMENT_REQUEST_LOG_LEVEL=INFO включает журнал всех запросов.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'parcels': {
+            'handlers': ['console'],
+            'level': os.environ.get('SHIPMENT_LOG_LEVEL', 'INFO'),
+        },
+        'parcels.requests': {
+            'level': os.environ.get('SHIPMENT_REQUEST_LOG_LEVEL', 'WARNING'),
+        },
+    },
+}
+
 
 # --- Password validation ---
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators